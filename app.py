@@ -4,9 +4,12 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlite_profile import is_sqlite, sqlite_engine_options, init_sqlite_profile
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging: plain synchronous DEBUG output unless LOG_MODE=json
+# hands records to the background JSON pipeline in logs.py
+if os.environ.get("LOG_MODE", "basic") != "json":
+    logging.basicConfig(level=logging.DEBUG)
 
 class Base(DeclarativeBase):
     pass
@@ -16,7 +19,10 @@ db = SQLAlchemy(model_class=Base)
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "serenity-dev-secret-key-2025")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# Behind this many proxies, the client address is taken from X-Forwarded-For.
+# Per-address login slots and rate limits key on request.remote_addr, which
+# is otherwise the proxy's address, shared by every visitor.
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ.get("PROXY_X_FOR", 1)), x_proto=1, x_host=1)
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///serenity.db")
@@ -25,5 +31,116 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
+# SQLite production profile: "production" enables WAL and the pragmas, pool
+# and WAL checkpointing in sqlite_profile.py ("default" leaves SQLite as is)
+app.config["SQLITE_PROFILE"] = os.environ.get("SQLITE_PROFILE", "default")
+app.config["SQLITE_BUSY_TIMEOUT"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))  # milliseconds
+app.config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+app.config["SQLITE_CACHE_SIZE"] = int(os.environ.get("SQLITE_CACHE_SIZE", -64000))  # negative means KiB
+app.config["SQLITE_JOURNAL_SIZE_LIMIT"] = int(os.environ.get("SQLITE_JOURNAL_SIZE_LIMIT", 64 * 1024 * 1024))
+app.config["SQLITE_POOL_SIZE"] = int(os.environ.get("SQLITE_POOL_SIZE", 5))
+app.config["SQLITE_POOL_OVERFLOW"] = int(os.environ.get("SQLITE_POOL_OVERFLOW", 10))
+app.config["SQLITE_CHECKPOINT_INTERVAL"] = float(os.environ.get("SQLITE_CHECKPOINT_INTERVAL", 60))
+
+sqlite_production = (app.config["SQLITE_PROFILE"] == "production"
+                     and is_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]))
+if sqlite_production:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_engine_options(app.config)
+
 # Initialize the app with the extension
-db.init_app(app)
\ No newline at end of file
+db.init_app(app)
+
+if sqlite_production:
+    init_sqlite_profile(app, db)
+
+def dispose_inherited_connections():
+    """Drop pooled connections inherited from a parent process without closing them.
+
+    The parent (e.g. a gunicorn master running with --preload) still owns
+    those sockets and file handles; the child opens its own on first use.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=dispose_inherited_connections)
+
+# Chat streaming: seconds between keep-alive comments (each one also checks the
+# database for newer messages sent through other workers) and per-subscriber backlog
+app.config["CHAT_STREAM_HEARTBEAT"] = int(os.environ.get("CHAT_STREAM_HEARTBEAT", 15))
+app.config["CHAT_STREAM_QUEUE_SIZE"] = int(os.environ.get("CHAT_STREAM_QUEUE_SIZE", 100))
+# Open streams one worker may hold; keep it below gunicorn's `threads`
+app.config["CHAT_STREAM_MAX_PER_WORKER"] = int(os.environ.get("CHAT_STREAM_MAX_PER_WORKER", 24))
+
+# Dashboard snapshot cache (in-process, per worker)
+app.config["DASHBOARD_CACHE_TTL"] = int(os.environ.get("DASHBOARD_CACHE_TTL", 300))
+app.config["DASHBOARD_CACHE_MAX_ENTRIES"] = int(os.environ.get("DASHBOARD_CACHE_MAX_ENTRIES", 5000))
+app.config["DASHBOARD_CACHE_MAX_BYTES"] = int(os.environ.get("DASHBOARD_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Identity cache: seconds a logged-in user's row may be reused without a query
+# (0 disables it; writes from other workers are seen only after it expires)
+app.config["IDENTITY_CACHE_TTL"] = float(os.environ.get("IDENTITY_CACHE_TTL", 0))
+
+# Group chat sharding: a room stops taking new members once it reaches either
+# limit and the next member opens a new shard (0 disables the activity limit)
+app.config["GROUP_SHARD_MAX_MEMBERS"] = int(os.environ.get("GROUP_SHARD_MAX_MEMBERS", 250))
+app.config["GROUP_SHARD_MAX_DAILY_MESSAGES"] = int(os.environ.get("GROUP_SHARD_MAX_DAILY_MESSAGES", 2000))
+
+# Write-behind for tracking and chat writes: "off", "group" or "async" (see writebehind.py)
+app.config["WRITE_BEHIND"] = os.environ.get("WRITE_BEHIND", "off")
+app.config["WRITE_BEHIND_QUEUE_SIZE"] = int(os.environ.get("WRITE_BEHIND_QUEUE_SIZE", 10000))
+app.config["WRITE_BEHIND_BATCH_SIZE"] = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 200))
+app.config["WRITE_BEHIND_FLUSH_INTERVAL"] = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", 0.02))
+
+# Password hashing (see passwords.py). Hashes made with other parameters are
+# upgraded on the user's next successful login.
+app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+app.config["PASSWORD_HASH_SALT_LENGTH"] = int(os.environ.get("PASSWORD_HASH_SALT_LENGTH", 16))
+app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+app.config["PASSWORD_HASH_MAX_PENDING"] = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 16))
+app.config["LOGIN_MAX_CONCURRENT_PER_ADDRESS"] = int(os.environ.get("LOGIN_MAX_CONCURRENT_PER_ADDRESS", 4))
+app.config["LOGIN_MAX_CONCURRENT_PER_NICKNAME"] = int(os.environ.get("LOGIN_MAX_CONCURRENT_PER_NICKNAME", 1))
+
+# Request instrumentation and /metrics (see metrics.py)
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+app.config["METRICS_SLOW_REQUEST_MS"] = int(os.environ.get("METRICS_SLOW_REQUEST_MS", 500))
+app.config["METRICS_N_PLUS_ONE_THRESHOLD"] = int(os.environ.get("METRICS_N_PLUS_ONE_THRESHOLD", 10))  # 0 disables
+
+# Public page cache: rendered landing and info pages (see cache.cached_page);
+# max-age is how long browsers may reuse an anonymous page without asking
+app.config["PAGE_CACHE_TTL"] = int(os.environ.get("PAGE_CACHE_TTL", 300))  # 0 disables
+app.config["PAGE_CACHE_MAX_AGE"] = int(os.environ.get("PAGE_CACHE_MAX_AGE", 60))
+app.config["PAGE_CACHE_MAX_ENTRIES"] = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", 2000))
+app.config["PAGE_CACHE_MAX_BYTES"] = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+# Static assets: serve the fingerprinted build from `flask build-assets` when
+# it exists (see assets.py), with this max-age, and its WebP widths
+app.config["ASSET_MANIFEST"] = os.environ.get("ASSET_MANIFEST", "1") == "1"
+app.config["ASSET_MAX_AGE"] = int(os.environ.get("ASSET_MAX_AGE", 365 * 24 * 3600))
+app.config["ASSET_WEBP_WIDTHS"] = [int(width) for width in os.environ.get("ASSET_WEBP_WIDTHS", "480,960").split(",") if width]
+
+# Trend charts: most buckets one /api/trends response may return
+app.config["TRENDS_MAX_BUCKETS"] = int(os.environ.get("TRENDS_MAX_BUCKETS", 120))
+
+# Chat archival: messages older than this many days move into compressed
+# archive blocks of this many messages when `flask archive-chat` runs
+app.config["CHAT_ARCHIVE_AFTER_DAYS"] = int(os.environ.get("CHAT_ARCHIVE_AFTER_DAYS", 90))
+app.config["CHAT_ARCHIVE_BLOCK_SIZE"] = int(os.environ.get("CHAT_ARCHIVE_BLOCK_SIZE", 500))
+
+# Structured logging (see logs.py): "basic" or "json". In json mode, the root
+# level, per-logger levels as "name=LEVEL,...", the queue bound, and the
+# per-second cap on successful access lines for the listed endpoints
+app.config["LOG_MODE"] = os.environ.get("LOG_MODE", "basic")
+app.config["LOG_LEVEL"] = os.environ.get("LOG_LEVEL", "INFO").upper()
+app.config["LOG_LEVELS"] = os.environ.get("LOG_LEVELS", "werkzeug=WARNING,sqlalchemy=WARNING")
+app.config["LOG_QUEUE_SIZE"] = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+app.config["LOG_SAMPLE_PER_SECOND"] = float(os.environ.get("LOG_SAMPLE_PER_SECOND", 5))
+app.config["LOG_SAMPLED_ENDPOINTS"] = os.environ.get("LOG_SAMPLED_ENDPOINTS", "track_mood,track_habit,track_emotion,send_message")
+
+# Write backpressure (see ratelimit.py): per-endpoint budgets as
+# "endpoint=requests/seconds,...", applied per user and, this many times
+# larger, per client address; and the most buckets one worker keeps
+app.config["RATE_LIMIT_ENABLED"] = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+app.config["RATE_LIMITS"] = os.environ.get("RATE_LIMITS", "send_message=20/10,track_mood=10/60,track_habit=30/60,track_emotion=10/60")
+app.config["RATE_LIMIT_ADDRESS_FACTOR"] = int(os.environ.get("RATE_LIMIT_ADDRESS_FACTOR", 4))
+app.config["RATE_LIMIT_MAX_KEYS"] = int(os.environ.get("RATE_LIMIT_MAX_KEYS", 100000))
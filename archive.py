@@ -0,0 +1,139 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import delete, func, insert, select
+from app import app, db
+from models import ChatArchiveBlock, ChatArchiveAuthor, ChatMessage, User
+
+# Hot/cold chat history.
+#
+# archive_chat() moves messages older than CHAT_ARCHIVE_AFTER_DAYS out of
+# chat_message into chat_archive_block rows. Each row holds up to
+# CHAT_ARCHIVE_BLOCK_SIZE consecutive messages of one group as
+# zlib-compressed JSON. Per group, every archived message has a lower id
+# than every hot one, so a before_id cursor simply continues from the hot
+# table into the blocks (see chat.fetch_messages). The newest message
+# overall always stays hot: SQLite hands out max(id) + 1 for new rows, so an
+# empty hot table would start reusing archived ids.
+
+MESSAGE_FIELDS = ('id', 'user_id', 'group_chat_id', 'content', 'created_at', 'is_moderated')
+
+def _pack(rows):
+    return zlib.compress(json.dumps([
+        [row.id, row.user_id, row.group_chat_id, row.content, row.created_at.isoformat() if row.created_at else None,
+         bool(row.is_moderated)]
+        for row in rows
+    ], separators=(',', ':')).encode('utf-8'), 6)
+
+def unpack_block(payload):
+    return [dict(zip(MESSAGE_FIELDS, values)) for values in json.loads(zlib.decompress(payload))]
+
+def archive_chat(older_than=None, block_size=None, group_chat_id=None, dry_run=False):
+    """Move chat messages older than `older_than` into compressed archive blocks.
+
+    Works one group and one block at a time, committing each block together
+    with the deletion of its hot rows. Yields (group_chat_id, messages
+    archived) per group; with dry_run nothing is written and the counts are
+    what would move.
+    """
+    older_than = older_than or timedelta(days=app.config['CHAT_ARCHIVE_AFTER_DAYS'])
+    block_size = block_size or app.config['CHAT_ARCHIVE_BLOCK_SIZE']
+    cutoff = datetime.utcnow() - older_than
+    newest_id = db.session.execute(select(func.max(ChatMessage.id))).scalar()
+    if newest_id is None:
+        return
+
+    # Per group, the newest message old enough to archive; everything at or below it moves
+    stmt = (
+        select(ChatMessage.group_chat_id, func.max(ChatMessage.id))
+        .where(ChatMessage.created_at < cutoff, ChatMessage.id < newest_id)
+        .group_by(ChatMessage.group_chat_id)
+    )
+    if group_chat_id is not None:
+        stmt = stmt.where(ChatMessage.group_chat_id == group_chat_id)
+    boundaries = db.session.execute(stmt).all()
+
+    for group_id, last_id in boundaries:
+        if dry_run:
+            yield group_id, db.session.execute(
+                select(func.count()).where(ChatMessage.group_chat_id == group_id, ChatMessage.id <= last_id)
+            ).scalar()
+            continue
+
+        moved = 0
+        while True:
+            rows = db.session.execute(
+                select(*[getattr(ChatMessage, field) for field in MESSAGE_FIELDS])
+                .where(ChatMessage.group_chat_id == group_id, ChatMessage.id <= last_id)
+                .order_by(ChatMessage.id)
+                .limit(block_size)
+            ).all()
+            if not rows:
+                break
+
+            block = ChatArchiveBlock(
+                group_chat_id=group_id,
+                first_message_id=rows[0].id,
+                last_message_id=rows[-1].id,
+                message_count=len(rows),
+                first_created_at=rows[0].created_at,
+                last_created_at=rows[-1].created_at,
+                payload=_pack(rows),
+            )
+            db.session.add(block)
+            db.session.flush()
+            db.session.execute(insert(ChatArchiveAuthor), [
+                {'block_id': block.id, 'user_id': user_id} for user_id in sorted({row.user_id for row in rows})
+            ])
+            # The block is exactly the group's messages in this id range
+            db.session.execute(
+                delete(ChatMessage).where(ChatMessage.group_chat_id == group_id,
+                                          ChatMessage.id.between(rows[0].id, rows[-1].id)),
+                execution_options={'synchronize_session': False},
+            )
+            db.session.commit()
+            moved += len(rows)
+        yield group_id, moved
+
+def _with_authors(messages):
+    """Turn archived message dicts into objects shaped like ChatMessage rows, authors loaded in one query"""
+    user_ids = {message['user_id'] for message in messages}
+    nicknames = dict(db.session.execute(select(User.id, User.nickname).where(User.id.in_(user_ids))).all()) if user_ids else {}
+    return [
+        SimpleNamespace(
+            **{**message, 'created_at': datetime.fromisoformat(message['created_at']) if message['created_at'] else None},
+            user=SimpleNamespace(id=message['user_id'], nickname=nicknames.get(message['user_id'], 'Former member')),
+            archived=True,
+        )
+        for message in messages
+    ]
+
+def fetch_archived(group_chat_id, before_id=None, limit=50):
+    """Archived messages older than before_id, newest first; returns (messages, has_more)"""
+    stmt = select(ChatArchiveBlock.payload).where(ChatArchiveBlock.group_chat_id == group_chat_id)
+    if before_id is not None:
+        stmt = stmt.where(ChatArchiveBlock.first_message_id < before_id)
+    if limit <= 0:
+        return [], db.session.execute(stmt.limit(1)).first() is not None
+
+    collected = []
+    result = db.session.execute(stmt.order_by(ChatArchiveBlock.last_message_id.desc()), execution_options={'yield_per': 4})
+    for (payload,) in result:
+        for message in reversed(unpack_block(payload)):
+            if before_id is None or message['id'] < before_id:
+                collected.append(message)
+        if len(collected) > limit:
+            break
+    result.close()
+    return _with_authors(collected[:limit]), len(collected) > limit
+
+def iter_archived_for_user(user_id):
+    """Yield lists of one user's archived messages as plain dicts, one block at a time"""
+    block_ids = select(ChatArchiveAuthor.block_id).where(ChatArchiveAuthor.user_id == user_id)
+    result = db.session.execute(
+        select(ChatArchiveBlock.payload).where(ChatArchiveBlock.id.in_(block_ids)).order_by(ChatArchiveBlock.id),
+        execution_options={'yield_per': 4},
+    )
+    for (payload,) in result:
+        yield [message for message in unpack_block(payload) if message['user_id'] == user_id]
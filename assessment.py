@@ -1,5 +1,6 @@
 import json
 from datetime import datetime
+from functools import lru_cache
 
 # Mental Health Assessment Questions - Designed to identify emotional state and healing approach
 ASSESSMENT_QUESTIONS = [
@@ -133,30 +134,120 @@ COLOR_IDENTITIES = {
     }
 }
 
+# Question bank compiled once at import.
+#
+# QUESTION_INDEX maps a question id to its row and OPTION_WEIGHTS[row][option]
+# holds that option's (color, weight) pairs in declaration order. For batch
+# scoring, _batch_tables() imports NumPy on first use (keeping it out of
+# application startup) and builds a weight tensor [row, option, color] holding
+# the same weights densely and a rank tensor [row, option, color] holding the
+# order in which calculate_color_identity would first see each color, so batch scoring
+# reproduces its tie-breaking exactly. Both tensors carry one extra all-empty
+# option per question that unanswered questions point at.
+
+def _compile_question_bank(questions):
+    colors = []
+    for question in questions:
+        for option in question['options']:
+            for color in option['color_weight']:
+                if color not in colors:
+                    colors.append(color)
+    question_index = {}
+    for row, question in enumerate(questions):
+        question_index.setdefault(question['id'], row)
+    option_weights = [[tuple(option['color_weight'].items()) for option in question['options']]
+                      for question in questions]
+    return colors, question_index, option_weights
+
+SCORING_COLORS, QUESTION_INDEX, OPTION_WEIGHTS = _compile_question_bank(ASSESSMENT_QUESTIONS)
+OPTION_COUNTS = [len(options) for options in OPTION_WEIGHTS]
+
+@lru_cache(maxsize=None)
+def _batch_tables():
+    """(np, weight tensor, rank tensor, unanswered option, rank stride, not-seen rank), or None without NumPy"""
+    try:
+        import numpy as np
+    except ImportError:  # score_batch falls back to the compiled lookup tables
+        return None
+    
+    unanswered = max(OPTION_COUNTS)
+    rank_stride = max(len(weights) for options in OPTION_WEIGHTS for weights in options)
+    not_seen = np.iinfo(np.int32).max
+    
+    weight_tensor = np.zeros((len(OPTION_WEIGHTS), unanswered + 1, len(SCORING_COLORS)), dtype=np.int32)
+    rank_tensor = np.full(weight_tensor.shape, not_seen, dtype=np.int32)
+    for row, options in enumerate(OPTION_WEIGHTS):
+        for option, weights in enumerate(options):
+            for position, (color, weight) in enumerate(weights):
+                column = SCORING_COLORS.index(color)
+                weight_tensor[row, option, column] = weight
+                rank_tensor[row, option, column] = row * rank_stride + position
+    return np, weight_tensor, rank_tensor, unanswered, rank_stride, not_seen
+
 def calculate_color_identity(responses):
     """Calculate color identity based on assessment responses"""
     color_scores = {}
     
     for response in responses:
-        question_id = response['question_id']
+        row = QUESTION_INDEX.get(response['question_id'])
         selected_option = response['selected_option']
         
-        # Find the question and option
-        question = next((q for q in ASSESSMENT_QUESTIONS if q['id'] == question_id), None)
-        if question and selected_option < len(question['options']):
-            option = question['options'][selected_option]
-            
+        if row is not None and selected_option < OPTION_COUNTS[row]:
             # Add color weights to scores
-            for color, weight in option['color_weight'].items():
+            for color, weight in OPTION_WEIGHTS[row][selected_option]:
                 color_scores[color] = color_scores.get(color, 0) + weight
     
-    # Find the color with the highest score
+    # Find the color with the highest score; ties go to the color seen first
     if color_scores:
         dominant_color = max(color_scores.keys(), key=lambda color: color_scores[color])
         return dominant_color
     
     return "blue"  # Default fallback
 
+def score_batch(responses_matrix):
+    """Score many assessments at once.
+
+    responses_matrix is an (n, len(ASSESSMENT_QUESTIONS)) array of selected
+    option indexes, one column per question in ASSESSMENT_QUESTIONS order;
+    -1 marks an unanswered question. Returns a list of n color identities,
+    each identical to calculate_color_identity() on the same answers given
+    in question order.
+    """
+    tables = _batch_tables()
+    if tables is None:
+        return [
+            calculate_color_identity([
+                {'question_id': ASSESSMENT_QUESTIONS[row]['id'], 'selected_option': int(option)}
+                for row, option in enumerate(answers) if option >= 0
+            ])
+            for answers in responses_matrix
+        ]
+    
+    np, weight_tensor, rank_tensor, unanswered, rank_stride, not_seen = tables
+    answers = np.asarray(responses_matrix, dtype=np.int64)
+    if answers.ndim != 2 or answers.shape[1] != len(ASSESSMENT_QUESTIONS):
+        raise ValueError(f"responses_matrix must have shape (n, {len(ASSESSMENT_QUESTIONS)})")
+    
+    answered = (answers >= 0) & (answers < np.asarray(OPTION_COUNTS))
+    options = np.where(answered, answers, unanswered)
+    
+    # Gather each question's weight and first-seen rank rows, one column at a time
+    scores = np.zeros((len(answers), len(SCORING_COLORS)), dtype=np.int32)
+    ranks = np.full(scores.shape, not_seen, dtype=np.int32)
+    for row in range(answers.shape[1]):
+        scores += weight_tensor[row][options[:, row]]
+        np.minimum(ranks, rank_tensor[row][options[:, row]], out=ranks)
+    
+    # Highest score wins, then the color seen first; unseen colors never win
+    seen = ranks != not_seen
+    rank_span = answers.shape[1] * rank_stride
+    keys = np.where(seen, scores.astype(np.int64) * rank_span - ranks, np.iinfo(np.int64).min)
+    winners = keys.argmax(axis=1)
+    
+    colors = np.asarray(SCORING_COLORS, dtype=object)[winners]
+    colors[~seen.any(axis=1)] = "blue"  # Default fallback
+    return colors.tolist()
+
 def get_color_identity_info(color):
     """Get detailed information about a color identity"""
     return COLOR_IDENTITIES.get(color, COLOR_IDENTITIES["blue"])
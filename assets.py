@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import threading
+from flask import request, send_from_directory
+from app import app
+
+# Fingerprinted, precompressed static assets.
+#
+# `flask build-assets` copies every file under static/ to static/build/ with
+# a content hash in its name, pre-writes .gz and .br variants of text assets,
+# and renders WebP versions of raster images at ASSET_WEBP_WIDTHS. It records
+# all of this in static/build/manifest.json.
+#
+# With a manifest in place, url_for('static', filename=...) points at the
+# hashed copy. Hashed copies are served with a year-long immutable
+# Cache-Control, as the best precompressed variant the client accepts.
+# Without a manifest, static files are served exactly as before.
+
+BUILD_DIR = 'build'
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+RASTER_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Brotli and Pillow are optional and only needed by build_assets, so they
+# are imported there rather than at startup
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:  # build_assets then writes gzip variants only
+        return None
+    return brotli
+
+def _image_module():
+    try:
+        from PIL import Image
+    except ImportError:  # build_assets then skips WebP variants
+        return None
+    return Image
+
+_manifest_lock = threading.Lock()
+_manifest = None
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def hashed_name(filename, digest, suffix=None):
+    base, extension = os.path.splitext(filename)
+    return f"{base}{suffix or ''}.{digest}{extension}"
+
+def _is_compressible(filename):
+    mimetype = mimetypes.guess_type(filename)[0] or ''
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+def _write_variants(path, data, brotli=None):
+    """Pre-write .gz/.br next to a built file when they are smaller; returns the encodings written"""
+    encodings = []
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(compressed)
+            encodings.append('br')
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        with open(path + '.gz', 'wb') as f:
+            f.write(compressed)
+        encodings.append('gzip')
+    return encodings
+
+def _write_webp(Image, source_path, filename, build_root, widths):
+    """Resized WebP renditions of a raster image, keyed by width ('full' for the original size)"""
+    try:
+        with Image.open(source_path) as image:
+            image.load()
+            renditions = {}
+            for width in sorted(set(w for w in widths if w < image.width)) + [None]:
+                resized = image if width is None else image.resize(
+                    (width, round(image.height * width / image.width)), Image.LANCZOS)
+                target = os.path.splitext(filename)[0] + ('' if width is None else f'-{width}w') + '.webp'
+                temporary = os.path.join(build_root, target + '.tmp')
+                os.makedirs(os.path.dirname(temporary), exist_ok=True)
+                resized.save(temporary, 'WEBP', quality=80, method=6)
+                with open(temporary, 'rb') as f:
+                    built = hashed_name(target, fingerprint(f.read()))
+                os.replace(temporary, os.path.join(build_root, built))
+                renditions['full' if width is None else str(width)] = f"{BUILD_DIR}/{built}"
+            return renditions
+    except (OSError, ValueError) as e:
+        logging.warning(f"Skipping WebP for {filename}: {e}")
+        return {}
+
+def build_assets(static_folder, widths=()):
+    """Rebuild static/build and its manifest; returns the manifest"""
+    build_root = os.path.join(static_folder, BUILD_DIR)
+    if os.path.isdir(build_root):
+        shutil.rmtree(build_root)
+
+    brotli, Image = _brotli(), _image_module()
+    manifest = {'assets': {}, 'encodings': {}, 'webp': {}}
+    for directory, subdirectories, files in os.walk(static_folder):
+        subdirectories[:] = [d for d in subdirectories if os.path.join(directory, d) != build_root]
+        for name in sorted(files):
+            source_path = os.path.join(directory, name)
+            filename = os.path.relpath(source_path, static_folder).replace(os.sep, '/')
+            with open(source_path, 'rb') as f:
+                data = f.read()
+
+            built = hashed_name(filename, fingerprint(data))
+            target_path = os.path.join(build_root, built)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with open(target_path, 'wb') as f:
+                f.write(data)
+            manifest['assets'][filename] = f"{BUILD_DIR}/{built}"
+
+            if _is_compressible(filename):
+                encodings = _write_variants(target_path, data, brotli)
+                if encodings:
+                    manifest['encodings'][f"{BUILD_DIR}/{built}"] = encodings
+
+            if Image is not None and filename.lower().endswith(RASTER_EXTENSIONS):
+                renditions = _write_webp(Image, source_path, filename, build_root, widths)
+                if renditions:
+                    manifest['webp'][filename] = renditions
+
+    with open(os.path.join(build_root, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def load_manifest(reload=False):
+    """The build manifest, read once per process (empty when no build exists)"""
+    global _manifest
+    if _manifest is None or reload:
+        with _manifest_lock:
+            if _manifest is None or reload:
+                path = os.path.join(app.static_folder, BUILD_DIR, 'manifest.json')
+                manifest = {'assets': {}, 'encodings': {}, 'webp': {}}
+                if app.config['ASSET_MANIFEST'] and os.path.exists(path):
+                    with open(path) as f:
+                        manifest = json.load(f)
+                manifest['built'] = set(manifest['assets'].values()) | {
+                    url for renditions in manifest['webp'].values() for url in renditions.values()}
+                _manifest = manifest
+    return _manifest
+
+@app.url_defaults
+def _fingerprint_static_urls(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = load_manifest()['assets'].get(values['filename'], values['filename'])
+
+def webp_srcset(filename):
+    """srcset value listing the resized WebP renditions of a raster image ('' if none were built)"""
+    renditions = load_manifest()['webp'].get(filename, {})
+    return ', '.join(
+        f"{app.static_url_path}/{url} {width}w" for width, url in sorted(
+            ((width, url) for width, url in renditions.items() if width != 'full'), key=lambda item: int(item[0])))
+
+app.jinja_env.globals['webp_srcset'] = webp_srcset
+
+def serve_static(filename):
+    """Static route: hashed assets get immutable caching and precompressed bodies"""
+    manifest = load_manifest()
+    if filename not in manifest['built']:
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = next((encoding for encoding in manifest['encodings'].get(filename, ())
+                     if encoding in request.accept_encodings), None)
+    suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+    response = send_from_directory(app.static_folder, filename + suffix,
+                                   mimetype=mimetype, max_age=app.config['ASSET_MAX_AGE'])
+    if encoding:
+        response.content_encoding = encoding
+    if manifest['encodings'].get(filename):
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+app.view_functions['static'] = serve_static
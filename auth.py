@@ -0,0 +1,104 @@
+import threading
+import time
+from functools import wraps
+from flask import g, session, redirect, url_for, jsonify
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app import app, db
+from models import User
+
+# Optional in-process identity cache.
+#
+# Disabled unless IDENTITY_CACHE_TTL > 0. Entries are detached copies of the
+# user and their group, re-attached to each request's session with
+# merge(load=False) so no SELECT is issued. Any flush that touches a User in
+# this process drops its entry and bumps its version; the version check on
+# store stops a request that loaded before the write from caching stale data.
+# Writes made by other workers are only seen once the TTL expires.
+_identity_lock = threading.Lock()
+_identity_cache = {}
+_identity_versions = {}
+
+def _detached_copy(instance):
+    """Clean, detached copy of a loaded row, holding only its column values"""
+    mapper = type(instance).__mapper__
+    copy = mapper.class_manager.new_instance()
+    for column in mapper.column_attrs:
+        set_committed_value(copy, column.key, getattr(instance, column.key))
+    make_transient_to_detached(copy)
+    return copy
+
+def _cache_identity(user, version):
+    copy = _detached_copy(user)
+    group_chat = _detached_copy(user.group_chat) if user.group_chat is not None else None
+    set_committed_value(copy, 'group_chat', group_chat)
+    expires_at = time.monotonic() + app.config['IDENTITY_CACHE_TTL']
+    with _identity_lock:
+        if _identity_versions.get(user.id, 0) == version:
+            _identity_cache[user.id] = (copy, expires_at)
+
+def _cached_identity(user_id):
+    with _identity_lock:
+        entry = _identity_cache.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del _identity_cache[user_id]
+            return None
+        return db.session.merge(entry[0], load=False)
+
+def invalidate_identity(user_id):
+    with _identity_lock:
+        _identity_cache.pop(user_id, None)
+        _identity_versions[user_id] = _identity_versions.get(user_id, 0) + 1
+
+@event.listens_for(db.session, 'before_flush')
+def _invalidate_flushed_users(session, flush_context, instances):
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User):
+            invalidate_identity(instance.id)
+
+def load_user(user_id):
+    """Fetch a user together with their group chat in a single query"""
+    caching = app.config['IDENTITY_CACHE_TTL'] > 0
+    if caching:
+        user = _cached_identity(user_id)
+        if user is not None:
+            return user
+        with _identity_lock:
+            version = _identity_versions.get(user_id, 0)
+
+    user = User.query.options(joinedload(User.group_chat)).filter(User.id == user_id).first()
+
+    if caching and user is not None:
+        _cache_identity(user, version)
+    return user
+
+def current_user():
+    """The logged-in user for this request, loaded at most once and kept on flask.g"""
+    if '_current_user' not in g:
+        user_id = session.get('user_id')
+        g._current_user = load_user(user_id) if user_id is not None else None
+    return g._current_user
+
+def login_required(view=None, *, api=False):
+    """Require a logged-in user; browsers are sent to register, API callers get 401.
+
+    A session pointing at a user that no longer exists is cleared.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if current_user() is None:
+                if 'user_id' in session:
+                    session.clear()
+                if api:
+                    return jsonify({'error': 'Not logged in'}), 401
+                return redirect(url_for('register'))
+            return view(*args, **kwargs)
+        return wrapped
+
+    if view is not None:
+        return decorator(view)
+    return decorator
@@ -0,0 +1,73 @@
+"""Assessment scoring: equivalence check and microbenchmark.
+
+Scores every possible combination of answers (4^8 for the current bank)
+with the original per-response scan, the compiled scalar scorer and the
+batch scorer, asserts all three agree, then times each. The batch scorer
+gets an ndarray when NumPy is installed and is warmed up first, so its
+time excludes the lazy NumPy import and table build.
+
+    python benchmarks/assessment_scoring.py
+"""
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assessment import ASSESSMENT_QUESTIONS, calculate_color_identity, score_batch
+
+def reference_color_identity(responses):
+    """The scorer as it was before the question bank was compiled"""
+    color_scores = {}
+    for response in responses:
+        question_id = response['question_id']
+        selected_option = response['selected_option']
+        question = next((q for q in ASSESSMENT_QUESTIONS if q['id'] == question_id), None)
+        if question and selected_option < len(question['options']):
+            option = question['options'][selected_option]
+            for color, weight in option['color_weight'].items():
+                color_scores[color] = color_scores.get(color, 0) + weight
+    if color_scores:
+        return max(color_scores.keys(), key=lambda color: color_scores[color])
+    return "blue"
+
+def as_responses(answers):
+    return [{'question_id': question['id'], 'selected_option': option}
+            for question, option in zip(ASSESSMENT_QUESTIONS, answers) if option >= 0]
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{elapsed * 1000:>10.1f} ms  {elapsed / count * 1e6:>8.2f} us/assessment")
+    return result
+
+def main():
+    ranges = [range(len(question['options'])) for question in ASSESSMENT_QUESTIONS]
+    combinations = list(itertools.product(*ranges))
+    responses = [as_responses(answers) for answers in combinations]
+    count = len(combinations)
+    print(f"{count} answer combinations\n")
+
+    expected = timed('reference (linear scan)', count, lambda: [reference_color_identity(r) for r in responses])
+    scalar = timed('calculate_color_identity', count, lambda: [calculate_color_identity(r) for r in responses])
+    try:
+        import numpy
+        matrix = numpy.asarray(combinations)
+    except ImportError:
+        matrix = combinations
+    score_batch(matrix[:1])  # imports NumPy and builds the tables
+    batch = timed('score_batch', count, lambda: score_batch(matrix))
+
+    assert scalar == expected, "compiled scalar scorer disagrees with the reference"
+    assert batch == expected, "batch scorer disagrees with the reference"
+
+    # Partially answered assessments exercise the tie-breaking on fewer weights
+    partial = [tuple(-1 if (n >> row) & 1 else option for row, option in enumerate(answers))
+               for n, answers in enumerate(combinations[::7])]
+    assert score_batch(partial) == [reference_color_identity(as_responses(a)) for a in partial]
+    print("\nAll scorers agree on every combination")
+
+if __name__ == '__main__':
+    main()
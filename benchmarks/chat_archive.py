@@ -0,0 +1,117 @@
+"""Chat latency as total history grows, before and after archival.
+
+For each --sizes total, seeds a fresh SQLite database with that many chat
+messages spread evenly over --groups groups and over the past --days days.
+It then times the reader's chat page and a deep scroll-back (the messages
+API with a before_id near the start of their group's history). Messages
+older than CHAT_ARCHIVE_AFTER_DAYS are then archived and both reads are
+timed again. Each size runs in a fresh process.
+
+    python benchmarks/chat_archive.py --sizes 10000 100000 1000000
+    python benchmarks/chat_archive.py --sizes 10000000 --groups 200
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def boot(path):
+    sys.path.insert(0, ROOT)
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+def timed(client, url, repeat):
+    client.get(url)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+    return (time.perf_counter() - started) / repeat * 1000
+
+def run(size, groups, days, repeat, results):
+    path = tempfile.mktemp(suffix='.db')
+    app = boot(path)
+    from app import db
+    from models import ChatMessage, GroupChat, User
+    from archive import archive_chat
+
+    client = app.test_client()
+    client.post('/register', data={'nickname': 'reader', 'password': 'pw'})
+    client.post('/assessment', data={f'question_{n}': '1' for n in range(1, 9)})
+
+    now = datetime.utcnow()
+    with app.app_context():
+        reader = User.query.filter_by(nickname='reader').first()
+        for n in range(groups - 1):
+            db.session.add(GroupChat(name=f'Room {n}', color_identity='blue', shard=n + 2))
+        db.session.commit()
+        group_ids = [reader.group_chat_id] + [g.id for g in GroupChat.query.filter(GroupChat.id != reader.group_chat_id)][:groups - 1]
+
+        # Oldest first, so ids rise with created_at as they do in production
+        step = days * 86400 / size
+        for offset in range(0, size, 50000):
+            db.session.execute(db.insert(ChatMessage), [
+                {'user_id': reader.id, 'group_chat_id': group_ids[n % len(group_ids)], 'is_moderated': False,
+                 'content': f'message {n}: thank you all for being here today',
+                 'created_at': now - timedelta(seconds=(size - n) * step)}
+                for n in range(offset, min(offset + 50000, size))
+            ])
+            db.session.commit()
+        oldest = db.session.execute(
+            db.select(db.func.min(ChatMessage.id)).where(ChatMessage.group_chat_id == reader.group_chat_id)
+        ).scalar()
+
+    with client.session_transaction() as session:
+        session['user_id'] = reader.id
+    scroll = f'/chat/{reader.group_chat_id}/messages?before_id={oldest + 50 * groups}&limit=50'
+
+    row = {'size': size, 'page': timed(client, '/chat', repeat), 'scroll': timed(client, scroll, repeat)}
+    with app.app_context():
+        started = time.perf_counter()
+        row['archived'] = sum(moved for _, moved in archive_chat())
+        row['archive_seconds'] = time.perf_counter() - started
+        row['hot'] = ChatMessage.query.count()
+    row['page_after'] = timed(client, '/chat', repeat)
+    row['scroll_after'] = timed(client, scroll, repeat)
+    row['scroll_ids'] = [m['id'] for m in client.get(scroll).get_json()['messages']]
+    os.remove(path)
+    results.put(row)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    print(f"{'messages':>10}{'page ms':>9}{'scroll ms':>11}{'archived':>10}{'in s':>7}{'hot':>9}"
+          f"{'page ms':>9}{'scroll ms':>11}")
+    failed = False
+    for size in args.sizes:
+        process = context.Process(target=run, args=(size, args.groups, args.days, args.repeat, results))
+        process.start()
+        row = results.get()
+        process.join()
+        print(f"{row['size']:>10}{row['page']:>9.2f}{row['scroll']:>11.2f}{row['archived']:>10}"
+              f"{row['archive_seconds']:>7.1f}{row['hot']:>9}{row['page_after']:>9.2f}{row['scroll_after']:>11.2f}")
+        if len(row['scroll_ids']) != 50 or row['scroll_ids'] != sorted(row['scroll_ids']):
+            failed = True
+    if failed:
+        sys.exit("Scrolling back across the archive returned the wrong page")
+
+if __name__ == '__main__':
+    main()
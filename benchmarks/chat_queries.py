@@ -0,0 +1,84 @@
+"""Check that chat reads issue a constant number of SQL statements.
+
+Fills one group with messages from many different authors on an isolated
+SQLite database. It then counts the statements behind the chat page as the
+page fills up, and behind the messages API at several ?limit= sizes. A page
+the hot table cannot fill continues into the archive with exactly one more
+statement. Exits non-zero if a request takes the wrong path, or if its count
+differs from the others on the same path, which would mean authors are
+being lazy-loaded one by one again.
+
+    python benchmarks/chat_queries.py --authors 60
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--authors', type=int, default=60)
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app, db
+    from sqlalchemy import event
+    from chat import CHAT_PAGE_SIZE
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *rest: statements.append(statement))
+
+    answers = {f'question_{n}': '1' for n in range(1, 9)}
+
+    def measure(client, url, messages, limit):
+        """(statements, whether the archive was read, whether it should have been)"""
+        statements.clear()
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        archived = any('chat_archive_block' in statement for statement in statements)
+        return len(statements), archived, messages <= limit
+
+    page_counts, api_counts = {}, {}
+    reader = None
+    for n in range(args.authors):
+        client = app.test_client()
+        client.post('/register', data={'nickname': f'author{n}', 'password': 'pw'})
+        client.post('/assessment', data=answers)
+        client.post('/send_message', data={'content': f'message {n}'})
+        reader = reader or client
+        if n + 1 in (1, 10, 50, args.authors):
+            page_counts[n + 1] = measure(reader, '/chat', n + 1, CHAT_PAGE_SIZE)
+
+    with app.app_context():
+        from models import User
+        group_id = User.query.filter_by(nickname='author0').first().group_chat_id
+    for limit in (1, 10, 50, 200):
+        api_counts[limit] = measure(reader, f'/chat/{group_id}/messages?limit={limit}', args.authors, limit)
+
+    print(f"{'request':<36}{'statements':>10}{'path':>9}")
+    for messages, (count, archived, _) in page_counts.items():
+        print(f"{f'GET /chat ({messages} messages)':<36}{count:>10}{'archive' if archived else 'hot':>9}")
+    for limit, (count, archived, _) in api_counts.items():
+        print(f"{f'GET messages API (limit={limit})':<36}{count:>10}{'archive' if archived else 'hot':>9}")
+
+    os.remove(path)
+    for counts in (page_counts, api_counts):
+        if any(archived != expected for _, archived, expected in counts.values()):
+            sys.exit("A chat read took the wrong path into the archive")
+        hot = {count for count, archived, _ in counts.values() if not archived}
+        archive = {count for count, archived, _ in counts.values() if archived}
+        if len(hot) > 1 or len(archive) > 1 or (hot and archive and archive != {min(hot) + 1}):
+            sys.exit("Statement count grows with the number of messages")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Open chat streams per worker against a real server, as deployed.
+
+Starts gunicorn with the repo's gunicorn.conf.py (gthread workers) on an
+isolated SQLite database, or uses the server at --url. Registers one user
+per stream, then opens --streams concurrent /chat/<id>/stream connections
+and counts how many are served (200) and how many are refused (503, after
+which the chat page polls). While the streams are held it reports the
+latency of ordinary requests. It then sends one message per group and
+reports how long the open streams take to deliver it. Messages sent through
+another worker arrive on the next heartbeat.
+
+    python benchmarks/chat_stream_capacity.py --streams 40 --workers 1
+"""
+import argparse
+import http.client
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0.0
+
+class Client:
+    """A logged-in browser: one session cookie, a new connection per request"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.cookie = None
+
+    def connect(self, timeout=30):
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def request(self, method, path, data=None, connection=None):
+        connection = connection or self.connect()
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        cookie = response.getheader('Set-Cookie')
+        if cookie and cookie.startswith('session='):
+            self.cookie = cookie.split(';', 1)[0]
+        return connection, response
+
+    def fetch(self, method, path, data=None):
+        connection, response = self.request(method, path, data)
+        body = response.read().decode()
+        connection.close()
+        return response.status, body
+
+def start_server(port, workers, env):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), 'main:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit("gunicorn exited during startup; is it installed?")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit("gunicorn did not start listening")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--streams', type=int, default=40, help='streams to open')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--probes', type=int, default=200, help='ordinary requests timed while streams are open')
+    parser.add_argument('--heartbeat', type=int, default=15)
+    parser.add_argument('--url', help='measure this running server instead of starting gunicorn')
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            host, port = '127.0.0.1', probe.getsockname()[1]
+        path = tempfile.mktemp(suffix='.db')
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', RATE_LIMIT_ENABLED='0',
+                   CHAT_STREAM_HEARTBEAT=str(args.heartbeat))
+        server = start_server(port, args.workers, env)
+
+    try:
+        assessment = {f'question_{i}': '2' for i in range(1, 9)}
+        prefix = f'cap{int(time.time())}'
+        users = []
+        for n in range(args.streams):
+            client = Client(host, port)
+            client.fetch('POST', '/register', {'nickname': f'{prefix}_{n}', 'password': 'pw'})
+            client.fetch('POST', '/assessment', assessment)
+            status, page = client.fetch('GET', '/chat')
+            stream_url = re.search(r'data-stream-url="([^"]+)"', page)
+            if status != 200 or not stream_url:
+                sys.exit(f"{prefix}_{n} could not open the chat page ({status})")
+            users.append((client, stream_url.group(1)))
+
+        # Open every stream and keep the served ones reading in the background
+        arrivals = {}
+        arrivals_lock = threading.Lock()
+        open_streams, refused = [], 0
+        for n, (client, stream_url) in enumerate(users):
+            connection, response = client.request('GET', f'{stream_url}?last_event_id=0',
+                                                  connection=client.connect(timeout=None))
+            if response.status != 200:
+                response.read()
+                connection.close()
+                refused += 1
+                continue
+
+            def read(n=n, response=response):
+                for line in response:
+                    if line.startswith(b'data:') and prefix.encode() in line:
+                        with arrivals_lock:
+                            arrivals.setdefault(n, time.perf_counter())
+            threading.Thread(target=read, daemon=True).start()
+            open_streams.append((n, stream_url))
+
+        probe = users[0][0]
+        latencies = []
+        for _ in range(args.probes):
+            started = time.perf_counter()
+            probe.fetch('GET', '/about')
+            latencies.append(time.perf_counter() - started)
+
+        # One message per group that has an open stream
+        senders = {}
+        for n, stream_url in open_streams:
+            senders.setdefault(stream_url, users[n][0])
+        sent_at = time.perf_counter()
+        for client in senders.values():
+            client.fetch('POST', '/send_message', {'content': f'{prefix} capacity probe'})
+        deadline = time.monotonic() + args.heartbeat + 5
+        while len(arrivals) < len(open_streams) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        delivered = [arrivals[n] - sent_at for n, _ in open_streams if n in arrivals]
+
+        print(f"streams requested {args.streams}, served {len(open_streams)}, refused with 503 {refused}")
+        print(f"ordinary requests while held: p50 {percentile(latencies, 0.5):.1f} ms, "
+              f"p99 {percentile(latencies, 0.99):.1f} ms")
+        print(f"delivery to {len(delivered)}/{len(open_streams)} streams: "
+              f"p50 {percentile(delivered, 0.5):.1f} ms, max {max(delivered, default=0) * 1000:.1f} ms")
+    finally:
+        # Streams still open close with this process
+        if server:
+            server.terminate()
+            server.wait()
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
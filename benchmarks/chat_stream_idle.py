@@ -0,0 +1,83 @@
+"""Idle subscriber load test for the chat fan-out broker.
+
+Parks thousands of stream consumers on one worker, each blocked on its
+subscription exactly like the /chat/<group_id>/stream generator does, then
+measures CPU burned while they sit idle and the latency of one fan-out.
+
+    python benchmarks/chat_stream_idle.py --subscribers 5000 --idle 10
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broker import ChatBroker, RESYNC
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--groups', type=int, default=5)
+    parser.add_argument('--idle', type=float, default=10.0, help='seconds to stay idle')
+    parser.add_argument('--heartbeat', type=float, default=15.0)
+    args = parser.parse_args()
+
+    threading.stack_size(256 * 1024)
+    broker = ChatBroker()
+    received = []
+    received_lock = threading.Lock()
+    stop = threading.Event()
+
+    def consumer(group_id):
+        subscription = broker.subscribe(group_id)
+        try:
+            while not stop.is_set():
+                try:
+                    item = subscription.get(timeout=args.heartbeat)
+                except queue.Empty:
+                    continue
+                if item is None or item is RESYNC:
+                    continue
+                with received_lock:
+                    received.append(time.perf_counter() - item['sent_at'])
+        finally:
+            broker.unsubscribe(subscription)
+
+    threads = [threading.Thread(target=consumer, args=(n % args.groups,), daemon=True)
+               for n in range(args.subscribers)]
+    for thread in threads:
+        thread.start()
+    while broker.subscriber_count() < args.subscribers:
+        time.sleep(0.05)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    time.sleep(args.idle)
+    idle_cpu = time.process_time() - cpu_start
+    idle_wall = time.perf_counter() - wall_start
+
+    publish_start = time.perf_counter()
+    for group_id in range(args.groups):
+        broker.publish(group_id, {'id': 1, 'sent_at': time.perf_counter()})
+    publish_time = time.perf_counter() - publish_start
+    while len(received) < args.subscribers and time.perf_counter() - publish_start < 30:
+        time.sleep(0.01)
+
+    stop.set()
+    for group_id in range(args.groups):
+        broker.publish(group_id, None)
+
+    latencies = sorted(received)
+    print(f"subscribers:        {args.subscribers} across {args.groups} groups")
+    print(f"idle CPU:           {idle_cpu:.3f}s over {idle_wall:.1f}s wall ({100 * idle_cpu / idle_wall:.2f}% of one core)")
+    print(f"publish call time:  {publish_time * 1000:.2f} ms for all groups")
+    print(f"delivered:          {len(latencies)}/{args.subscribers}")
+    if latencies:
+        print(f"fan-out latency:    p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms, "
+              f"max {latencies[-1] * 1000:.2f} ms")
+
+if __name__ == '__main__':
+    main()
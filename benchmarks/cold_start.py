@@ -0,0 +1,73 @@
+"""Cold-start time of a worker, from `import main` to the first 200 response.
+
+Each run starts a fresh interpreter that imports main and then serves
+/about through the test client. It reports how long the import took and
+how long until the first 200. The database is prepared once beforehand,
+as gunicorn.conf.py does. A second series also calls
+main.prepare_database() in every process, which is what each worker used to
+pay at import time. Exits non-zero if importing main touches the database.
+
+    python benchmarks/cold_start.py --runs 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, logging, os, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+touched = os.path.exists(os.environ['DATABASE_PATH'])
+logging.disable(logging.WARNING)
+if '--prepare' in sys.argv:
+    main.prepare_database()
+response = main.app.test_client().get('/about')
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - started, 'first_200': time.perf_counter() - started, 'touched': touched}))
+"""
+
+def run_worker(env, prepare):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER] + (['--prepare'] if prepare else []),
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - started
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'serenity.db')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', DATABASE_PATH=path)
+
+    # Importing main on a database that does not exist yet must not create it
+    untouched = not run_worker(env, prepare=True)['touched']
+
+    print(f"{'startup':<28}{'import ms':>11}{'first 200 ms':>14}{'process ms':>12}")
+    for label, prepare in (('import only', False), ('import + prepare_database', True)):
+        runs = [run_worker(env, prepare) for _ in range(args.runs)]
+        print(f"{label:<28}"
+              f"{statistics.median(r['import'] for r in runs) * 1000:>11.1f}"
+              f"{statistics.median(r['first_200'] for r in runs) * 1000:>14.1f}"
+              f"{statistics.median(r['process'] for r in runs) * 1000:>12.1f}")
+
+    os.remove(path)
+    os.rmdir(directory)
+    if not untouched:
+        sys.exit("Importing main created the database file")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Peak memory of streaming a very large personal data export.
+
+Seeds one user with --rows rows spread over their mood, emotion and habit
+entries and chat messages, on an isolated SQLite database. It then streams
+/export in each format through the Flask test client in a fresh process,
+consuming the body chunk by chunk, and reports how far peak RSS rose above
+the process's idle baseline. Exits non-zero when any export exceeds
+--max-rss-mb. Pass --naive to also measure loading the same rows with
+.all(), for comparison.
+
+    python benchmarks/export_memory.py --rows 1000000 --max-rss-mb 64
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def boot(path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def seed(path, rows):
+    app = boot(path)
+    from app import db
+    from models import User, MoodEntry, EmotionEntry, HabitEntry, ChatMessage
+    from groups import choose_shard
+
+    random.seed(5)
+    now = datetime.utcnow()
+    with app.app_context():
+        group_id = choose_shard('blue').id
+        user = User(nickname='archivist', password_hash='x', color_identity='blue',
+                    assessment_completed=True, group_chat_id=group_id)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        makers = [
+            (MoodEntry, lambda at: {'user_id': user_id, 'mood_level': random.randint(1, 10), 'mood_type': 'calm',
+                                    'notes': 'a short note about the day', 'created_at': at}),
+            (EmotionEntry, lambda at: {'user_id': user_id, 'emotion_name': 'hope', 'intensity': random.randint(1, 10),
+                                       'trigger': 'morning walk', 'created_at': at}),
+            (HabitEntry, lambda at: {'user_id': user_id, 'habit_name': 'meditation', 'completed': True, 'created_at': at}),
+            (ChatMessage, lambda at: {'user_id': user_id, 'group_chat_id': group_id, 'is_moderated': False,
+                                      'content': 'thank you all for being here today', 'created_at': at}),
+        ]
+        per_table = rows // len(makers)
+        for model, make in makers:
+            for offset in range(0, per_table, 50000):
+                batch = [make(now - timedelta(minutes=offset + n)) for n in range(min(50000, per_table - offset))]
+                db.session.execute(db.insert(model), batch)
+                db.session.commit()
+    return user_id
+
+def measure(path, user_id, mode, results):
+    sys.path.insert(0, ROOT)
+    app = boot(path)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    client.get('/about')
+    baseline = peak_rss_mb()
+
+    started = time.perf_counter()
+    size = 0
+    if mode == 'naive':
+        from models import MoodEntry, EmotionEntry, HabitEntry, ChatMessage
+        with app.app_context():
+            for model in (MoodEntry, EmotionEntry, HabitEntry, ChatMessage):
+                size += len(model.query.filter_by(user_id=user_id).all())
+    else:
+        response = client.get(f'/export?format={mode}', buffered=False)
+        for chunk in response.response:
+            size += len(chunk)
+        response.close()
+    results.put((mode, peak_rss_mb() - baseline, size, time.perf_counter() - started))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--max-rss-mb', type=float, default=64)
+    parser.add_argument('--naive', action='store_true')
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        user_id = pool.apply(seed, (path, args.rows))
+
+    results = context.Queue()
+    print(f"{'export':<10}{'RSS growth MB':>15}{'size':>17}{'seconds':>9}")
+    failed = False
+    for mode in ['ndjson', 'zip'] + (['naive'] if args.naive else []):
+        process = context.Process(target=measure, args=(path, user_id, mode, results))
+        process.start()
+        mode, growth, size, elapsed = results.get()
+        process.join()
+        unit = 'rows' if mode == 'naive' else 'bytes'
+        print(f"{mode:<10}{growth:>15.1f}{size:>12} {unit:<5}{elapsed:>8.1f}")
+        if mode != 'naive' and growth > args.max_rss_mb:
+            failed = True
+
+    os.remove(path)
+    if failed:
+        sys.exit(f"An export grew RSS by more than {args.max_rss_mb} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Group chat sharding simulation.
+
+Signs up growing populations of users through the real assignment path
+(groups.assign_group_chat) on an isolated SQLite database, then reports how
+many rooms exist and the busiest room's member count and expected message
+rate, next to what a single room per color would carry.
+
+    python benchmarks/group_sharding.py --users 1000 5000 20000 --max-members 250
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Skewed the way real sign-ups are: most people arrive struggling
+COLOR_MIX = {'grey': 0.4, 'blue': 0.25, 'green': 0.15, 'yellow': 0.1, 'pink': 0.1}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--max-members', type=int, default=250)
+    parser.add_argument('--messages-per-user', type=float, default=3.0, help='messages per member per day')
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['GROUP_SHARD_MAX_MEMBERS'] = str(args.max_members)
+
+    from app import app, db
+    from models import User, GroupChat
+    from groups import assign_group_chat
+    from sqlalchemy import func
+
+    random.seed(7)
+    colors, weights = zip(*COLOR_MIX.items())
+
+    print(f"{'users':>8}{'rooms':>7}{'busiest room':>14}{'msgs/day':>10}"
+          f"{'unsharded':>11}{'msgs/day':>10}{'assign us':>11}")
+    with app.app_context():
+        db.create_all()
+        signed_up = 0
+        for target in sorted(args.users):
+            start = time.perf_counter()
+            for n in range(signed_up, target):
+                user = User(nickname=f'user{n}', password_hash='x', assessment_completed=True)
+                db.session.add(user)
+                assign_group_chat(user, random.choices(colors, weights)[0])
+                db.session.commit()
+            per_user = (time.perf_counter() - start) / max(target - signed_up, 1)
+            signed_up = target
+
+            rooms = db.session.query(func.count(GroupChat.id)).scalar()
+            busiest = db.session.query(func.max(GroupChat.member_count)).scalar()
+            largest_color = max(db.session.query(func.sum(GroupChat.member_count))
+                                .group_by(GroupChat.color_identity).all())[0]
+            print(f"{target:>8}{rooms:>7}{busiest:>14}{busiest * args.messages_per_user:>10.0f}"
+                  f"{largest_color:>11}{largest_color * args.messages_per_user:>10.0f}{per_user * 1e6:>11.0f}")
+
+    os.remove(path)
+
+if __name__ == '__main__':
+    main()
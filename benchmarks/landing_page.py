@@ -0,0 +1,61 @@
+"""Landing page throughput with and without the public page cache.
+
+Serves / to anonymous visitors through the Flask test client on an isolated
+SQLite database in three ways: uncached (PAGE_CACHE_TTL=0), cached, and
+cached with If-None-Match revalidation (304s). Reports requests/sec and
+SQL statements per request for each.
+
+    python benchmarks/landing_page.py --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app, db
+    from sqlalchemy import event
+    from cache import invalidate_pages
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *rest: statements.append(1))
+
+    client = app.test_client()
+    etag = client.get('/').headers['ETag']
+    scenarios = [
+        ('uncached', 0, {}),
+        ('cached', 300, {}),
+        ('revalidated', 300, {'If-None-Match': etag}),
+    ]
+
+    print(f"{'scenario':<14}{'req/s':>10}{'statements/req':>16}{'status':>8}")
+    for name, ttl, headers in scenarios:
+        app.config['PAGE_CACHE_TTL'] = ttl
+        invalidate_pages()
+        client.get('/')
+        statements.clear()
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            status = client.get('/', headers=headers).status_code
+        elapsed = time.perf_counter() - started
+        print(f"{name:<14}{args.requests / elapsed:>10.0f}{len(statements) / args.requests:>16.2f}{status:>8}")
+
+    os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""End-to-end load and latency suite over realistic user journeys.
+
+Seeds an isolated SQLite database with existing users, mood, emotion, habit
+and chat history. Worker processes then run journeys through the Flask
+test client, each with several threads:
+
+    register -> assessment -> dashboard -> track_mood/track_emotion/track_habit
+    (repeated) -> chat -> send_message -> write_poem
+
+The JSON report covers overall throughput and, per route, request count,
+p50/p95/p99 latency and SQL queries per request. With --baseline the run is
+compared against a stored report and exits non-zero on regressions. A route
+regresses when its p95 is more than --tolerance slower (and at least
+--min-delta-ms) or when it issues more queries per request. Query counts
+are deterministic. Latencies only compare meaningfully against a baseline
+recorded on the same machine with the same options.
+
+    python benchmarks/load_suite.py --seed-users 2000 --processes 2 --threads 4 --journeys 10 \\
+        --output report.json --baseline benchmarks/load_baseline.json
+    python benchmarks/load_suite.py --save-baseline benchmarks/load_baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ASSESSMENT = {f'question_{i}': str(i % 4) for i in range(1, 9)}
+MOOD_TYPES = ['happy', 'calm', 'anxious', 'sad', 'neutral']
+COLORS = ['grey', 'blue', 'green', 'yellow', 'pink']
+
+def boot(path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # measure the writes themselves, not the 429s
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+def seed(path, users, days):
+    """Bulk-insert users with `days` of tracking history and some chat"""
+    app = boot(path)
+    from app import db
+    from models import User, MoodEntry, EmotionEntry, HabitEntry, ChatMessage
+    from groups import choose_shard, refresh_member_counts
+    from rollups import rebuild_rollups
+    from werkzeug.security import generate_password_hash
+
+    random.seed(13)
+    password_hash = generate_password_hash('pw', 'pbkdf2:sha256:1000')
+    now = datetime.utcnow()
+    with app.app_context():
+        groups = {color: choose_shard(color).id for color in COLORS}
+        db.session.commit()
+
+        db.session.execute(db.insert(User), [{
+            'nickname': f'seed{n}', 'password_hash': password_hash, 'color_identity': color,
+            'assessment_completed': True, 'group_chat_id': groups[color], 'created_at': now,
+            'dark_mode': False, 'cache_version': 0,
+        } for n, color in ((n, random.choice(COLORS)) for n in range(users))])
+        seeded = db.session.execute(db.select(User.id, User.group_chat_id)).all()
+
+        moods, emotions, habits, messages = [], [], [], []
+        for user_id, group_id in seeded:
+            for day in range(days):
+                created_at = now - timedelta(days=day, minutes=random.randint(0, 600))
+                moods.append({'user_id': user_id, 'mood_level': random.randint(1, 10),
+                              'mood_type': random.choice(MOOD_TYPES), 'notes': '', 'created_at': created_at})
+                emotions.append({'user_id': user_id, 'emotion_name': 'calm', 'intensity': random.randint(1, 10),
+                                 'trigger': '', 'created_at': created_at})
+                habits.append({'user_id': user_id, 'habit_name': 'walk', 'completed': random.random() < 0.6,
+                               'created_at': created_at})
+            messages.append({'user_id': user_id, 'group_chat_id': group_id, 'content': 'hello everyone',
+                             'created_at': now - timedelta(minutes=random.randint(0, 10000)), 'is_moderated': False})
+        for model, rows in ((MoodEntry, moods), (EmotionEntry, emotions), (HabitEntry, habits), (ChatMessage, messages)):
+            if rows:
+                db.session.execute(db.insert(model), rows)
+        refresh_member_counts()
+        db.session.commit()
+        with db.engine.begin() as connection:
+            rebuild_rollups(connection)
+
+def journeys(path, worker, threads, count, tracking, results):
+    sys.path.insert(0, ROOT)
+    app = boot(path)
+    from app import db
+    from sqlalchemy import event
+
+    local = threading.local()
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            local.queries = getattr(local, 'queries', 0) + 1
+
+    samples = []
+    errors = []
+    lock = threading.Lock()
+
+    def run(thread):
+        client = app.test_client()
+        own = []
+
+        def call(route, method, url, data=None):
+            local.queries = 0
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            own.append((route, time.perf_counter() - started, local.queries))
+            if response.status_code not in (200, 302, 304):
+                with lock:
+                    errors.append(f"{route}: {response.status_code}")
+
+        for journey in range(count):
+            nickname = f'w{worker}t{thread}j{journey}'
+            call('POST /register', 'POST', '/register', {'nickname': nickname, 'password': 'pw'})
+            call('POST /assessment', 'POST', '/assessment', ASSESSMENT)
+            call('GET /dashboard', 'GET', '/dashboard')
+            for n in range(tracking):
+                call('POST /track_mood', 'POST', '/track_mood', {'mood_level': str(n % 10 + 1), 'mood_type': 'calm'})
+                call('POST /track_emotion', 'POST', '/track_emotion', {'emotion_name': 'hope', 'intensity': '5'})
+                call('POST /track_habit', 'POST', '/track_habit', {'habit_name': f'habit{n % 3}', 'completed': 'on'})
+            call('GET /dashboard', 'GET', '/dashboard')
+            call('GET /chat', 'GET', '/chat')
+            call('POST /send_message', 'POST', '/send_message', {'content': 'hi all'})
+            call('POST /write_poem', 'POST', '/write_poem', {'title': 'Rain', 'content': 'Soft rain falls'})
+            client.get('/logout')
+        with lock:
+            samples.extend(own)
+
+    pool = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    from writebehind import write_behind
+    write_behind.drain()
+    results.put((samples, errors))
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+def build_report(samples, errors, elapsed, args):
+    by_route = {}
+    for route, latency, queries in samples:
+        by_route.setdefault(route, []).append((latency, queries))
+    routes = {}
+    for route, values in sorted(by_route.items()):
+        latencies = sorted(latency for latency, queries in values)
+        routes[route] = {
+            'count': len(values),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'queries_per_request': round(sum(queries for latency, queries in values) / len(values), 2),
+        }
+    return {
+        'config': {key: getattr(args, key) for key in ('seed_users', 'seed_days', 'processes', 'threads', 'journeys', 'tracking')},
+        'requests': len(samples),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'errors': len(errors),
+        'error_samples': errors[:10],
+        'routes': routes,
+    }
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """Regression messages for routes that got slower or chattier than the baseline"""
+    regressions = []
+    for route, current in report['routes'].items():
+        previous = baseline.get('routes', {}).get(route)
+        if previous is None:
+            continue
+        if (current['p95_ms'] > previous['p95_ms'] * (1 + tolerance)
+                and current['p95_ms'] - previous['p95_ms'] >= min_delta_ms):
+            regressions.append(f"{route}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(f"{route}: queries/request {previous['queries_per_request']} -> {current['queries_per_request']}")
+    if report['errors'] > baseline.get('errors', 0):
+        regressions.append(f"errors {baseline.get('errors', 0)} -> {report['errors']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed-users', type=int, default=500)
+    parser.add_argument('--seed-days', type=int, default=30, help='days of tracking history per seeded user')
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per process')
+    parser.add_argument('--journeys', type=int, default=5, help='journeys per thread')
+    parser.add_argument('--tracking', type=int, default=5, help='mood/emotion/habit rounds per journey')
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--baseline', help='compare against this stored report')
+    parser.add_argument('--save-baseline', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed relative p95 slowdown')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='ignore p95 slowdowns smaller than this')
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    context = multiprocessing.get_context('spawn')
+
+    setup = context.Process(target=seed, args=(path, args.seed_users, args.seed_days))
+    setup.start()
+    setup.join()
+    if setup.exitcode:
+        sys.exit("Seeding failed")
+
+    results = context.Queue()
+    workers = [context.Process(target=journeys, args=(path, n, args.threads, args.journeys, args.tracking, results))
+               for n in range(args.processes)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    samples, errors = [], []
+    for _ in workers:
+        worker_samples, worker_errors = results.get()
+        samples.extend(worker_samples)
+        errors.extend(worker_errors)
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    report = build_report(samples, errors, elapsed, args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Per-request cost of logging: basic, synchronous JSON and queued JSON.
+
+Each mode runs in a fresh process on its own SQLite database, with stderr
+written to a file the way a process manager captures it. The process times
+--requests POST /track_mood and GET /about requests through the test
+client. It reports mean microseconds per request, and the log bytes and
+lines written per request. The modes are:
+
+- basic: the default basicConfig setup. SQLAlchemy keeps its own loggers
+  at WARNING, and the test client writes no werkzeug access lines, so
+  little is logged.
+- json-sync: the JSON access lines and filters, with each line formatted
+  and written on the request thread.
+- json: LOG_MODE=json. The request thread only enqueues records, and
+  track_mood access lines are sampled.
+
+    python benchmarks/logging_overhead.py --requests 2000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, logging, os, sys, time
+import main
+main.prepare_database()
+if sys.argv[2] == 'json-sync':
+    # The same filters and JSON lines, formatted and written on the request thread
+    import logs
+    root = logging.getLogger()
+    queued = root.handlers[0]
+    direct = logging.StreamHandler(sys.stderr)
+    direct.setFormatter(logs.JsonFormatter())
+    direct.filters = queued.filters
+    root.removeHandler(queued)
+    root.addHandler(direct)
+client = main.app.test_client()
+client.post('/register', data={'nickname': 'logger', 'password': 'pw'})
+client.post('/assessment', data={f'question_{n}': '1' for n in range(1, 9)})
+requests = int(sys.argv[1])
+results = {}
+for label, call in (('POST /track_mood', lambda: client.post('/track_mood', data={'mood_level': '6', 'mood_type': 'calm'})),
+                    ('GET /about', lambda: client.get('/about'))):
+    call()
+    sys.stderr.flush()
+    before = os.fstat(2).st_size
+    started = time.perf_counter()
+    for _ in range(requests):
+        call()
+    results[label] = [(time.perf_counter() - started) / requests, before]
+print(json.dumps(results))
+"""
+
+MODES = {'basic': 'basic', 'json-sync': 'json', 'json': 'json'}
+
+def run(mode, requests):
+    directory = tempfile.mkdtemp()
+    log_path = os.path.join(directory, 'stderr.log')
+    env = dict(os.environ, LOG_MODE=MODES[mode], RATE_LIMIT_ENABLED='0', DATABASE_URL=f"sqlite:///{os.path.join(directory, 'serenity.db')}")
+    with open(log_path, 'wb') as log:
+        output = subprocess.run([sys.executable, '-c', WORKER, str(requests), mode], cwd=ROOT, env=env,
+                                stdout=subprocess.PIPE, stderr=log, text=True, check=True).stdout
+    results = json.loads(output.strip().splitlines()[-1])
+    with open(log_path, 'rb') as log:
+        data = log.read()
+
+    # Bytes written during each timed series: up to the next series' start, or the end of the file
+    starts = [before for _, before in results.values()] + [len(data)]
+    rows = []
+    for (label, (seconds, before)), end in zip(results.items(), starts[1:]):
+        rows.append((label, seconds, end - before, data[before:end].count(b'\n')))
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<11}{'request':<20}{'us/request':>12}{'log bytes/req':>15}{'lines/req':>11}")
+    for mode in MODES:
+        for label, seconds, size, lines in run(mode, args.requests):
+            print(f"{mode:<11}{label:<20}{seconds * 1e6:>12.0f}{size / args.requests:>15.0f}{lines / args.requests:>11.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Dashboard latency while logins saturate the password hashing pool.
+
+Login threads post /login as fast as they can while dashboard threads load
+/dashboard, all through the Flask test client against an isolated SQLite
+database. Each scenario runs for a fixed time. "unbounded" gives every login
+thread its own hashing worker and removes the caps, which approximates
+hashing inline in the request. "bounded" uses the configured pool and caps.
+The report shows dashboard p50/p99 and login outcomes per scenario.
+
+    python benchmarks/login_pressure.py --login-threads 16 --dashboard-threads 2 --seconds 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--dashboard-threads', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app
+
+    app.config['TESTING'] = True
+    assessment = {f'question_{i}': '2' for i in range(1, 9)}
+    for n in range(args.login_threads):
+        client = app.test_client()
+        client.post('/register', data={'nickname': f'login{n}', 'password': 'pw'})
+    readers = []
+    for n in range(args.dashboard_threads):
+        client = app.test_client()
+        client.post('/register', data={'nickname': f'reader{n}', 'password': 'pw'})
+        client.post('/assessment', data=assessment)
+        readers.append(client)
+
+    bounded = {key: app.config[key] for key in (
+        'PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_MAX_PENDING',
+        'LOGIN_MAX_CONCURRENT_PER_ADDRESS', 'LOGIN_MAX_CONCURRENT_PER_NICKNAME')}
+    unbounded = {
+        'PASSWORD_HASH_WORKERS': args.login_threads,
+        'PASSWORD_HASH_MAX_PENDING': args.login_threads,
+        'LOGIN_MAX_CONCURRENT_PER_ADDRESS': 0,
+        'LOGIN_MAX_CONCURRENT_PER_NICKNAME': 0,
+    }
+
+    import passwords
+    print(f"{'scenario':<12}{'dash p50':>10}{'dash p99':>10}{'dash req':>10}{'logins ok':>11}{'429s':>8}")
+    for name, settings in (('unbounded', unbounded), ('bounded', bounded)):
+        app.config.update(settings)
+        passwords._executor = None  # pick up the worker count
+        stop = threading.Event()
+        dashboard_latencies, login_codes = [], []
+
+        def log_in(n):
+            client = app.test_client()
+            while not stop.is_set():
+                response = client.post('/login', data={'nickname': f'login{n}', 'password': 'pw'})
+                login_codes.append(response.status_code)
+                if response.status_code == 429:
+                    time.sleep(0.01)
+
+        def read(client):
+            while not stop.is_set():
+                started = time.perf_counter()
+                client.get('/dashboard')
+                dashboard_latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=log_in, args=(n,)) for n in range(args.login_threads)]
+        threads += [threading.Thread(target=read, args=(client,)) for client in readers]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        print(f"{name:<12}{percentile(dashboard_latencies, 0.5):>10.1f}{percentile(dashboard_latencies, 0.99):>10.1f}"
+              f"{len(dashboard_latencies):>10}{login_codes.count(302):>11}{login_codes.count(429):>8}")
+
+    os.remove(path)
+
+if __name__ == '__main__':
+    main()
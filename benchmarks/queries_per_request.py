@@ -0,0 +1,62 @@
+"""SQL statements issued per request for each logged-in route.
+
+Drives the app through the Flask test client against an isolated SQLite
+database and counts every statement the engine executes while serving each
+request. Run with IDENTITY_CACHE_TTL=30 to see the effect of the identity
+cache on repeat requests.
+
+    python benchmarks/queries_per_request.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def main():
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # measure the writes themselves, not the 429s
+
+    import main as serenity
+    serenity.prepare_database()
+    from app import app, db
+    from sqlalchemy import event
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+    client = app.test_client()
+    answers = {f'question_{n}': '1' for n in range(1, 9)}
+    for nickname in ('first', 'second'):
+        client.get('/logout')
+        client.post('/register', data={'nickname': nickname, 'password': 'secret'})
+        client.post('/assessment', data=answers)
+    for n in range(20):
+        client.post('/send_message', data={'content': f'message {n}'})
+
+    journey = [
+        ('GET', '/dashboard', None),
+        ('GET', '/dashboard', None),
+        ('GET', '/assessment_results', None),
+        ('POST', '/track_mood', {'mood_level': '6', 'mood_type': 'calm'}),
+        ('POST', '/track_emotion', {'emotion_name': 'hope', 'intensity': '4'}),
+        ('POST', '/track_habit', {'habit_name': 'walk', 'completed': 'on'}),
+        ('GET', '/write_poem', None),
+        ('GET', '/chat', None),
+        ('POST', '/send_message', {'content': 'hello'}),
+    ]
+
+    print(f"{'route':<28}{'statements':>10}")
+    for method, url, data in journey:
+        statements.clear()
+        client.open(url, method=method, data=data)
+        print(f"{method + ' ' + url:<28}{len(statements):>10}")
+
+    os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Query plans and latency for the per-route queries on a large database.
+
+Seeds an isolated SQLite database with millions of time-series rows, then
+runs the same ORM queries the routes issue and prints SQLite's
+EXPLAIN QUERY PLAN plus median latency for each. The habit write goes
+through tracking.save_habit and is rolled back. Pass --drop-indexes to
+see the plans the schema produced before the composite indexes existed.
+
+    python benchmarks/query_plans.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def seed(path, rows, users, groups):
+    """Bulk-load synthetic history with the raw driver; the ORM is far too slow for millions of rows"""
+    random.seed(42)
+    now = datetime.utcnow()
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+
+    def timestamps(count):
+        for n in range(count):
+            yield (now - timedelta(minutes=count - n)).isoformat(sep=' ')
+
+    connection.executemany(
+        "INSERT INTO group_chat (id, name, color_identity, created_at, shard, member_count) VALUES (?, ?, 'blue', ?, ?, ?)",
+        [(g, f"Group {g}", now.isoformat(sep=' '), g, sum(1 for u in range(1, users + 1) if u % groups + 1 == g)) for g in range(1, groups + 1)])
+    connection.executemany(
+        "INSERT INTO user (id, nickname, password_hash, assessment_completed, group_chat_id, created_at) "
+        "VALUES (?, ?, 'x', 1, ?, ?)",
+        [(u, f"user{u}", u % groups + 1, now.isoformat(sep=' ')) for u in range(1, users + 1)])
+    connection.executemany(
+        "INSERT INTO mood_entry (user_id, mood_level, mood_type, created_at) VALUES (?, ?, 'calm', ?)",
+        ((random.randint(1, users), random.randint(1, 10), ts) for ts in timestamps(rows)))
+    connection.executemany(
+        "INSERT INTO emotion_entry (user_id, emotion_name, intensity, created_at) VALUES (?, 'hope', ?, ?)",
+        ((random.randint(1, users), random.randint(1, 10), ts) for ts in timestamps(rows)))
+    # One row per user per day, as the (user_id, habit_name, day) index enforces, ending today
+    connection.executemany(
+        "INSERT INTO habit_entry (user_id, habit_name, completed, streak_count, day, created_at) VALUES (?, 'walk', 1, 0, ?, ?)",
+        ((n % users + 1, day.isoformat(), datetime.combine(day, now.time()).isoformat(sep=' '))
+         for n, day in ((n, now.date() - timedelta(days=(rows - 1 - n) // users)) for n in range(rows))))
+    connection.executemany(
+        "INSERT INTO poem (user_id, title, content, is_private, created_at, updated_at) VALUES (?, 't', 'c', 1, ?, ?)",
+        ((random.randint(1, users), ts, ts) for ts in timestamps(rows // 10)))
+    connection.executemany(
+        "INSERT INTO chat_message (user_id, group_chat_id, content, is_moderated, created_at) VALUES (?, ?, 'hi', 0, ?)",
+        ((u, u % groups + 1, ts) for u, ts in ((random.randint(1, users), ts) for ts in timestamps(rows))))
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='rows per time-series table')
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--groups', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--drop-indexes', action='store_true', help='measure without the composite indexes')
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import app, db
+    from models import MoodEntry, HabitEntry, EmotionEntry, Poem, User
+    from migrations import upgrade_database
+    from chat import fetch_messages
+    from tracking import save_habit
+    from sqlalchemy import event
+
+    with app.app_context():
+        db.create_all()
+        upgrade_database(db.engine)
+        if args.drop_indexes:
+            with db.engine.begin() as connection:
+                for (name,) in connection.exec_driver_sql(
+                        "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'ix_%'").fetchall():
+                    connection.exec_driver_sql(f"DROP INDEX {name}")
+
+    start = time.perf_counter()
+    seed(path, args.rows, args.users, args.groups)
+    print(f"Seeded {args.rows:,} rows per table in {time.perf_counter() - start:.1f}s ({path})\n")
+
+    user_id = args.users // 2
+    week_ago = datetime.utcnow().date() - timedelta(days=7)
+
+    queries = {
+        'dashboard: recent moods': lambda: MoodEntry.query.filter(
+            MoodEntry.user_id == user_id, MoodEntry.created_at >= week_ago
+        ).order_by(MoodEntry.created_at.desc()).limit(7).all(),
+        'dashboard: recent habits': lambda: HabitEntry.query.filter(
+            HabitEntry.user_id == user_id, HabitEntry.created_at >= week_ago).all(),
+        'dashboard: recent emotions': lambda: EmotionEntry.query.filter(
+            EmotionEntry.user_id == user_id, EmotionEntry.created_at >= week_ago
+        ).order_by(EmotionEntry.created_at.desc()).limit(5).all(),
+        'dashboard: recent poems': lambda: Poem.query.filter_by(user_id=user_id).order_by(Poem.updated_at.desc()).limit(3).all(),
+        'track_habit: upsert': lambda: (save_habit(user_id, 'walk', False), db.session.rollback()),
+        'chat: latest page': lambda: fetch_messages(1),
+        'chat: after_id': lambda: fetch_messages(1, after_id=args.rows - 100),
+        'chat: before_id': lambda: fetch_messages(1, before_id=args.rows // 2),
+        'chat: group members': lambda: User.query.filter_by(group_chat_id=1).count(),
+    }
+
+    with app.app_context():
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            captured.append((statement, parameters))
+
+        for name, run in queries.items():
+            captured.clear()
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            run()
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+            timings = []
+            for _ in range(args.repeat):
+                db.session.expunge_all()
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+
+            print(f"== {name}: median {statistics.median(timings) * 1000:.2f} ms")
+            raw = db.engine.raw_connection()
+            try:
+                for statement, parameters in captured:
+                    for row in raw.cursor().execute(f"EXPLAIN QUERY PLAN {statement}", parameters):
+                        print(f"   {row[-1]}")
+            finally:
+                raw.close()
+            print()
+
+    os.remove(path)
+
+if __name__ == '__main__':
+    main()
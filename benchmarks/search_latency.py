@@ -0,0 +1,100 @@
+"""Full-text chat search latency on a large history.
+
+Seeds --messages chat messages over --groups groups on an isolated SQLite
+database, inside search.bulk_indexing() so the FTS5 index is built once at
+the end rather than row by row. The word frequencies follow a rough Zipf
+curve. It then times /chat/<id>/search for a common, a mid-frequency and a
+rare term. Each term is timed for the first page and for the page reached
+after following the cursor --pages times. A LIKE '%term%' scan of the
+group's messages is timed next to each.
+
+    python benchmarks/search_latency.py --messages 3000000 --groups 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VOCABULARY = [f'word{n}' for n in range(5000)]
+WEIGHTS = [1 / (n + 1) for n in range(len(VOCABULARY))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app, db
+    from models import ChatMessage, GroupChat, User
+    from search import bulk_indexing
+
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/register', data={'nickname': 'reader', 'password': 'pw'})
+    client.post('/assessment', data={f'question_{n}': '1' for n in range(1, 9)})
+
+    random.seed(11)
+    now = datetime.utcnow()
+    with app.app_context():
+        reader = User.query.filter_by(nickname='reader').first()
+        group_id = reader.group_chat_id
+        for n in range(args.groups - 1):
+            db.session.add(GroupChat(name=f'Room {n}', color_identity='blue', shard=n + 2))
+        db.session.commit()
+        group_ids = [g.id for g in GroupChat.query]
+
+        started = time.perf_counter()
+        with db.engine.begin() as connection:
+            with bulk_indexing(connection):
+                for offset in range(0, args.messages, 50000):
+                    connection.execute(db.insert(ChatMessage), [
+                        {'user_id': reader.id, 'group_chat_id': random.choice(group_ids), 'is_moderated': False,
+                         'content': ' '.join(random.choices(VOCABULARY, WEIGHTS, k=random.randint(4, 16))),
+                         'created_at': now - timedelta(seconds=args.messages - n)}
+                        for n in range(offset, min(offset + 50000, args.messages))
+                    ])
+        print(f"Seeded and indexed {args.messages} messages in {time.perf_counter() - started:.1f}s")
+        group_size = ChatMessage.query.filter_by(group_chat_id=group_id).count()
+
+    def timed(url):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        return (time.perf_counter() - started) / args.repeat * 1000, response.get_json()
+
+    print(f"Reader's group holds {group_size} messages")
+    print(f"{'term':<10}{'page 1 ms':>11}{f'page {args.pages + 1} ms':>12}{'LIKE ms':>10}{'LIKE hits':>11}")
+    for term in ('word0', 'word50', 'word4000'):
+        url = f'/chat/{group_id}/search?q={term}&limit=20'
+        first_ms, payload = timed(url)
+        cursor = payload['next_cursor']
+        for _ in range(args.pages - 1):
+            if cursor:
+                cursor = client.get(f'{url}&cursor={cursor}').get_json()['next_cursor']
+        deep_ms = timed(f'{url}&cursor={cursor}')[0] if cursor else float('nan')
+
+        with app.app_context():
+            started = time.perf_counter()
+            hits = ChatMessage.query.filter(ChatMessage.group_chat_id == group_id,
+                                            ChatMessage.content.like(f'%{term}%')).count()
+            like_ms = (time.perf_counter() - started) * 1000
+        print(f"{term:<10}{first_ms:>11.2f}{deep_ms:>12.2f}{like_ms:>10.1f}{hits:>11}")
+    os.remove(path)
+
+if __name__ == '__main__':
+    main()
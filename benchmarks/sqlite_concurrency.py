@@ -0,0 +1,113 @@
+"""Multi-process read/write latency with and without the SQLite production profile.
+
+Starts several worker processes, like gunicorn workers sharing one SQLite
+file. Each process drives a mix of real routes (dashboard and chat reads,
+mood and chat writes) through the Flask test client. The run is repeated
+for each SQLITE_PROFILE on a fresh database and reports p50/p99 latency for
+reads and writes, plus writes that were lost to "database is locked".
+
+    python benchmarks/sqlite_concurrency.py --processes 4 --requests 300 --write-ratio 0.3
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ASSESSMENT = {f'question_{i}': '2' for i in range(1, 9)}
+
+def boot(path, profile):
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # measure the writes themselves, not the 429s
+    os.environ['SQLITE_PROFILE'] = profile
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+def worker(path, profile, number, requests, write_ratio, start, results):
+    sys.path.insert(0, ROOT)
+    app = boot(path, profile)
+    client = app.test_client()
+    client.post('/register', data={'nickname': f'worker{number}', 'password': 'pw'})
+    client.post('/assessment', data=ASSESSMENT)
+
+    random.seed(number)
+    reads, writes = [], []
+    start.wait()
+    for _ in range(requests):
+        write = random.random() < write_ratio
+        started = time.perf_counter()
+        if write:
+            if random.random() < 0.5:
+                client.post('/track_mood', data={'mood_level': '6', 'mood_type': 'calm'})
+            else:
+                client.post('/send_message', data={'content': 'hello'})
+        else:
+            client.get('/dashboard' if random.random() < 0.5 else '/chat')
+        (writes if write else reads).append(time.perf_counter() - started)
+    results.put((reads, writes))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0.0
+
+def run(profile, args):
+    path = tempfile.mktemp(suffix='.db')
+    context = multiprocessing.get_context('spawn')
+
+    # Create the schema once, before workers race to do it
+    setup = context.Process(target=boot, args=(path, profile))
+    setup.start()
+    setup.join()
+
+    start = context.Barrier(args.processes)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(path, profile, n, args.requests, args.write_ratio, start, results))
+        for n in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    reads, writes = [], []
+    for _ in processes:
+        process_reads, process_writes = results.get()
+        reads.extend(process_reads)
+        writes.extend(process_writes)
+    for process in processes:
+        process.join()
+
+    import sqlite3
+    connection = sqlite3.connect(path)
+    stored = sum(connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                 for table in ('mood_entry', 'chat_message'))
+    connection.close()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    print(f"{profile:<12}{percentile(reads, 0.5):>10.1f}{percentile(reads, 0.99):>10.1f}"
+          f"{percentile(writes, 0.5):>10.1f}{percentile(writes, 0.99):>10.1f}{len(writes) - stored:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=300, help='requests per process')
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--profiles', nargs='+', default=['default', 'production'])
+    args = parser.parse_args()
+
+    print(f"{'profile':<12}{'read p50':>10}{'read p99':>10}{'write p50':>10}{'write p99':>10}{'lost':>8}")
+    for profile in args.profiles:
+        run(profile, args)
+
+if __name__ == '__main__':
+    main()
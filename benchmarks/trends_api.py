@@ -0,0 +1,96 @@
+"""/api/trends latency and payload size for a user with a long history.
+
+Seeds one user with --entries mood and emotion entries spread over
+--years on an isolated SQLite database, and rebuilds their rollups. It then
+times /api/trends for each unit over the full history and over the default
+range, and reports payload bytes next to a Python loop over the raw ORM
+entries. The default-range weekly mood means are checked against that loop.
+
+    python benchmarks/trends_api.py --entries 100000 --years 3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MOOD_TYPES = ['happy', 'calm', 'anxious', 'sad', 'neutral']
+EMOTIONS = ['joy', 'fear', 'hope', 'anger', 'relief']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100000, help='mood plus emotion entries')
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app, db
+    from models import User, MoodEntry, EmotionEntry
+    from rollups import rebuild_rollups
+
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/register', data={'nickname': 'longtime', 'password': 'pw'})
+
+    random.seed(3)
+    now = datetime.utcnow()
+    span = int(args.years * 365 * 24 * 60)
+    with app.app_context():
+        user_id = User.query.filter_by(nickname='longtime').first().id
+        moods = [{'user_id': user_id, 'mood_level': random.randint(1, 10), 'mood_type': random.choice(MOOD_TYPES),
+                  'notes': '', 'created_at': now - timedelta(minutes=random.randint(0, span))}
+                 for _ in range(args.entries // 2)]
+        emotions = [{'user_id': user_id, 'emotion_name': random.choice(EMOTIONS), 'intensity': random.randint(1, 10),
+                     'trigger': '', 'created_at': now - timedelta(minutes=random.randint(0, span))}
+                    for _ in range(args.entries - args.entries // 2)]
+        db.session.execute(db.insert(MoodEntry), moods)
+        db.session.execute(db.insert(EmotionEntry), emotions)
+        db.session.commit()
+        with db.engine.begin() as connection:
+            rebuild_rollups(connection, user_id=user_id)
+
+    start = (now - timedelta(days=args.years * 365 + 1)).date().isoformat()
+    print(f"{'request':<40}{'ms':>8}{'bytes':>8}{'buckets':>9}")
+    for unit in ('day', 'week', 'month'):
+        for label, query in ((f'{unit}, default range', f'unit={unit}'), (f'{unit}, full history', f'unit={unit}&start={start}')):
+            client.get(f'/api/trends?{query}')
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                response = client.get(f'/api/trends?{query}')
+            elapsed = (time.perf_counter() - started) / args.repeat
+            payload = response.get_json()
+            print(f"{label:<40}{elapsed * 1000:>8.1f}{len(response.data):>8}{len(payload['buckets']):>6} {payload['unit']}")
+
+    with app.app_context():
+        started = time.perf_counter()
+        weeks = defaultdict(list)
+        for entry in MoodEntry.query.filter_by(user_id=user_id).all():
+            day = entry.created_at.date()
+            weeks[(day - timedelta(days=day.weekday())).isoformat()].append(entry.mood_level)
+        elapsed = time.perf_counter() - started
+    print(f"{'ORM loop over raw moods (weekly)':<40}{elapsed * 1000:>8.1f}")
+
+    payload = client.get('/api/trends?unit=week').get_json()
+    mismatches = [
+        bucket for bucket, mean in zip(payload['buckets'], payload['mood']['mean'])
+        if mean is not None and abs(round(sum(weeks[bucket]) / len(weeks[bucket]), 2) - mean) > 0.01
+    ]
+    print("Weekly mood means match the raw entries" if not mismatches else f"Mismatched buckets: {mismatches[:5]}")
+    os.remove(path)
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
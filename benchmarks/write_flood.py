@@ -0,0 +1,119 @@
+"""Chat send latency for ordinary users while one user floods the write endpoints.
+
+Flood threads share one logged-in user and one client address. They post
+/track_mood and /send_message as fast as they can. Meanwhile, each victim
+(its own user and address) sends a chat message every --pace seconds, which
+is within the default budget. All clients reach the app through one proxy
+address, with their own address in X-Forwarded-For. Everything runs through the Flask test client
+against an isolated SQLite database. The "unlimited" scenario turns
+RATE_LIMIT_ENABLED off; "limited" uses the configured RATE_LIMITS. The
+report shows victim p50/p99/max send latency and victim 429s, then the
+flood's requests, 429s and rows committed. Exits non-zero if any victim got
+a 429, which would mean the flood's budget is being charged to them.
+
+    python benchmarks/write_flood.py --flood-threads 8 --victims 4 --seconds 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0.0
+
+def client_at(app, address):
+    """A client behind the deployment's proxy, as ProxyFix in app.py sees it"""
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = '10.0.0.254'
+    client.environ_base['HTTP_X_FORWARDED_FOR'] = address
+    return client
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--flood-threads', type=int, default=8)
+    parser.add_argument('--victims', type=int, default=4)
+    parser.add_argument('--pace', type=float, default=1.0, help='seconds between one victim\'s messages')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    import logging
+    import main
+    main.prepare_database()
+    logging.disable(logging.WARNING)
+    from app import app, db
+    from models import ChatMessage, MoodEntry, User
+    import ratelimit
+
+    app.config['TESTING'] = True
+    assessment = {f'question_{i}': '2' for i in range(1, 9)}
+    flooder = client_at(app, '10.0.0.1')
+    flooder.post('/register', data={'nickname': 'flooder', 'password': 'pw'})
+    flooder.post('/assessment', data=assessment)
+    victims = []
+    for n in range(args.victims):
+        client = client_at(app, f'10.0.1.{n + 1}')
+        client.post('/register', data={'nickname': f'victim{n}', 'password': 'pw'})
+        client.post('/assessment', data=assessment)
+        victims.append(client)
+    with app.app_context():
+        flooder_id = User.query.filter_by(nickname='flooder').one().id
+
+    def flood_rows():
+        with app.app_context():
+            return (MoodEntry.query.filter_by(user_id=flooder_id).count()
+                    + ChatMessage.query.filter_by(user_id=flooder_id).count())
+
+    victims_limited = 0
+    print(f"{'scenario':<11}{'send p50':>10}{'send p99':>10}{'send max':>10}{'victim 429':>12}"
+          f"{'flood req':>11}{'flood 429':>11}{'flood rows':>12}")
+    for name, enabled in (('unlimited', False), ('limited', True)):
+        app.config['RATE_LIMIT_ENABLED'] = enabled
+        ratelimit.rate_limit_store.clear()
+        rows_before = flood_rows()
+        stop = threading.Event()
+        send_latencies, victim_codes, flood_codes = [], [], []
+
+        def flood(n):
+            while not stop.is_set():
+                if n % 2:
+                    response = flooder.post('/send_message', data={'content': 'spam'})
+                else:
+                    response = flooder.post('/track_mood', data={'mood_level': '5', 'mood_type': 'calm'})
+                flood_codes.append(response.status_code)
+
+        def send(client):
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = client.post('/send_message', data={'content': 'hello everyone'})
+                send_latencies.append(time.perf_counter() - started)
+                victim_codes.append(response.status_code)
+                stop.wait(args.pace)
+
+        threads = [threading.Thread(target=flood, args=(n,)) for n in range(args.flood_threads)]
+        threads += [threading.Thread(target=send, args=(client,)) for client in victims]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        print(f"{name:<11}{percentile(send_latencies, 0.5):>10.1f}{percentile(send_latencies, 0.99):>10.1f}"
+              f"{max(send_latencies) * 1000:>10.1f}{victim_codes.count(429):>12}"
+              f"{len(flood_codes):>11}{flood_codes.count(429):>11}{flood_rows() - rows_before:>12}")
+        victims_limited += victim_codes.count(429)
+
+    os.remove(path)
+    if victims_limited:
+        sys.exit("Victims were rate limited by the flood's traffic")
+
+if __name__ == '__main__':
+    main()
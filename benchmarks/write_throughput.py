@@ -0,0 +1,87 @@
+"""Tracking write throughput with and without write-behind.
+
+Concurrent clients post /track_mood through the Flask test client against an
+isolated SQLite file, once per WRITE_BEHIND mode, and report requests/sec,
+p50/p95 request latency and how many commits the writer needed. Async runs
+include the time to drain the queue, so every write is on disk before the
+clock stops.
+
+    python benchmarks/write_throughput.py --clients 16 --requests 200 --modes off group async
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per client')
+    parser.add_argument('--modes', nargs='+', default=['off', 'group', 'async'])
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'  # measure the writes themselves, not the 429s
+
+    import main
+
+    main.prepare_database()
+    from app import app
+    from models import MoodEntry
+    from writebehind import write_behind
+
+    app.config['TESTING'] = True
+    assessment = {f'question_{i}': '2' for i in range(1, 9)}
+
+    clients = []
+    for n in range(args.clients):
+        client = app.test_client()
+        client.post('/register', data={'nickname': f'bench{n}', 'password': 'pw'})
+        client.post('/assessment', data=assessment)
+        clients.append(client)
+
+    print(f"{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'commits':>10}{'rows':>10}")
+    for mode in args.modes:
+        app.config['WRITE_BEHIND'] = mode
+        with app.app_context():
+            before = MoodEntry.query.count()
+        batches_before = write_behind.batches
+        latencies = []
+        lock = threading.Lock()
+
+        def run(client):
+            own = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                client.post('/track_mood', data={'mood_level': '6', 'mood_type': 'calm'})
+                own.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(own)
+
+        threads = [threading.Thread(target=run, args=(client,)) for client in clients]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        write_behind.drain()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            rows = MoodEntry.query.count() - before
+        commits = rows if mode == 'off' else write_behind.batches - batches_before
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{mode:<8}{len(latencies) / elapsed:>10.0f}{statistics.median(latencies) * 1000:>10.2f}"
+              f"{p95 * 1000:>10.2f}{commits:>10}{rows:>10}")
+
+    os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import queue
+import threading
+from collections import defaultdict
+
+# Sentinel put on a subscriber's queue after it fell behind: the consumer
+# must discard its assumptions and catch up from the database by cursor.
+RESYNC = object()
+
+class Subscription:
+    """One listener on a group chat, with its own bounded queue"""
+
+    def __init__(self, group_id, maxsize):
+        self.group_id = group_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def get(self, timeout=None):
+        """Block until the next payload (or RESYNC) arrives; raises queue.Empty on timeout"""
+        return self.queue.get(timeout=timeout)
+
+class ChatBroker:
+    """In-process fan-out of chat messages to the subscribers of each group.
+
+    Publishing never blocks: when a subscriber's queue is full its backlog is
+    thrown away and replaced by a single RESYNC marker, so a slow consumer
+    costs at most `maxsize` payloads of memory and reloads what it missed
+    from the database instead.
+
+    The broker only reaches subscribers in the current process; streams
+    served by other workers pick messages up from the database on their
+    heartbeat.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, group_id, maxsize=100):
+        subscription = Subscription(group_id, maxsize)
+        with self._lock:
+            self._subscribers[group_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.group_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.group_id]
+
+    def publish(self, group_id, payload):
+        """Deliver payload to every subscriber of group_id; returns the number reached"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(group_id, ()))
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(payload)
+            except queue.Full:
+                self._resync(subscription)
+
+        return len(subscribers)
+
+    def subscriber_count(self, group_id=None):
+        with self._lock:
+            if group_id is not None:
+                return len(self._subscribers.get(group_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _resync(self, subscription):
+        """Drop a lagging subscriber's backlog and ask it to reload from the database"""
+        while True:
+            try:
+                subscription.queue.get_nowait()
+                subscription.dropped += 1
+            except queue.Empty:
+                break
+        try:
+            subscription.queue.put_nowait(RESYNC)
+        except queue.Full:
+            pass
+
+chat_broker = ChatBroker()
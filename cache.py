@@ -0,0 +1,217 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from itertools import chain
+from types import SimpleNamespace
+from flask import Response, make_response, request, session
+from sqlalchemy import event
+from app import app, db
+from models import Announcement
+
+class CacheBackend:
+    """Interface for snapshot caches.
+
+    Backends store opaque values under string or integer keys. The in-process
+    MemoryCache below is the default; a shared store (for example Redis) can
+    be plugged in by implementing the same four methods.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, size=1):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-process cache with TTL expiry and LRU eviction.
+
+    Bounded both by entry count and by the total `size` callers report for
+    their values (bytes of rendered HTML, typically).
+    """
+
+    def __init__(self, ttl=300, max_entries=1000, max_size=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=1):
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, key):
+        value, size, expires_at = self._entries.pop(key)
+        self._size -= size
+
+def snapshot_row(instance):
+    """Copy a model's column values into a plain object that outlives its session"""
+    return SimpleNamespace(**{column.key: getattr(instance, column.key) for column in instance.__table__.columns})
+
+# Per-user dashboard snapshots, keyed by user id. Swap the backend with
+# set_dashboard_backend() to share snapshots between workers.
+dashboard_cache = MemoryCache(
+    ttl=app.config["DASHBOARD_CACHE_TTL"],
+    max_entries=app.config["DASHBOARD_CACHE_MAX_ENTRIES"],
+    max_size=app.config["DASHBOARD_CACHE_MAX_BYTES"],
+)
+
+def set_dashboard_backend(backend):
+    global dashboard_cache
+    dashboard_cache = backend
+
+def get_dashboard_snapshot(user, day):
+    """Return the cached snapshot for a user if it is still current, else None"""
+    snapshot = dashboard_cache.get(user.id)
+    if snapshot is None or snapshot['version'] != user.cache_version or snapshot['day'] != day:
+        return None
+    return snapshot
+
+def store_dashboard_snapshot(user, day, context, html=None):
+    """Cache a user's dashboard context, plus its rendered page and ETag when available"""
+    snapshot = {
+        'version': user.cache_version,
+        'day': day,
+        'context': context,
+        'html': html,
+        'etag': hashlib.sha1(html.encode('utf-8')).hexdigest() if html is not None else None,
+    }
+    dashboard_cache.set(user.id, snapshot, size=len(html) if html is not None else 4096)
+    return snapshot
+
+def invalidate_dashboard(user):
+    """Mark a user's dashboard stale after one of their writes (caller commits).
+
+    Bumping User.cache_version in the write's own transaction makes every
+    worker's cached snapshot for this user miss, not only this process's.
+    """
+    user.cache_version = (user.cache_version or 0) + 1
+    dashboard_cache.delete(user.id)
+
+# Rendered public pages, keyed by path and viewer variant. Anonymous visitors
+# share one copy; each logged-in user gets their own, because the navigation
+# bar shows their nickname. The theme is applied client-side, so it does not
+# vary the markup. Announcement commits in this process clear the cache;
+# other workers pick them up within PAGE_CACHE_TTL.
+page_cache = MemoryCache(
+    ttl=app.config["PAGE_CACHE_TTL"],
+    max_entries=app.config["PAGE_CACHE_MAX_ENTRIES"],
+    max_size=app.config["PAGE_CACHE_MAX_BYTES"],
+)
+_page_generation = 0
+
+def page_variant():
+    user_id = session.get('user_id')
+    if user_id is None:
+        return 'anonymous'
+    return f"user:{user_id}:{session.get('user_nickname')}"
+
+def invalidate_pages():
+    global _page_generation
+    _page_generation += 1
+    page_cache.clear()
+
+def cached_page(view):
+    """Serve a page from page_cache with a strong ETag, answering 304 when it matches"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        # Pending flash messages must be rendered (and consumed) for this visitor only
+        if app.config["PAGE_CACHE_TTL"] <= 0 or '_flashes' in session:
+            return view(*args, **kwargs)
+
+        variant = page_variant()
+        key = (request.path, variant)
+        entry = page_cache.get(key)
+        if entry is None:
+            generation = _page_generation
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            entry = {'body': body, 'mimetype': response.mimetype, 'etag': hashlib.sha1(body).hexdigest()}
+            # Skip storing if announcements changed while this page rendered
+            if generation == _page_generation:
+                page_cache.set(key, entry, size=len(body))
+
+        response = Response(entry['body'], mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+        if variant == 'anonymous':
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config["PAGE_CACHE_MAX_AGE"]
+        else:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+    return wrapped
+
+@event.listens_for(db.session, 'before_flush')
+def _note_announcement_changes(session, flush_context, instances):
+    if any(isinstance(instance, Announcement) for instance in chain(session.new, session.dirty, session.deleted)):
+        session.info['announcements_changed'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_announcement_pages(session):
+    if session.info.pop('announcements_changed', False):
+        invalidate_pages()
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_announcement_changes(session):
+    session.info.pop('announcements_changed', None)
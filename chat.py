@@ -0,0 +1,71 @@
+import json
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app import db
+from models import ChatMessage, User
+from archive import fetch_archived
+
+# Number of messages shown when the chat page first loads
+CHAT_PAGE_SIZE = 50
+
+# Upper bound for the ?limit= parameter of the messages API
+CHAT_MAX_PAGE_SIZE = 200
+
+def fetch_messages(group_chat_id, after_id=None, before_id=None, limit=CHAT_PAGE_SIZE):
+    """Fetch one keyset page of a group's messages, ordered oldest first.
+
+    Pages are cut on (group_chat_id, id) so every page is an index range scan:
+    - after_id: messages newer than the cursor (used for polling)
+    - before_id: messages older than the cursor (used for scrolling back)
+    - neither: the most recent messages of the group
+    Scrolling back past the oldest hot message continues into the archive;
+    archived messages come back as ChatMessage-shaped objects.
+
+    Returns (messages, has_more) where has_more tells whether another page
+    exists in the same direction.
+    """
+    # Authors come back in the same query, so rendering never lazy-loads them
+    query = ChatMessage.query.options(
+        joinedload(ChatMessage.user).load_only(User.id, User.nickname)
+    ).filter(ChatMessage.group_chat_id == group_chat_id)
+
+    if after_id is not None:
+        rows = query.filter(ChatMessage.id > after_id).order_by(ChatMessage.id.asc()).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+
+    if before_id is not None:
+        query = query.filter(ChatMessage.id < before_id)
+
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not has_more:
+        # Older history continues in the archive, below the oldest hot id
+        archived, has_more = fetch_archived(group_chat_id, rows[-1].id if rows else before_id, limit - len(rows))
+        rows += archived
+    rows.reverse()
+    return rows, has_more
+
+def newest_message_id(group_chat_id):
+    """Id of the group's newest hot message, or None; a single seek on ix_chat_message_group_id"""
+    return db.session.query(func.max(ChatMessage.id)).filter(ChatMessage.group_chat_id == group_chat_id).scalar()
+
+def serialize_message(message, author=None):
+    """Convert a chat message into the JSON shape used by the chat page.
+
+    Pass `author` when the nickname is already at hand, to skip loading
+    message.user.
+    """
+    return {
+        'id': message.id,
+        'user_id': message.user_id,
+        'author': author if author is not None else message.user.nickname,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+        'time': message.created_at.strftime('%I:%M %p'),
+        'is_moderated': bool(message.is_moderated),
+    }
+
+def format_sse(payload):
+    """Encode a serialized message as a Server-Sent Event carrying its id"""
+    return f"id: {payload['id']}\nevent: message\ndata: {json.dumps(payload)}\n\n"
@@ -0,0 +1,164 @@
+import os
+from datetime import timedelta
+import click
+from app import app, db
+from models import AssessmentResult, User
+from routes import create_default_data
+from migrations import init_database, current_version
+from rollups import rebuild_rollups
+from rescore import rescore_assessments
+from groups import rebalance_groups
+from sqlite_profile import is_sqlite, checkpoint as wal_checkpoint
+from assets import build_assets, load_manifest
+from export import EXPORT_FORMATS
+from archive import archive_chat
+from habits import backfill_days, backfill_streaks
+from search import INDEXES as SEARCH_INDEXES, search_available, reindex as reindex_search
+
+@app.cli.command('init-db')
+def init_db():
+    """Create missing tables and apply pending schema migrations"""
+    applied = init_database(db)
+    with db.engine.connect() as connection:
+        version = current_version(connection)
+    if applied:
+        click.echo(f"Applied migrations {', '.join(map(str, applied))}; schema is at version {version}")
+    else:
+        click.echo(f"Schema is up to date at version {version}")
+
+# Older name for init-db, kept for existing deploy scripts
+app.cli.add_command(init_db, 'db-upgrade')
+
+@app.cli.command('seed')
+def seed():
+    """Create the default announcements if the database has none"""
+    create_default_data()
+    click.echo("Default data is in place")
+
+@app.cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user')
+def rebuild_rollups_command(user_id):
+    """Regenerate daily mood, emotion and habit rollups from raw entries"""
+    with db.engine.begin() as connection:
+        written = rebuild_rollups(connection, user_id=user_id)
+    click.echo(f"Rebuilt {written} user-day rollups")
+
+@app.cli.command('rescore-assessments')
+@click.option('--chunk-size', type=int, default=1000, show_default=True, help='Results read and written per transaction')
+@click.option('--dry-run', is_flag=True, help='Print what would change without writing anything')
+@click.option('--resume', is_flag=True, help='Continue after the id saved in the checkpoint file')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), default=None,
+              help='Checkpoint file (default: instance/rescore-assessments.checkpoint)')
+def rescore_assessments_command(chunk_size, dry_run, resume, checkpoint):
+    """Recompute stored color identities and groups after weight changes"""
+    checkpoint = checkpoint or os.path.join(app.instance_path, 'rescore-assessments.checkpoint')
+    start_after = 0
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            start_after = int(f.read().strip() or 0)
+        click.echo(f"Resuming after assessment result {start_after}")
+    
+    total = db.session.query(AssessmentResult).filter(AssessmentResult.id > start_after).count()
+    scanned = changed_results = changed_users = 0
+    
+    for progress in rescore_assessments(chunk_size=chunk_size, start_after=start_after, dry_run=dry_run):
+        scanned += progress['scanned']
+        changed_results += progress['changed_results']
+        changed_users += progress['changed_users']
+        for line in progress['diffs']:
+            click.echo(f"  {line}")
+        if not dry_run:
+            os.makedirs(os.path.dirname(checkpoint), exist_ok=True)
+            with open(checkpoint, 'w') as f:
+                f.write(str(progress['last_id']))
+        click.echo(f"{scanned}/{total} results scanned ({100 * scanned / max(total, 1):.1f}%), "
+                   f"{changed_results} results and {changed_users} users {'would change' if dry_run else 'updated'}")
+    
+    if not dry_run and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    click.echo("Dry run complete, nothing written" if dry_run else "Rescoring complete")
+
+@app.cli.command('rebalance-groups')
+@click.option('--color', default=None, help='Only rebalance this color identity')
+@click.option('--dry-run', is_flag=True, help='Print the moves without writing them')
+def rebalance_groups_command(color, dry_run):
+    """Recount group members and move overflow out of over-capacity shards"""
+    moves = 0
+    for user_id, source, target in rebalance_groups(color_identity=color, dry_run=dry_run):
+        click.echo(f"  user {user_id}: {source} -> {target}")
+        moves += 1
+    click.echo(f"{moves} members {'would move' if dry_run else 'moved'}")
+
+@app.cli.command('wal-checkpoint')
+@click.option('--mode', type=click.Choice(['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE']), default='TRUNCATE', show_default=True)
+def wal_checkpoint_command(mode):
+    """Checkpoint the SQLite write-ahead log (for cron or maintenance windows)"""
+    if not is_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]):
+        raise click.ClickException("wal-checkpoint only applies to SQLite databases")
+    busy, wal_pages, checkpointed = wal_checkpoint(db.engine, mode)
+    click.echo(f"{checkpointed}/{wal_pages} WAL pages checkpointed{' (blocked by active readers)' if busy else ''}")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Write fingerprinted, precompressed static assets and their manifest to static/build"""
+    manifest = build_assets(app.static_folder, app.config["ASSET_WEBP_WIDTHS"])
+    load_manifest(reload=True)
+    click.echo(f"Built {len(manifest['assets'])} assets, {len(manifest['encodings'])} precompressed, "
+               f"{len(manifest['webp'])} images with WebP renditions")
+
+@app.cli.command('export-user')
+@click.option('--user-id', type=int, default=None)
+@click.option('--nickname', default=None)
+@click.option('--format', 'export_format', type=click.Choice(sorted(EXPORT_FORMATS)), default='ndjson', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), required=True, help="File to write ('-' for stdout)")
+def export_user_command(user_id, nickname, export_format, output):
+    """Stream one user's data to a file as NDJSON or a zip of CSVs"""
+    if (user_id is None) == (nickname is None):
+        raise click.UsageError("Pass exactly one of --user-id or --nickname")
+    user = db.session.get(User, user_id) if user_id is not None else User.query.filter_by(nickname=nickname).first()
+    if user is None:
+        raise click.ClickException("No such user")
+
+    generate = EXPORT_FORMATS[export_format][0]
+    written = 0
+    with click.open_file(output, 'wb') as f:
+        for chunk in generate(user.id):
+            f.write(chunk)
+            written += len(chunk)
+    click.echo(f"Exported user {user.id} ({user.nickname}): {written} bytes", err=True)
+
+@app.cli.command('archive-chat')
+@click.option('--older-than-days', type=int, default=None, help='Default: CHAT_ARCHIVE_AFTER_DAYS')
+@click.option('--block-size', type=int, default=None, help='Messages per archive block (default: CHAT_ARCHIVE_BLOCK_SIZE)')
+@click.option('--group-id', type=int, default=None, help='Only archive this group')
+@click.option('--dry-run', is_flag=True, help='Count what would move without writing anything')
+def archive_chat_command(older_than_days, block_size, group_id, dry_run):
+    """Move old chat messages out of the hot table into compressed archive blocks"""
+    older_than = timedelta(days=older_than_days) if older_than_days is not None else None
+    total = 0
+    for group_chat_id, moved in archive_chat(older_than, block_size, group_id, dry_run):
+        total += moved
+        click.echo(f"  group {group_chat_id}: {moved} messages {'would move' if dry_run else 'archived'}")
+    click.echo(f"{total} messages {'would be archived' if dry_run else 'archived'}")
+
+@app.cli.command('search-reindex')
+@click.option('--index', 'indexes', type=click.Choice(SEARCH_INDEXES), multiple=True, help='Only rebuild this index (repeatable)')
+def search_reindex_command(indexes):
+    """Rebuild the full-text search indexes from poems, chat and the chat archive"""
+    with db.engine.begin() as connection:
+        if not search_available(connection):
+            raise click.ClickException("Full-text search needs SQLite with FTS5")
+        counts = reindex_search(connection, indexes or SEARCH_INDEXES)
+    for index, count in counts.items():
+        click.echo(f"  {index}: {count} entries indexed")
+
+@app.cli.command('backfill-habits')
+@click.option('--user-id', type=int, default=None, help='Only recompute this user\'s streaks')
+def backfill_habits_command(user_id):
+    """Fill missing habit days and recompute every habit streak in one pass"""
+    with db.engine.begin() as connection:
+        filled, merged = backfill_days(connection)
+        updated = backfill_streaks(connection, user_id=user_id)
+        if merged:
+            rebuild_rollups(connection)
+    click.echo(f"{filled} habit days filled, {merged} duplicate rows merged, {updated} streaks updated")
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+import zipfile
+from datetime import date, datetime
+from sqlalchemy import select
+from app import db
+from models import User, AssessmentResult, MoodEntry, HabitEntry, EmotionEntry, Poem, ChatMessage
+from archive import iter_archived_for_user
+
+# Streaming personal data export.
+#
+# Every table is read with yield_per, so rows come off the cursor one chunk
+# at a time, and each chunk is encoded and handed to the caller before the
+# next one is read. Memory stays flat however long the user's history is.
+# Output is NDJSON (one {"table": ..., "row": {...}} object per line) or a
+# zip holding one CSV per table, built on the fly without seeking. Chat
+# messages include the user's archived ones (see archive.py).
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Tables holding a user's data, keyed by the name used in the export
+EXPORT_TABLES = [
+    ('assessment_results', AssessmentResult),
+    ('mood_entries', MoodEntry),
+    ('habit_entries', HabitEntry),
+    ('emotion_entries', EmotionEntry),
+    ('poems', Poem),
+    ('chat_messages', ChatMessage),
+]
+
+PROFILE_COLUMNS = ['id', 'nickname', 'email', 'color_identity', 'assessment_completed', 'created_at', 'dark_mode', 'timezone']
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _columns(model):
+    return [column for column in model.__table__.columns]
+
+def iter_table(model, user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of up to chunk_size row dicts for one user's rows of a table, in id order"""
+    columns = _columns(model)
+    result = db.session.execute(
+        select(*columns).where(model.user_id == user_id).order_by(model.id),
+        execution_options={'yield_per': chunk_size},
+    )
+    names = [column.name for column in columns]
+    for rows in result.partitions():
+        yield [dict(zip(names, map(_value, row))) for row in rows]
+
+def _table_chunks(model, user_id, chunk_size):
+    yield from iter_table(model, user_id, chunk_size)
+    if model is ChatMessage:
+        yield from iter_archived_for_user(user_id)
+
+def _profile(user_id):
+    user = db.session.get(User, user_id)
+    return {name: _value(getattr(user, name)) for name in PROFILE_COLUMNS}
+
+def export_ndjson(user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the user's data as NDJSON, one encoded chunk of lines at a time"""
+    yield (json.dumps({'table': 'profile', 'row': _profile(user_id)}) + '\n').encode('utf-8')
+    for table, model in EXPORT_TABLES:
+        for rows in _table_chunks(model, user_id, chunk_size):
+            yield ''.join(json.dumps({'table': table, 'row': row}) + '\n' for row in rows).encode('utf-8')
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only sink that zipfile fills and the export generator empties"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _csv_chunk(rows, header=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+def export_zip(user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield a zip of one CSV per table, streamed as it is compressed"""
+    sink = _StreamBuffer()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        profile = _profile(user_id)
+        with archive.open('profile.csv', 'w') as entry:
+            entry.write(_csv_chunk([list(profile.values())], header=list(profile)))
+        yield sink.take()
+
+        for table, model in EXPORT_TABLES:
+            names = [column.name for column in _columns(model)]
+            with archive.open(f'{table}.csv', 'w', force_zip64=True) as entry:
+                entry.write(_csv_chunk([], header=names))
+                for rows in _table_chunks(model, user_id, chunk_size):
+                    entry.write(_csv_chunk([[row[name] for name in names] for row in rows]))
+                    data = sink.take()
+                    if data:
+                        yield data
+            yield sink.take()
+    yield sink.take()
+
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson', 'ndjson'),
+    'zip': (export_zip, 'application/zip', 'zip'),
+}
@@ -0,0 +1,134 @@
+from datetime import datetime
+from sqlalchemy import case, func, select, update
+from app import app, db
+from models import GroupChat, User
+from assessment import get_color_identity_info, get_group_chat_assignment
+
+# Capacity-aware group chat shards.
+#
+# Each color identity starts with one room (shard 1, named by
+# get_group_chat_assignment). A shard stops taking new members once it holds
+# GROUP_SHARD_MAX_MEMBERS users or has carried GROUP_SHARD_MAX_DAILY_MESSAGES
+# messages today; new members then go to the least-loaded open shard, and
+# when every shard is closed a new numbered one is opened. Loads come from
+# the maintained GroupChat.member_count and activity counters, never from
+# counting GroupChat.members.
+
+def shard_name(color_identity, shard):
+    base_name = get_group_chat_assignment(color_identity)
+    return base_name if shard == 1 else f"{base_name} #{shard}"
+
+def is_open(group_chat, today=None, pending=0):
+    """Whether a shard can take another member"""
+    today = today or datetime.utcnow().date()
+    if group_chat.member_count + pending >= app.config['GROUP_SHARD_MAX_MEMBERS']:
+        return False
+    max_messages = app.config['GROUP_SHARD_MAX_DAILY_MESSAGES']
+    if max_messages and group_chat.activity_day == today and group_chat.activity_count >= max_messages:
+        return False
+    return True
+
+def choose_shard(color_identity, pending=None):
+    """Pick the least-loaded open shard for a color, opening a new one if all are closed.
+
+    `pending` maps group ids to members already placed but not yet counted,
+    for callers that assign many users before refreshing counters.
+    """
+    pending = pending or {}
+    today = datetime.utcnow().date()
+    shards = GroupChat.query.filter_by(color_identity=color_identity).order_by(GroupChat.shard).all()
+
+    open_shards = [group_chat for group_chat in shards if is_open(group_chat, today, pending.get(group_chat.id, 0))]
+    if open_shards:
+        return min(open_shards, key=lambda group_chat: (group_chat.member_count + pending.get(group_chat.id, 0), group_chat.shard))
+
+    shard = max((group_chat.shard for group_chat in shards), default=0) + 1
+    group_chat = GroupChat()
+    group_chat.name = shard_name(color_identity, shard)
+    group_chat.color_identity = color_identity
+    group_chat.description = f"Support group for {get_color_identity_info(color_identity)['name']} individuals"
+    group_chat.shard = shard
+    group_chat.member_count = 0
+    db.session.add(group_chat)
+    db.session.flush()
+    return group_chat
+
+def assign_group_chat(user, color_identity):
+    """Place a user in a group for their color and keep member counters in step (caller commits).
+
+    Users already in one of their color's shards stay where they are.
+    """
+    current = db.session.get(GroupChat, user.group_chat_id) if user.group_chat_id else None
+    if current is not None and current.color_identity == color_identity:
+        return current
+
+    group_chat = choose_shard(color_identity)
+    if current is not None:
+        current.member_count = GroupChat.member_count - 1
+    group_chat.member_count = GroupChat.member_count + 1
+    user.group_chat_id = group_chat.id
+    return group_chat
+
+def record_group_activity(group_chat_id):
+    """Count a message against its group's daily activity (caller commits)"""
+    today = datetime.utcnow().date()
+    db.session.execute(
+        update(GroupChat)
+        .where(GroupChat.id == group_chat_id)
+        .values(
+            activity_count=case((GroupChat.activity_day == today, GroupChat.activity_count + 1), else_=1),
+            activity_day=today,
+        )
+    )
+
+def refresh_member_counts(group_ids=None):
+    """Recount member_count from the user table, for all groups or the given ids (caller commits)"""
+    members = select(func.count(User.id)).where(User.group_chat_id == GroupChat.id).scalar_subquery()
+    stmt = update(GroupChat).values(member_count=members)
+    if group_ids is not None:
+        stmt = stmt.where(GroupChat.id.in_(group_ids))
+    db.session.execute(stmt, execution_options={'synchronize_session': False})
+    db.session.expire_all()
+
+def rebalance_groups(color_identity=None, dry_run=False):
+    """Move the overflow of over-capacity shards into open ones.
+
+    Counters are recounted first so drift is repaired. Only members beyond a
+    shard's capacity move, newest first, so established rooms stay intact.
+    Yields (user_id, from_group, to_group) for every move; commits unless
+    dry_run.
+    """
+    refresh_member_counts()
+
+    capacity = app.config['GROUP_SHARD_MAX_MEMBERS']
+    colors = [color_identity] if color_identity else [
+        color for (color,) in db.session.execute(select(GroupChat.color_identity).distinct()).all()
+    ]
+
+    for color in colors:
+        pending = {}
+        shards = GroupChat.query.filter_by(color_identity=color).order_by(GroupChat.shard).all()
+        for source in shards:
+            overflow = source.member_count - capacity
+            if overflow <= 0:
+                continue
+            pending[source.id] = -overflow
+            movers = db.session.execute(
+                select(User.id).where(User.group_chat_id == source.id).order_by(User.id.desc()).limit(overflow)
+            ).scalars().all()
+            for user_id in movers:
+                target = choose_shard(color, pending)
+                pending[target.id] = pending.get(target.id, 0) + 1
+                if not dry_run:
+                    db.session.execute(
+                        update(User)
+                        .where(User.id == user_id)
+                        .values(group_chat_id=target.id, cache_version=User.cache_version + 1)
+                    )
+                yield user_id, source.name, target.name
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        refresh_member_counts()
+        db.session.commit()
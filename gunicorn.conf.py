@@ -0,0 +1,26 @@
+# Gunicorn settings, read automatically from the working directory.
+#
+# Workers import main without touching the database. The schema is created
+# or upgraded, and default data seeded, once per server start in a separate
+# process, so the master never holds the app or its connection pool and
+# --reload keeps working. Set INIT_DB_ON_START=0 to skip it when deploys run
+# `flask --app main init-db` and `flask --app main seed` themselves.
+# Connections inherited across fork (e.g. with --preload) are discarded in
+# each worker by the hook registered in app.py.
+import os
+import subprocess
+import sys
+
+# Chat streams (/chat/<id>/stream) stay open, so requests are served on
+# threads: an open chat tab holds one thread rather than the whole worker.
+# At most CHAT_STREAM_MAX_PER_WORKER threads (default 24) go to streams, so
+# one worker streams to 24 tabs and keeps 8 threads for other requests;
+# further tabs get 503 and the chat page polls every 10 seconds instead.
+# benchmarks/chat_stream_capacity.py measures this against a running server.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+
+def on_starting(server):
+    if os.environ.get("INIT_DB_ON_START", "1") == "1":
+        subprocess.run([sys.executable, "-c", "import main; main.prepare_database()"],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
@@ -0,0 +1,165 @@
+from datetime import timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import bindparam, delete, func, select, tuple_, update
+from models import HabitEntry, User
+
+# Habit days and streaks.
+#
+# A habit is tracked at most once per user-local day: HabitEntry.day holds
+# the user's calendar day at the time of writing, and a unique index on
+# (user_id, habit_name, day) turns every write into an upsert. A row's
+# streak_count is the number of consecutive completed days ending on it, so
+# it follows from the previous day's row alone: yesterday's streak + 1 when
+# completed, 0 otherwise. Writing today's row reads only yesterday's; a
+# write that changes an earlier day carries the new streak forward through
+# the consecutive days after it (see restreak_following).
+
+def zone(name):
+    """The tzinfo for an IANA time zone name, UTC when unknown or invalid"""
+    if not name:
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+def is_valid_zone(name):
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+def local_day(moment, zone_name):
+    """Calendar day of a naive UTC datetime in the named time zone"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(zone(zone_name)).date()
+
+def next_streak(previous_streak, completed):
+    return (previous_streak or 0) + 1 if completed else 0
+
+def previous_streak(executor, user_id, habit_name, day):
+    """streak_count of the row for the day before `day`, or None"""
+    return executor.execute(
+        select(HabitEntry.streak_count).where(
+            HabitEntry.user_id == user_id, HabitEntry.habit_name == habit_name, HabitEntry.day == day - timedelta(days=1)
+        )
+    ).scalar()
+
+def restreak_following(executor, user_id, habit_name, day, streak, batch_size=500):
+    """Recompute the streaks of the consecutive days after `day`, whose streak is now `streak`.
+
+    Stops at the first missing day, or at the first row whose stored streak
+    already agrees, since every later row follows from it. Returns the
+    number of rows updated.
+    """
+    updated = 0
+    while True:
+        rows = executor.execute(
+            select(HabitEntry.id, HabitEntry.day, HabitEntry.completed, HabitEntry.streak_count)
+            .where(HabitEntry.user_id == user_id, HabitEntry.habit_name == habit_name, HabitEntry.day > day)
+            .order_by(HabitEntry.day)
+            .limit(batch_size)
+        ).all()
+        changes = []
+        done = len(rows) < batch_size
+        for row_id, row_day, completed, stored in rows:
+            if row_day != day + timedelta(days=1):
+                done = True
+                break
+            day, streak = row_day, next_streak(streak, completed)
+            if stored == streak:
+                done = True
+                break
+            changes.append({'row_id': row_id, 'streak': streak})
+        if changes:
+            executor.execute(
+                update(HabitEntry.__table__).where(HabitEntry.__table__.c.id == bindparam('row_id')).values(streak_count=bindparam('streak')),
+                changes,
+            )
+            updated += len(changes)
+        if done:
+            return updated
+
+def backfill_days(connection, batch_size=1000):
+    """Fill HabitEntry.day for rows written before it existed, from created_at and the user's time zone.
+
+    Rows that land on the same (user, habit, day) are merged into the newest
+    one, as the upsert would have done; the unique index is dropped while
+    that happens and created again at the end. Returns (rows filled, rows
+    merged).
+    """
+    unique_day = next(index for index in HabitEntry.__table__.indexes if index.name == 'uq_habit_entry_user_habit_day')
+    pending = connection.execute(
+        select(HabitEntry.id).where(HabitEntry.day.is_(None), HabitEntry.created_at.is_not(None)).limit(1)
+    ).first()
+    if pending is None:
+        unique_day.create(connection, checkfirst=True)
+        return 0, 0
+    unique_day.drop(connection, checkfirst=True)
+
+    filled = 0
+    while True:
+        rows = connection.execute(
+            select(HabitEntry.id, HabitEntry.created_at, User.timezone)
+            .join(User, User.id == HabitEntry.user_id)
+            .where(HabitEntry.day.is_(None), HabitEntry.created_at.is_not(None))
+            .order_by(HabitEntry.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            update(HabitEntry.__table__).where(HabitEntry.__table__.c.id == bindparam('row_id')).values(day=bindparam('row_day')),
+            [{'row_id': row_id, 'row_day': local_day(created_at, zone_name)} for row_id, created_at, zone_name in rows],
+        )
+        filled += len(rows)
+
+    newest = (
+        select(func.max(HabitEntry.id))
+        .where(HabitEntry.day.is_not(None))
+        .group_by(HabitEntry.user_id, HabitEntry.habit_name, HabitEntry.day)
+    )
+    merged = connection.execute(
+        delete(HabitEntry).where(HabitEntry.day.is_not(None), HabitEntry.id.not_in(newest))
+    ).rowcount
+    unique_day.create(connection)
+    return filled, merged
+
+def backfill_streaks(connection, user_id=None, batch_size=5000):
+    """Recompute every streak_count in one pass over the rows in (user, habit, day) order.
+
+    Reads keyset batches along the unique index and only writes rows whose
+    stored streak differs. Returns the number of rows updated.
+    """
+    key = tuple_(HabitEntry.user_id, HabitEntry.habit_name, HabitEntry.day)
+    stmt = (
+        select(HabitEntry.id, HabitEntry.user_id, HabitEntry.habit_name, HabitEntry.day,
+               HabitEntry.completed, HabitEntry.streak_count)
+        .where(HabitEntry.day.is_not(None))
+        .order_by(HabitEntry.user_id, HabitEntry.habit_name, HabitEntry.day)
+        .limit(batch_size)
+    )
+    if user_id is not None:
+        stmt = stmt.where(HabitEntry.user_id == user_id)
+
+    updated = 0
+    last = None
+    streak = 0
+    while True:
+        rows = connection.execute(stmt if last is None else stmt.where(key > tuple_(*last))).all()
+        if not rows:
+            break
+        changes = []
+        for row_id, row_user, habit_name, day, completed, stored in rows:
+            follows = last is not None and last[:2] == (row_user, habit_name) and last[2] == day - timedelta(days=1)
+            streak = next_streak(streak if follows else 0, completed)
+            if stored != streak:
+                changes.append({'row_id': row_id, 'streak': streak})
+            last = (row_user, habit_name, day)
+        if changes:
+            connection.execute(
+                update(HabitEntry.__table__).where(HabitEntry.__table__.c.id == bindparam('row_id')).values(streak_count=bindparam('streak')),
+                changes,
+            )
+            updated += len(changes)
+    return updated
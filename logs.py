@@ -0,0 +1,187 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request, has_request_context
+from app import app
+
+# Structured, non-blocking logging (LOG_MODE=json).
+#
+# Request threads only enqueue records: a filter stamps each one with the
+# request id, route and method, the message is merged with its arguments,
+# and the record goes onto a bounded queue (dropped and counted if the queue
+# is full, never waited on). A QueueListener thread formats the records as
+# compact JSON lines and writes them to stderr.
+#
+# Every request also gets an access line with status and latency, and an
+# X-Request-ID response header (an incoming X-Request-ID is reused). Access
+# lines for successful requests to LOG_SAMPLED_ENDPOINTS go through a
+# per-endpoint rate limit of LOG_SAMPLE_PER_SECOND; the next line that gets
+# through carries the number suppressed since. So do 429s from the rate
+# limiter, which arrive in floods by design; other errors are never sampled.
+#
+# In the default LOG_MODE=basic, logging stays the synchronous
+# logging.basicConfig setup from app.py.
+
+# Record attributes copied into the JSON line when present
+CONTEXT_FIELDS = ('request_id', 'route', 'method', 'path', 'status', 'latency_ms', 'suppressed')
+
+access_log = logging.getLogger('serenity.access')
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                line[field] = value
+        if record.exc_text:
+            line['exc'] = record.exc_text
+        return json.dumps(line, default=str, separators=(',', ':'))
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request, on the thread that logged them"""
+
+    def filter(self, record):
+        if has_request_context() and getattr(record, 'request_id', None) is None:
+            record.request_id = g.get('request_id')
+            record.route = request.endpoint
+            record.method = request.method
+        return True
+
+class RateLimitSampler(logging.Filter):
+    """Let at most `per_second` records marked sampled=True through per (logger, route)"""
+
+    def __init__(self, per_second):
+        super().__init__()
+        self.per_second = per_second
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> [tokens, last refill, suppressed]
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False):
+            return True
+        key = (record.name, getattr(record, 'route', None))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.per_second, now, 0]
+            bucket[0] = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed, bucket[2] = bucket[2], 0
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller and leaves formatting to the listener"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve what may not outlive this call: the message arguments and the traceback
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def parse_levels(spec):
+    """'werkzeug=WARNING,sqlalchemy=WARNING' -> {'werkzeug': 'WARNING', 'sqlalchemy': 'WARNING'}"""
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+_listener = None
+
+def _start_listener(log_queue):
+    global _listener
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+
+def _stop_listener():
+    # Flushes whatever is still queued
+    if _listener is not None:
+        _listener.stop()
+
+def init_json_logging(app):
+    """Route every log record through the queue and the JSON listener thread"""
+    log_queue = queue.Queue(maxsize=app.config['LOG_QUEUE_SIZE'])
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(RateLimitSampler(app.config['LOG_SAMPLE_PER_SECOND']))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+    for name, level in parse_levels(app.config['LOG_LEVELS']).items():
+        logging.getLogger(name).setLevel(level)
+
+    _start_listener(log_queue)
+    atexit.register(_stop_listener)
+
+    def restart_after_fork():
+        # The listener thread does not survive fork; give the child its own queue and thread
+        handler.queue = queue.Queue(maxsize=app.config['LOG_QUEUE_SIZE'])
+        _start_listener(handler.queue)
+    os.register_at_fork(after_in_child=restart_after_fork)
+    return handler
+
+if app.config['LOG_MODE'] == 'json':
+    sampled_endpoints = {name.strip() for name in app.config['LOG_SAMPLED_ENDPOINTS'].split(',') if name.strip()}
+    init_json_logging(app)
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+        g.request_log_started = time.perf_counter()
+
+    @app.after_request
+    def write_access_log(response):
+        started = g.get('request_log_started')
+        if started is not None:
+            access_log.info(
+                '%s %s %s', request.method, request.path, response.status_code,
+                extra={
+                    'path': request.path,
+                    'status': response.status_code,
+                    'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+                    'sampled': (response.status_code < 400 or response.status_code == 429) and request.endpoint in sampled_endpoints,
+                },
+            )
+            response.headers['X-Request-ID'] = g.request_id
+        return response
@@ -1,14 +1,30 @@
 from app import app, db
-import models
-import routes
-
-with app.app_context():
-    # Create all database tables
-    db.create_all()
-    
-    # Initialize default data
+from migrations import init_database
+
+def create_app():
+    """Assemble the application: models, routes, CLI commands and request hooks.
+
+    Does no database or file I/O, so importing this module is cheap and safe
+    before a fork. The schema and default rows come from `flask init-db`
+    and `flask seed` (gunicorn.conf.py runs both once per server start).
+    """
+    import models  # noqa: F401
+    import routes  # noqa: F401
+    import commands  # noqa: F401
+    import metrics  # noqa: F401
+    import assets  # noqa: F401
+    import logs  # noqa: F401
+    return app
+
+app = create_app()
+
+def prepare_database():
+    """Create or upgrade the schema and seed default data, like `flask init-db` then `flask seed`"""
     from routes import create_default_data
-    create_default_data()
+    with app.app_context():
+        init_database(db)
+        create_default_data()
 
 if __name__ == '__main__':
+    prepare_database()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,209 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from flask import g, request, has_request_context, before_render_template, template_rendered, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+import cache
+
+# Per-route request instrumentation.
+#
+# Every request records wall time, template render time, and the number and
+# total time of its SQL statements into histograms labelled by endpoint,
+# served in Prometheus text format at /metrics. Each thread writes only to
+# its own shard, so recording never takes a lock; /metrics sums the shards.
+# Figures are per worker process: scrape each worker, or sum across them.
+#
+# Requests slower than METRICS_SLOW_REQUEST_MS are logged together with
+# their slowest statements. A request that issues the same SELECT shape
+# METRICS_N_PLUS_ONE_THRESHOLD times or more is logged as a likely N+1.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    'serenity_request_duration_seconds': ('Wall time spent in the view', DURATION_BUCKETS),
+    'serenity_template_render_seconds': ('Time spent rendering templates', DURATION_BUCKETS),
+    'serenity_sql_duration_seconds': ('Time spent executing SQL per request', DURATION_BUCKETS),
+    'serenity_sql_queries': ('SQL statements issued per request', QUERY_BUCKETS),
+}
+COUNTERS = {
+    'serenity_requests_total': 'Requests served',
+    'serenity_slow_requests_total': 'Requests slower than METRICS_SLOW_REQUEST_MS',
+    'serenity_n_plus_one_total': 'Requests that repeated one SELECT shape past METRICS_N_PLUS_ONE_THRESHOLD',
+}
+
+_IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+class _Shard:
+    def __init__(self, thread):
+        self.thread = thread
+        self.histograms = {}
+        self.counters = {}
+
+_shards_lock = threading.Lock()
+_shards = []
+_retired = _Shard(None)
+_local = threading.local()
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = _Shard(threading.current_thread())
+        with _shards_lock:
+            # Fold shards of finished threads into one, so thread-per-request
+            # servers do not grow the list forever
+            for old in [old for old in _shards if not old.thread.is_alive()]:
+                _merge(_retired, old)
+                _shards.remove(old)
+            _shards.append(shard)
+    return shard
+
+def _merge(target, source):
+    for key, values in list(source.histograms.items()):
+        current = target.histograms.setdefault(key, [0] * len(values))
+        for index, value in enumerate(values):
+            current[index] += value
+    for key, value in list(source.counters.items()):
+        target.counters[key] = target.counters.get(key, 0) + value
+
+def observe(name, labels, value):
+    buckets = HISTOGRAMS[name][1]
+    key = (name, labels)
+    histograms = _shard().histograms
+    values = histograms.get(key)
+    if values is None:
+        # One count per bucket, then +Inf, sum
+        values = histograms[key] = [0] * (len(buckets) + 2)
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            values[index] += 1
+    values[-2] += 1
+    values[-1] += value
+
+def increment(name, labels, amount=1):
+    counters = _shard().counters
+    counters[(name, labels)] = counters.get((name, labels), 0) + amount
+
+def statement_shape(statement):
+    """A statement with expanded IN lists collapsed, so repeats compare equal"""
+    return _IN_LIST.sub('(?)', ' '.join(statement.split()))
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    stats = g.get('_request_metrics') if has_request_context() else None
+    if stats is not None and started is not None:
+        stats['statements'].append((statement, time.perf_counter() - started))
+
+@before_render_template.connect_via(app)
+def _before_render(sender, template, context, **extra):
+    stats = g.get('_request_metrics')
+    if stats is not None:
+        stats['render_started'].append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def _after_render(sender, template, context, **extra):
+    stats = g.get('_request_metrics')
+    if stats is not None and stats['render_started']:
+        stats['render_time'] += time.perf_counter() - stats['render_started'].pop()
+
+@app.before_request
+def _start_request_metrics():
+    if app.config['METRICS_ENABLED']:
+        g._request_metrics = {'started': time.perf_counter(), 'statements': [], 'render_started': [], 'render_time': 0.0}
+
+@app.after_request
+def _record_status(response):
+    stats = g.get('_request_metrics')
+    if stats is not None:
+        stats['status'] = response.status_code
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    stats = g.pop('_request_metrics', None)
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - stats['started']
+    endpoint = request.endpoint or 'unmatched'
+    statements = stats['statements']
+    sql_time = sum(duration for statement, duration in statements)
+    status = 500 if exc is not None else stats.get('status', 500)
+
+    labels = (('endpoint', endpoint), ('method', request.method))
+    observe('serenity_request_duration_seconds', labels, elapsed)
+    observe('serenity_template_render_seconds', labels, stats['render_time'])
+    observe('serenity_sql_duration_seconds', labels, sql_time)
+    observe('serenity_sql_queries', labels, len(statements))
+    increment('serenity_requests_total', labels + (('status', str(status)),))
+
+    if elapsed * 1000 >= app.config['METRICS_SLOW_REQUEST_MS']:
+        increment('serenity_slow_requests_total', labels)
+        slowest = sorted(statements, key=lambda item: item[1], reverse=True)[:5]
+        details = ''.join(f"\n  {duration * 1000:.1f} ms: {' '.join(statement.split())}" for statement, duration in slowest)
+        logging.warning(f"Slow request {request.method} {request.path} ({endpoint}): {elapsed * 1000:.0f} ms, "
+                        f"{len(statements)} statements in {sql_time * 1000:.0f} ms, "
+                        f"render {stats['render_time'] * 1000:.0f} ms{details}")
+
+    threshold = app.config['METRICS_N_PLUS_ONE_THRESHOLD']
+    if threshold:
+        shapes = Counter(statement_shape(statement) for statement, duration in statements
+                         if statement.lstrip().upper().startswith('SELECT'))
+        repeated = [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+        if repeated:
+            increment('serenity_n_plus_one_total', labels)
+            shape, count = repeated[0]
+            logging.warning(f"Possible N+1 in {endpoint}: {count} identical SELECTs: {shape}")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+def render_metrics():
+    """All shards summed, in Prometheus text exposition format"""
+    total = _Shard(None)
+    with _shards_lock:
+        _merge(total, _retired)
+        for shard in _shards:
+            _merge(total, shard)
+
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+        for (key, labels), values in sorted(total.histograms.items()):
+            if key != name:
+                continue
+            # observe() counts a value into every bucket at or above it, so these are cumulative
+            for bound, count in zip(buckets, values):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {values[-2]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-2]}")
+    for name, description in COUNTERS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+        for (key, labels), value in sorted(total.counters.items()):
+            if key == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    lines += ["# HELP serenity_dashboard_cache Dashboard snapshot cache statistics", "# TYPE serenity_dashboard_cache gauge"]
+    for stat, value in cache.dashboard_cache.stats().items():
+        lines.append(f'serenity_dashboard_cache{{stat="{stat}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    if not app.config['METRICS_ENABLED']:
+        return Response('Metrics are disabled\n', status=404, mimetype='text/plain')
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,360 @@
+import json
+import logging
+import zlib
+from datetime import timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import (Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData, String,
+                        Table, UniqueConstraint, bindparam, inspect, select, text, update)
+
+# Versioned schema migrations.
+#
+# db.create_all() only creates missing tables; it never adds columns or
+# indexes to tables that already exist (such as instance/serenity.db). Each
+# migration below brings an existing database forward one step and is
+# recorded in the schema_version table so it runs exactly once. Migrations
+# are written to be safe on a fresh database that create_all() has just
+# built, so new installs and upgraded ones end up with the same schema.
+#
+# To change the schema: update models.py, then append a migration here with
+# the next version number. Never edit a migration that has been released.
+# Migrations carry their own table definitions and SQL rather than calling
+# into models.py or other modules, so they keep doing what they did when
+# they were released.
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a migration function taking an open connection"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return decorator
+
+def has_column(connection, table, column):
+    return column in {col['name'] for col in inspect(connection).get_columns(table)}
+
+@migration(1, "Composite indexes for time-series and chat queries")
+def add_time_series_indexes(connection):
+    indexes = [
+        ("ix_user_group_chat_id", "user", "group_chat_id"),
+        ("ix_assessment_result_user_created", "assessment_result", "user_id, created_at"),
+        ("ix_chat_message_group_id", "chat_message", "group_chat_id, id"),
+        ("ix_mood_entry_user_created", "mood_entry", "user_id, created_at"),
+        ("ix_habit_entry_user_created", "habit_entry", "user_id, created_at"),
+        ("ix_emotion_entry_user_created", "emotion_entry", "user_id, created_at"),
+        ("ix_poem_user_updated", "poem", "user_id, updated_at"),
+        ("ix_announcement_active_created", "announcement", "is_active, created_at"),
+    ]
+    for name, table, columns in indexes:
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({columns})'))
+
+@migration(2, "Daily rollup tables, backfilled from existing history")
+def add_daily_rollups(connection):
+    metadata = MetaData()
+    Table('user', metadata, Column('id', Integer, primary_key=True))
+    daily_rollup = Table(
+        'daily_rollup', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+        Column('day', Date, nullable=False),
+        Column('mood_count', Integer, nullable=False),
+        Column('mood_sum', Integer, nullable=False),
+        Column('mood_min', Integer),
+        Column('mood_max', Integer),
+        Column('emotion_count', Integer, nullable=False),
+        Column('intensity_sum', Integer, nullable=False),
+        Column('intensity_min', Integer),
+        Column('intensity_max', Integer),
+        Column('habits_tracked', Integer, nullable=False),
+        Column('habits_completed', Integer, nullable=False),
+        UniqueConstraint('user_id', 'day', name='uq_daily_rollup_user_day'),
+    )
+    daily_mood_type_count = Table(
+        'daily_mood_type_count', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+        Column('day', Date, nullable=False),
+        Column('mood_type', String(50), nullable=False),
+        Column('count', Integer, nullable=False),
+        UniqueConstraint('user_id', 'day', 'mood_type', name='uq_daily_mood_type_user_day_type'),
+    )
+    daily_rollup.create(connection, checkfirst=True)
+    daily_mood_type_count.create(connection, checkfirst=True)
+
+    # Days are the UTC date of created_at; moods, emotions and habits of one
+    # user-day are summed into a single row
+    connection.execute(text("DELETE FROM daily_rollup"))
+    connection.execute(text("""
+        INSERT INTO daily_rollup (user_id, day, mood_count, mood_sum, mood_min, mood_max,
+                                  emotion_count, intensity_sum, intensity_min, intensity_max,
+                                  habits_tracked, habits_completed)
+        SELECT user_id, day, SUM(mood_count), SUM(mood_sum), MIN(mood_min), MAX(mood_max),
+               SUM(emotion_count), SUM(intensity_sum), MIN(intensity_min), MAX(intensity_max),
+               SUM(habits_tracked), SUM(habits_completed)
+        FROM (
+            SELECT user_id, date(created_at) AS day, COUNT(*) AS mood_count, SUM(mood_level) AS mood_sum,
+                   MIN(mood_level) AS mood_min, MAX(mood_level) AS mood_max, 0 AS emotion_count,
+                   0 AS intensity_sum, NULL AS intensity_min, NULL AS intensity_max,
+                   0 AS habits_tracked, 0 AS habits_completed
+            FROM mood_entry WHERE created_at IS NOT NULL GROUP BY user_id, date(created_at)
+            UNION ALL
+            SELECT user_id, date(created_at), 0, 0, NULL, NULL, COUNT(*), SUM(intensity),
+                   MIN(intensity), MAX(intensity), 0, 0
+            FROM emotion_entry WHERE created_at IS NOT NULL GROUP BY user_id, date(created_at)
+            UNION ALL
+            SELECT user_id, date(created_at), 0, 0, NULL, NULL, 0, 0, NULL, NULL,
+                   COUNT(*), SUM(CASE WHEN completed THEN 1 ELSE 0 END)
+            FROM habit_entry WHERE created_at IS NOT NULL GROUP BY user_id, date(created_at)
+        ) AS days
+        GROUP BY user_id, day
+    """))
+    connection.execute(text("DELETE FROM daily_mood_type_count"))
+    connection.execute(text("""
+        INSERT INTO daily_mood_type_count (user_id, day, mood_type, count)
+        SELECT user_id, date(created_at), mood_type, COUNT(*)
+        FROM mood_entry WHERE created_at IS NOT NULL AND mood_type IS NOT NULL
+        GROUP BY user_id, date(created_at), mood_type
+    """))
+
+@migration(3, "User.cache_version for dashboard snapshot invalidation")
+def add_user_cache_version(connection):
+    if not has_column(connection, "user", "cache_version"):
+        connection.execute(text('ALTER TABLE "user" ADD COLUMN cache_version INTEGER NOT NULL DEFAULT 0'))
+
+@migration(4, "Group chat shards with maintained member and activity counters")
+def add_group_chat_shards(connection):
+    columns = [
+        ("shard", "INTEGER NOT NULL DEFAULT 1"),
+        ("member_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("activity_day", "DATE"),
+        ("activity_count", "INTEGER NOT NULL DEFAULT 0"),
+    ]
+    for name, definition in columns:
+        if not has_column(connection, "group_chat", name):
+            connection.execute(text(f"ALTER TABLE group_chat ADD COLUMN {name} {definition}"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_group_chat_color_shard ON group_chat (color_identity, shard)"))
+    connection.execute(text(
+        'UPDATE group_chat SET member_count = '
+        '(SELECT COUNT(*) FROM "user" WHERE "user".group_chat_id = group_chat.id)'
+    ))
+
+@migration(5, "Daily emotion name counts for trend buckets, backfilled from existing history")
+def add_daily_emotion_names(connection):
+    metadata = MetaData()
+    Table('user', metadata, Column('id', Integer, primary_key=True))
+    Table(
+        'daily_emotion_name_count', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+        Column('day', Date, nullable=False),
+        Column('emotion_name', String(50), nullable=False),
+        Column('count', Integer, nullable=False),
+        UniqueConstraint('user_id', 'day', 'emotion_name', name='uq_daily_emotion_name_user_day_name'),
+    ).create(connection, checkfirst=True)
+
+    connection.execute(text("DELETE FROM daily_emotion_name_count"))
+    connection.execute(text("""
+        INSERT INTO daily_emotion_name_count (user_id, day, emotion_name, count)
+        SELECT user_id, date(created_at), emotion_name, COUNT(*)
+        FROM emotion_entry WHERE created_at IS NOT NULL AND emotion_name IS NOT NULL
+        GROUP BY user_id, date(created_at), emotion_name
+    """))
+
+@migration(6, "Chat archive blocks for messages moved out of the hot chat table")
+def add_chat_archive(connection):
+    metadata = MetaData()
+    Table('user', metadata, Column('id', Integer, primary_key=True))
+    Table('group_chat', metadata, Column('id', Integer, primary_key=True))
+    chat_archive_block = Table(
+        'chat_archive_block', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('group_chat_id', Integer, ForeignKey('group_chat.id'), nullable=False),
+        Column('first_message_id', Integer, nullable=False),
+        Column('last_message_id', Integer, nullable=False),
+        Column('message_count', Integer, nullable=False),
+        Column('first_created_at', DateTime),
+        Column('last_created_at', DateTime),
+        Column('payload', LargeBinary, nullable=False),
+        Index('ix_chat_archive_block_group_last', 'group_chat_id', 'last_message_id'),
+    )
+    chat_archive_author = Table(
+        'chat_archive_author', metadata,
+        Column('block_id', Integer, ForeignKey('chat_archive_block.id'), primary_key=True),
+        Column('user_id', Integer, ForeignKey('user.id'), primary_key=True),
+        Index('ix_chat_archive_author_user', 'user_id'),
+    )
+    chat_archive_block.create(connection, checkfirst=True)
+    chat_archive_author.create(connection, checkfirst=True)
+
+@migration(7, "Full-text search indexes over poems and chat, kept in sync by triggers")
+def add_search_indexes(connection):
+    if connection.dialect.name != 'sqlite':
+        return
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS poem_fts USING fts5("
+        "title, content, user_id, content='poem', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_fts USING fts5("
+        "content, group_chat_id, user_id UNINDEXED, created_at UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+        """CREATE TRIGGER IF NOT EXISTS poem_fts_insert AFTER INSERT ON poem BEGIN
+            INSERT INTO poem_fts (rowid, title, content, user_id) VALUES (new.id, new.title, new.content, new.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS poem_fts_delete AFTER DELETE ON poem BEGIN
+            INSERT INTO poem_fts (poem_fts, rowid, title, content, user_id)
+            VALUES ('delete', old.id, old.title, old.content, old.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS poem_fts_update AFTER UPDATE OF title, content, user_id ON poem BEGIN
+            INSERT INTO poem_fts (poem_fts, rowid, title, content, user_id)
+            VALUES ('delete', old.id, old.title, old.content, old.user_id);
+            INSERT INTO poem_fts (rowid, title, content, user_id) VALUES (new.id, new.title, new.content, new.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+            INSERT INTO chat_message_fts (rowid, content, group_chat_id, user_id, created_at)
+            VALUES (new.id, new.content, new.group_chat_id, new.user_id, new.created_at);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_message_fts_update AFTER UPDATE OF content, group_chat_id ON chat_message BEGIN
+            UPDATE chat_message_fts SET content = new.content, group_chat_id = new.group_chat_id WHERE rowid = old.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS chat_message_fts_delete AFTER DELETE ON chat_message
+        WHEN NOT EXISTS (
+            SELECT 1 FROM chat_archive_block
+            WHERE group_chat_id = old.group_chat_id AND last_message_id >= old.id AND first_message_id <= old.id
+        ) BEGIN
+            DELETE FROM chat_message_fts WHERE rowid = old.id;
+        END""",
+        "INSERT INTO poem_fts (poem_fts) VALUES ('rebuild')",
+        "DELETE FROM chat_message_fts",
+        "INSERT INTO chat_message_fts (rowid, content, group_chat_id, user_id, created_at) "
+        "SELECT id, content, group_chat_id, user_id, created_at FROM chat_message",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+    # Archived messages: each block is zlib-compressed JSON rows of
+    # (id, user_id, group_chat_id, content, created_at, is_moderated)
+    insert = text("INSERT INTO chat_message_fts (rowid, content, group_chat_id, user_id, created_at) "
+                  "VALUES (:id, :content, :group_chat_id, :user_id, :created_at)")
+    for (payload,) in connection.execute(text("SELECT payload FROM chat_archive_block ORDER BY id")):
+        rows = [
+            {'id': row[0], 'user_id': row[1], 'group_chat_id': row[2], 'content': row[3],
+             'created_at': row[4].replace('T', ' ') if row[4] else None}
+            for row in json.loads(zlib.decompress(payload))
+        ]
+        if rows:
+            connection.execute(insert, rows)
+    connection.execute(text("INSERT INTO poem_fts (poem_fts) VALUES ('optimize')"))
+    connection.execute(text("INSERT INTO chat_message_fts (chat_message_fts) VALUES ('optimize')"))
+
+@migration(8, "Local habit days with one row per habit per day, and computed streaks")
+def add_habit_days(connection):
+    if not has_column(connection, "user", "timezone"):
+        connection.execute(text('ALTER TABLE "user" ADD COLUMN timezone VARCHAR(64)'))
+    if not has_column(connection, "habit_entry", "day"):
+        connection.execute(text("ALTER TABLE habit_entry ADD COLUMN day DATE"))
+
+    metadata = MetaData()
+    user = Table('user', metadata, Column('id', Integer, primary_key=True), Column('timezone', String(64)))
+    habit_entry = Table(
+        'habit_entry', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer),
+        Column('habit_name', String(100)),
+        Column('completed', Boolean),
+        Column('streak_count', Integer),
+        Column('created_at', DateTime),
+        Column('day', Date),
+    )
+
+    def local_day(moment, zone_name):
+        try:
+            zone = ZoneInfo(zone_name) if zone_name else timezone.utc
+        except (ZoneInfoNotFoundError, ValueError):
+            zone = timezone.utc
+        return moment.replace(tzinfo=timezone.utc).astimezone(zone).date()
+
+    # Fill day from created_at in the user's time zone, then merge rows that
+    # land on the same (user, habit, day) into the newest one
+    connection.execute(text("DROP INDEX IF EXISTS uq_habit_entry_user_habit_day"))
+    while True:
+        rows = connection.execute(
+            select(habit_entry.c.id, habit_entry.c.created_at, user.c.timezone)
+            .join(user, user.c.id == habit_entry.c.user_id)
+            .where(habit_entry.c.day.is_(None), habit_entry.c.created_at.is_not(None))
+            .order_by(habit_entry.c.id)
+            .limit(1000)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            update(habit_entry).where(habit_entry.c.id == bindparam('row_id')).values(day=bindparam('row_day')),
+            [{'row_id': row_id, 'row_day': local_day(created_at, zone_name)} for row_id, created_at, zone_name in rows],
+        )
+    merged = connection.execute(text("""
+        DELETE FROM habit_entry WHERE day IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM habit_entry WHERE day IS NOT NULL GROUP BY user_id, habit_name, day
+        )
+    """)).rowcount
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_habit_entry_user_habit_day ON habit_entry (user_id, habit_name, day)"
+    ))
+
+    # streak_count is the number of consecutive completed days ending on the row
+    changes = []
+    last = None
+    streak = 0
+    for row_id, row_user, habit_name, day, completed, stored in connection.execute(
+            select(habit_entry.c.id, habit_entry.c.user_id, habit_entry.c.habit_name, habit_entry.c.day,
+                   habit_entry.c.completed, habit_entry.c.streak_count)
+            .where(habit_entry.c.day.is_not(None))
+            .order_by(habit_entry.c.user_id, habit_entry.c.habit_name, habit_entry.c.day)).all():
+        follows = last is not None and last[:2] == (row_user, habit_name) and last[2] == day - timedelta(days=1)
+        streak = (streak if follows else 0) + 1 if completed else 0
+        if stored != streak:
+            changes.append({'row_id': row_id, 'streak': streak})
+        last = (row_user, habit_name, day)
+    if changes:
+        connection.execute(
+            update(habit_entry).where(habit_entry.c.id == bindparam('row_id')).values(streak_count=bindparam('streak')),
+            changes,
+        )
+
+    if merged:
+        # Merged duplicates were counted in the habit columns of daily_rollup
+        connection.execute(text("""
+            UPDATE daily_rollup SET
+                habits_tracked = (SELECT COUNT(*) FROM habit_entry
+                                  WHERE habit_entry.user_id = daily_rollup.user_id
+                                    AND date(habit_entry.created_at) = daily_rollup.day),
+                habits_completed = (SELECT COALESCE(SUM(CASE WHEN completed THEN 1 ELSE 0 END), 0) FROM habit_entry
+                                    WHERE habit_entry.user_id = daily_rollup.user_id
+                                      AND date(habit_entry.created_at) = daily_rollup.day)
+            WHERE habits_tracked > 0
+        """))
+
+def current_version(connection):
+    connection.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+def init_database(db):
+    """Create missing tables, then apply pending migrations; returns the versions applied"""
+    db.create_all()
+    return upgrade_database(db.engine)
+
+def upgrade_database(engine):
+    """Apply every pending migration, each in its own transaction.
+
+    Returns the list of versions applied.
+    """
+    with engine.begin() as connection:
+        version = current_version(connection)
+
+    applied = []
+    for number, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if number <= version:
+            continue
+        with engine.begin() as connection:
+            logging.info(f"Applying migration {number}: {description}")
+            func(connection)
+            connection.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {'version': number})
+        applied.append(number)
+
+    return applied
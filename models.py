@@ -1,8 +1,12 @@
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hash_password, verify_password
 
 class User(db.Model):
+    __table_args__ = (
+        db.Index('ix_user_group_chat_id', 'group_chat_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     nickname = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=True)  # Optional for anonymity
@@ -12,6 +16,8 @@ class User(db.Model):
     group_chat_id = db.Column(db.Integer, db.ForeignKey('group_chat.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     dark_mode = db.Column(db.Boolean, default=False)
+    cache_version = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))  # Bumped on writes that change the dashboard
+    timezone = db.Column(db.String(64), nullable=True)  # IANA name reported by the browser; UTC when unknown
     
     # Relationships
     mood_entries = db.relationship('MoodEntry', backref='user', lazy=True)
@@ -21,12 +27,16 @@ class User(db.Model):
     chat_messages = db.relationship('ChatMessage', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 class AssessmentResult(db.Model):
+    __table_args__ = (
+        db.Index('ix_assessment_result_user_created', 'user_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     responses = db.Column(db.Text, nullable=False)  # JSON string of responses
@@ -35,17 +45,30 @@ class AssessmentResult(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class GroupChat(db.Model):
+    __table_args__ = (
+        db.Index('ix_group_chat_color_shard', 'color_identity', 'shard'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     color_identity = db.Column(db.String(20), nullable=False)
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    shard = db.Column(db.Integer, nullable=False, default=1, server_default=db.text('1'))  # 1 for the original room, 2+ for overflow rooms
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))  # Maintained counter, see groups.py
+    activity_day = db.Column(db.Date, nullable=True)  # UTC day activity_count refers to
+    activity_count = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))  # Messages sent on activity_day
     
     # Relationships
     members = db.relationship('User', backref='group_chat', lazy=True)
     messages = db.relationship('ChatMessage', backref='group_chat', lazy=True)
 
 class ChatMessage(db.Model):
+    __table_args__ = (
+        # Keyset pagination cursor: (group_chat_id, id)
+        db.Index('ix_chat_message_group_id', 'group_chat_id', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     group_chat_id = db.Column(db.Integer, db.ForeignKey('group_chat.id'), nullable=False)
@@ -53,7 +76,35 @@ class ChatMessage(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_moderated = db.Column(db.Boolean, default=False)
 
+class ChatArchiveBlock(db.Model):
+    """A zlib-compressed JSON block of one group's archived chat messages (see archive.py)"""
+    __table_args__ = (
+        db.Index('ix_chat_archive_block_group_last', 'group_chat_id', 'last_message_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    group_chat_id = db.Column(db.Integer, db.ForeignKey('group_chat.id'), nullable=False)
+    first_message_id = db.Column(db.Integer, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False)
+    first_created_at = db.Column(db.DateTime, nullable=True)
+    last_created_at = db.Column(db.DateTime, nullable=True)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+class ChatArchiveAuthor(db.Model):
+    """Which users wrote messages in an archive block, so their exports can find them"""
+    __table_args__ = (
+        db.Index('ix_chat_archive_author_user', 'user_id'),
+    )
+    
+    block_id = db.Column(db.Integer, db.ForeignKey('chat_archive_block.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+
 class MoodEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_mood_entry_user_created', 'user_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     mood_level = db.Column(db.Integer, nullable=False)  # 1-10 scale
@@ -62,14 +113,24 @@ class MoodEntry(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class HabitEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_habit_entry_user_created', 'user_id', 'created_at'),
+        db.Index('uq_habit_entry_user_habit_day', 'user_id', 'habit_name', 'day', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     habit_name = db.Column(db.String(100), nullable=False)
     completed = db.Column(db.Boolean, default=False)
-    streak_count = db.Column(db.Integer, default=0)
+    streak_count = db.Column(db.Integer, default=0)  # Consecutive completed days up to this one, see habits.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    day = db.Column(db.Date, nullable=True)  # The user's local day, one row per habit per day
 
 class EmotionEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_emotion_entry_user_created', 'user_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     emotion_name = db.Column(db.String(50), nullable=False)
@@ -78,6 +139,10 @@ class EmotionEntry(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Poem(db.Model):
+    __table_args__ = (
+        db.Index('ix_poem_user_updated', 'user_id', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(200), nullable=True)
@@ -87,8 +152,60 @@ class Poem(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Announcement(db.Model):
+    __table_args__ = (
+        db.Index('ix_announcement_active_created', 'is_active', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailyRollup(db.Model):
+    """Per-user, per-day aggregates of mood, emotion and habit tracking.
+
+    Maintained by the track_* handlers in the same transaction as the raw
+    entry (see rollups.py) so summaries never have to scan raw history.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_daily_rollup_user_day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    mood_count = db.Column(db.Integer, nullable=False, default=0)
+    mood_sum = db.Column(db.Integer, nullable=False, default=0)
+    mood_min = db.Column(db.Integer, nullable=True)
+    mood_max = db.Column(db.Integer, nullable=True)
+    emotion_count = db.Column(db.Integer, nullable=False, default=0)
+    intensity_sum = db.Column(db.Integer, nullable=False, default=0)
+    intensity_min = db.Column(db.Integer, nullable=True)
+    intensity_max = db.Column(db.Integer, nullable=True)
+    habits_tracked = db.Column(db.Integer, nullable=False, default=0)
+    habits_completed = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyMoodTypeCount(db.Model):
+    """Per-user, per-day histogram of mood types"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', 'mood_type', name='uq_daily_mood_type_user_day_type'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    mood_type = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyEmotionNameCount(db.Model):
+    """Per-user, per-day histogram of emotion names"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', 'emotion_name', name='uq_daily_emotion_name_user_day_name'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    emotion_name = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,86 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import app
+
+# Bounded-cost password hashing.
+#
+# Hashing runs on a small dedicated thread pool (PASSWORD_HASH_WORKERS;
+# hashlib releases the GIL while it works), so a burst of logins can use at
+# most that many cores while chat and dashboard requests keep running. At
+# most PASSWORD_HASH_MAX_PENDING hashes may be running or queued, and
+# login_slot caps how many one client address or one nickname can have in
+# flight. Past any of these limits PasswordHashingBusy is raised at once
+# rather than queueing more work.
+
+class PasswordHashingBusy(Exception):
+    """Too many password hashes in flight; the client should retry shortly"""
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_pending = 0
+_in_flight = {}
+_method_prefixes = {}
+
+def _get_executor():
+    global _executor, _executor_pid
+    # Created lazily, and again after a fork: pool threads do not survive fork()
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                               thread_name_prefix='password-hash')
+                _executor_pid = os.getpid()
+    return _executor
+
+def _run(function, *args):
+    global _pending
+    with _lock:
+        if _pending >= app.config['PASSWORD_HASH_MAX_PENDING']:
+            raise PasswordHashingBusy()
+        _pending += 1
+    try:
+        return _get_executor().submit(function, *args).result()
+    finally:
+        with _lock:
+            _pending -= 1
+
+def hash_password(password):
+    """Hash a password with the configured method on the hashing pool"""
+    return _run(generate_password_hash, password,
+                app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_SALT_LENGTH'])
+
+def verify_password(pwhash, password):
+    """Check a password against a stored hash on the hashing pool"""
+    return _run(check_password_hash, pwhash, password)
+
+def needs_rehash(pwhash):
+    """Whether a stored hash was made with other parameters than the configured method"""
+    method = app.config['PASSWORD_HASH_METHOD']
+    if method not in _method_prefixes:
+        # werkzeug fills in defaults for partial methods such as "pbkdf2", so
+        # read the full parameter string off a throwaway hash
+        _method_prefixes[method] = generate_password_hash('', method, 1).split('$', 1)[0]
+    return pwhash.split('$', 1)[0] != _method_prefixes[method]
+
+@contextmanager
+def login_slot(client_address, nickname):
+    """Claim one of the per-address and per-nickname hashing slots for the block"""
+    keys = [('address', client_address), ('nickname', nickname.lower())]
+    limits = [app.config['LOGIN_MAX_CONCURRENT_PER_ADDRESS'], app.config['LOGIN_MAX_CONCURRENT_PER_NICKNAME']]
+    with _lock:
+        if any(limit and _in_flight.get(key, 0) >= limit for key, limit in zip(keys, limits)):
+            raise PasswordHashingBusy()
+        for key in keys:
+            _in_flight[key] = _in_flight.get(key, 0) + 1
+    try:
+        yield
+    finally:
+        with _lock:
+            for key in keys:
+                _in_flight[key] -= 1
+                if not _in_flight[key]:
+                    del _in_flight[key]
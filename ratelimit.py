@@ -0,0 +1,151 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from flask import make_response, render_template, request, url_for
+from app import app
+from auth import current_user
+
+# Token-bucket backpressure for write endpoints.
+#
+# Each decorated endpoint has a budget in RATE_LIMITS of "requests/seconds":
+# a client may burst up to `requests` writes, and the bucket refills evenly
+# over `seconds`. Buckets are kept per user and per client address (the
+# X-Forwarded-For address that ProxyFix in app.py resolves, not the
+# proxy's). The address budget is RATE_LIMIT_ADDRESS_FACTOR times larger,
+# since several people can share one address. A request over either budget gets 429 with
+# Retry-After before it reaches the database, so one hammering tab cannot
+# monopolise the SQLite writer.
+#
+# A bucket is stored as a single number: the time at which it will be full
+# again (the GCRA form of a token bucket). Every key therefore costs the
+# same few bytes. A bucket that has refilled is no different from a missing
+# one, so such buckets are evicted.
+
+class RateLimitStore:
+    """Interface for token-bucket state.
+
+    take() spends one request from the bucket under `key`, whose budget is
+    `burst` requests per `seconds`. It returns 0 when the request is allowed,
+    or else the seconds until it would be. MemoryRateLimitStore below is the
+    default, per-worker store. A shared store (for example Redis, running
+    the same arithmetic in a script) can be plugged in with
+    set_rate_limit_store() so that workers share budgets.
+    """
+
+    def take(self, key, burst, seconds):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Thread-safe in-process buckets with idle eviction.
+
+    Keys are kept in last-used order. Each call drops refilled buckets from
+    the old end. Past `max_keys`, the least recently used bucket is dropped
+    even if it is not full yet. `clock` can be swapped for a fake one.
+    """
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._full_at = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def take(self, key, burst, seconds):
+        interval = seconds / burst
+        now = self.clock()
+        with self._lock:
+            while self._full_at:
+                oldest = next(iter(self._full_at))
+                if self._full_at[oldest] > now:
+                    break
+                del self._full_at[oldest]
+
+            full_at = max(self._full_at.get(key, now), now) + interval
+            wait = full_at - now - burst * interval
+            if wait > 0:
+                self.limited += 1
+                return wait
+
+            self.allowed += 1
+            self._full_at[key] = full_at
+            self._full_at.move_to_end(key)
+            while len(self._full_at) > self.max_keys:
+                self._full_at.popitem(last=False)
+                self.evictions += 1
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._full_at.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._full_at),
+                'allowed': self.allowed,
+                'limited': self.limited,
+                'evictions': self.evictions,
+            }
+
+rate_limit_store = MemoryRateLimitStore(max_keys=app.config["RATE_LIMIT_MAX_KEYS"])
+
+def set_rate_limit_store(store):
+    global rate_limit_store
+    rate_limit_store = store
+
+@lru_cache(maxsize=8)
+def parse_budgets(spec):
+    """'send_message=20/10,track_mood=10/60' -> {'send_message': (20, 10.0), 'track_mood': (10, 60.0)}"""
+    budgets = {}
+    for item in spec.split(','):
+        name, _, budget = item.partition('=')
+        requests, _, seconds = budget.partition('/')
+        if name.strip() and requests.strip() and seconds.strip():
+            budgets[name.strip()] = (int(requests), float(seconds))
+    return budgets
+
+def check_rate_limit(endpoint, user_id, client_address):
+    """Spend one request of the endpoint's budget for the user and their address.
+
+    Returns 0 if the request may go ahead, else the seconds to wait.
+    """
+    budget = parse_budgets(app.config['RATE_LIMITS']).get(endpoint)
+    if not app.config['RATE_LIMIT_ENABLED'] or budget is None:
+        return 0
+    burst, seconds = budget
+    factor = app.config['RATE_LIMIT_ADDRESS_FACTOR']
+    # The address bucket is only charged for requests the user bucket allows,
+    # so a limited user's retries do not use up their neighbours' budget.
+    wait = rate_limit_store.take(('user', user_id, endpoint), burst, seconds)
+    if wait:
+        return wait
+    return rate_limit_store.take(('address', client_address, endpoint), burst * factor, seconds)
+
+def too_many_requests(wait, back):
+    """429 page that sends the browser back to `back` once Retry-After has passed"""
+    retry_after = max(1, math.ceil(wait))
+    response = make_response(render_template('rate_limited.html', retry_after=retry_after, back=url_for(back)), 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def rate_limited(back):
+    """Hold the view to its RATE_LIMITS budget; apply inside login_required.
+
+    `back` is the endpoint that the 429 page returns to.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            wait = check_rate_limit(request.endpoint, current_user().id, request.remote_addr)
+            if wait:
+                return too_many_requests(wait, back)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,131 @@
+import json
+from sqlalchemy import bindparam, func, select, update
+from app import db
+from models import AssessmentResult, GroupChat, User
+from assessment import QUESTION_INDEX, calculate_color_identity, get_color_identity_info, score_batch
+from groups import choose_shard, refresh_member_counts
+
+def _answers_row(responses):
+    """Stored responses as one score_batch row, or None if they are not in question order"""
+    answers = [-1] * len(QUESTION_INDEX)
+    previous = -1
+    for response in responses:
+        row = QUESTION_INDEX.get(response['question_id'])
+        if row is None or row <= previous or response['selected_option'] < 0:
+            return None
+        answers[row] = response['selected_option']
+        previous = row
+    return answers
+
+def _score_chunk(rows):
+    """Rescore a chunk of (id, responses JSON) rows, batching every row stored in question order"""
+    colors = [None] * len(rows)
+    batch_positions, batch_answers = [], []
+    for position, row in enumerate(rows):
+        responses = json.loads(row.responses)
+        answers = _answers_row(responses)
+        if answers is None:
+            colors[position] = calculate_color_identity(responses)
+        else:
+            batch_positions.append(position)
+            batch_answers.append(answers)
+
+    if batch_answers:
+        for position, color in zip(batch_positions, score_batch(batch_answers)):
+            colors[position] = color
+    return colors
+
+def rescore_assessments(chunk_size=1000, start_after=0, dry_run=False):
+    """Recompute stored color identities and group assignments with the current weights.
+
+    Walks AssessmentResult in id order, one keyset chunk at a time, selecting
+    only the columns it needs. Each chunk is rescored in one batch and its
+    changes written with executemany UPDATEs and committed, so memory stays
+    bounded by chunk_size and an interrupted run can resume after the last
+    id it yielded. A user's identity and group follow their latest result;
+    users whose color changes join the least-loaded open shard for it.
+
+    Yields one progress dict per chunk. With dry_run nothing is written and
+    each dict carries a 'diffs' list describing what would change.
+    """
+    last_id = start_after
+
+    while True:
+        rows = db.session.execute(
+            select(AssessmentResult.id, AssessmentResult.user_id, AssessmentResult.responses, AssessmentResult.color_identity)
+            .where(AssessmentResult.id > last_id)
+            .order_by(AssessmentResult.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+
+        colors = _score_chunk(rows)
+        user_ids = {row.user_id for row in rows}
+        latest = dict(db.session.execute(
+            select(AssessmentResult.user_id, func.max(AssessmentResult.id))
+            .where(AssessmentResult.user_id.in_(user_ids))
+            .group_by(AssessmentResult.user_id)
+        ).all())
+        users = {user.id: user for user in db.session.execute(
+            select(User.id, User.color_identity, User.group_chat_id, GroupChat.color_identity.label('group_color'))
+            .outerjoin(GroupChat, User.group_chat_id == GroupChat.id)
+            .where(User.id.in_(user_ids))
+        ).all()}
+
+        result_updates, user_updates, diffs = [], [], []
+        pending = {}
+        for row, color in zip(rows, colors):
+            if color != row.color_identity:
+                result_updates.append({
+                    'id': row.id,
+                    'color_identity': color,
+                    'suggested_support': get_color_identity_info(color)['support_focus'],
+                })
+                diffs.append(f"result {row.id} (user {row.user_id}): {row.color_identity} -> {color}")
+
+            user = users.get(row.user_id)
+            if user is None or latest.get(row.user_id) != row.id:
+                continue
+
+            if user.group_color == color and color == user.color_identity:
+                continue
+
+            # Users whose room already matches keep it; others join the least-loaded open shard
+            if user.group_color == color:
+                group_chat = db.session.get(GroupChat, user.group_chat_id)
+            else:
+                group_chat = choose_shard(color, pending)
+                pending[group_chat.id] = pending.get(group_chat.id, 0) + 1
+            user_updates.append({'user_id': user.id, 'color': color, 'group_id': group_chat.id})
+            diffs.append(f"user {user.id}: {user.color_identity} -> {color}, group -> {group_chat.name}")
+
+        if not dry_run:
+            if result_updates:
+                db.session.execute(update(AssessmentResult), result_updates)
+            if user_updates:
+                users_table = User.__table__
+                db.session.execute(
+                    update(users_table)
+                    .where(users_table.c.id == bindparam('user_id'))
+                    .values(
+                        color_identity=bindparam('color'),
+                        group_chat_id=bindparam('group_id'),
+                        cache_version=users_table.c.cache_version + 1,
+                    ),
+                    user_updates,
+                )
+                previous_groups = {users[update['user_id']].group_chat_id for update in user_updates} - {None}
+                refresh_member_counts({update['group_id'] for update in user_updates} | previous_groups)
+            db.session.commit()
+        else:
+            db.session.rollback()
+
+        last_id = rows[-1].id
+        yield {
+            'last_id': last_id,
+            'scanned': len(rows),
+            'changed_results': len(result_updates),
+            'changed_users': len(user_updates),
+            'diffs': diffs if dry_run else [],
+        }
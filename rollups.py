@@ -0,0 +1,185 @@
+from datetime import date
+from sqlalchemy import case, delete, func, select, type_coerce
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import DailyRollup, DailyMoodTypeCount, DailyEmotionNameCount, MoodEntry, EmotionEntry, HabitEntry
+
+# Per-user daily rollups.
+#
+# Every tracked entry is folded into its user's DailyRollup row (and, for
+# moods and emotions, the per-type/per-name counts) with a single upsert in the same transaction as
+# the raw insert, so a summary over N days reads at most N small rows no
+# matter how many years of entries sit behind them. Days are the UTC date of
+# the entry's created_at, matching how the entries themselves are stored.
+
+def dialect_insert(model, dialect_name):
+    if dialect_name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def _least(column, value):
+    return case((column.is_(None), value), (value < column, value), else_=column)
+
+def _greatest(column, value):
+    return case((column.is_(None), value), (value > column, value), else_=column)
+
+def _merge_rollup(executor, dialect_name, user_id, day, values):
+    """Add counters into (user_id, day) and widen its min/max columns"""
+    table = DailyRollup.__table__
+    stmt = dialect_insert(DailyRollup, dialect_name).values(user_id=user_id, day=day, **values)
+    update = {}
+    for name in values:
+        if name.endswith('_min'):
+            update[name] = _least(table.c[name], stmt.excluded[name])
+        elif name.endswith('_max'):
+            update[name] = _greatest(table.c[name], stmt.excluded[name])
+        else:
+            update[name] = table.c[name] + stmt.excluded[name]
+    executor.execute(stmt.on_conflict_do_update(index_elements=['user_id', 'day'], set_=update))
+
+def _merge_mood_type(executor, dialect_name, user_id, day, mood_type, count):
+    table = DailyMoodTypeCount.__table__
+    stmt = dialect_insert(DailyMoodTypeCount, dialect_name).values(user_id=user_id, day=day, mood_type=mood_type, count=count)
+    executor.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'day', 'mood_type'],
+        set_={'count': table.c['count'] + stmt.excluded['count']}))
+
+def _merge_emotion_name(executor, dialect_name, user_id, day, emotion_name, count):
+    table = DailyEmotionNameCount.__table__
+    stmt = dialect_insert(DailyEmotionNameCount, dialect_name).values(user_id=user_id, day=day, emotion_name=emotion_name, count=count)
+    executor.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'day', 'emotion_name'],
+        set_={'count': table.c['count'] + stmt.excluded['count']}))
+
+def record_mood(user_id, day, mood_level, mood_type):
+    """Fold one mood entry into the user's rollups (caller commits)"""
+    dialect_name = db.engine.dialect.name
+    _merge_rollup(db.session, dialect_name, user_id, day, {
+        'mood_count': 1, 'mood_sum': mood_level, 'mood_min': mood_level, 'mood_max': mood_level,
+    })
+    _merge_mood_type(db.session, dialect_name, user_id, day, mood_type, 1)
+
+def record_emotion(user_id, day, intensity, emotion_name):
+    """Fold one emotion entry into the user's rollups (caller commits)"""
+    dialect_name = db.engine.dialect.name
+    _merge_rollup(db.session, dialect_name, user_id, day, {
+        'emotion_count': 1, 'intensity_sum': intensity, 'intensity_min': intensity, 'intensity_max': intensity,
+    })
+    _merge_emotion_name(db.session, dialect_name, user_id, day, emotion_name, 1)
+
+def record_habit(user_id, day, tracked_delta, completed_delta):
+    """Adjust the user's habit counters for a day (caller commits).
+
+    A new habit row adds 1 to habits_tracked; toggling an existing row's
+    completion only moves habits_completed by +1 or -1.
+    """
+    if not tracked_delta and not completed_delta:
+        return
+    _merge_rollup(db.session, db.engine.dialect.name, user_id, day, {
+        'habits_tracked': tracked_delta, 'habits_completed': completed_delta,
+    })
+
+def rebuild_rollups(connection, user_id=None):
+    """Regenerate rollups from raw history.
+
+    Aggregation runs in SQL grouped by (user_id, day) and the grouped rows are
+    streamed back, so memory does not depend on the size of the history.
+    Runs on the given connection; the caller owns the transaction.
+    Returns the number of user-days written.
+    """
+    dialect_name = connection.dialect.name
+
+    for model in (DailyRollup, DailyMoodTypeCount, DailyEmotionNameCount):
+        stmt = delete(model)
+        if user_id is not None:
+            stmt = stmt.where(model.user_id == user_id)
+        connection.execute(stmt)
+
+    def grouped(model, *columns, extra_group=()):
+        day = type_coerce(func.date(model.created_at), db.Date).label('day')
+        stmt = select(model.user_id, day, *extra_group, *columns).group_by(model.user_id, day, *extra_group)
+        if user_id is not None:
+            stmt = stmt.where(model.user_id == user_id)
+        return connection.execution_options(yield_per=1000).execute(stmt)
+
+    written = set()
+
+    for row in grouped(MoodEntry, func.count(), func.sum(MoodEntry.mood_level),
+                       func.min(MoodEntry.mood_level), func.max(MoodEntry.mood_level)):
+        user, day, count, total, low, high = row
+        _merge_rollup(connection, dialect_name, user, day, {
+            'mood_count': count, 'mood_sum': total, 'mood_min': low, 'mood_max': high,
+        })
+        written.add((user, day))
+
+    for user, day, mood_type, count in grouped(MoodEntry, func.count(), extra_group=(MoodEntry.mood_type,)):
+        _merge_mood_type(connection, dialect_name, user, day, mood_type, count)
+
+    for row in grouped(EmotionEntry, func.count(), func.sum(EmotionEntry.intensity),
+                       func.min(EmotionEntry.intensity), func.max(EmotionEntry.intensity)):
+        user, day, count, total, low, high = row
+        _merge_rollup(connection, dialect_name, user, day, {
+            'emotion_count': count, 'intensity_sum': total, 'intensity_min': low, 'intensity_max': high,
+        })
+        written.add((user, day))
+
+    for user, day, emotion_name, count in grouped(EmotionEntry, func.count(), extra_group=(EmotionEntry.emotion_name,)):
+        _merge_emotion_name(connection, dialect_name, user, day, emotion_name, count)
+
+    completed = func.sum(case((HabitEntry.completed.is_(True), 1), else_=0))
+    for user, day, count, done in grouped(HabitEntry, func.count(), completed):
+        _merge_rollup(connection, dialect_name, user, day, {
+            'habits_tracked': count, 'habits_completed': done,
+        })
+        written.add((user, day))
+
+    return len(written)
+
+def summarize(user_id, start_day, end_day=None):
+    """Aggregate a user's rollups over [start_day, end_day] into one summary dict"""
+    end_day = end_day or date.max
+    row = db.session.execute(
+        select(
+            func.coalesce(func.sum(DailyRollup.mood_count), 0),
+            func.coalesce(func.sum(DailyRollup.mood_sum), 0),
+            func.min(DailyRollup.mood_min),
+            func.max(DailyRollup.mood_max),
+            func.coalesce(func.sum(DailyRollup.emotion_count), 0),
+            func.coalesce(func.sum(DailyRollup.intensity_sum), 0),
+            func.min(DailyRollup.intensity_min),
+            func.max(DailyRollup.intensity_max),
+            func.coalesce(func.sum(DailyRollup.habits_tracked), 0),
+            func.coalesce(func.sum(DailyRollup.habits_completed), 0),
+        ).where(
+            DailyRollup.user_id == user_id,
+            DailyRollup.day >= start_day,
+            DailyRollup.day <= end_day,
+        )
+    ).one()
+    (mood_count, mood_sum, mood_min, mood_max,
+     emotion_count, intensity_sum, intensity_min, intensity_max,
+     habits_tracked, habits_completed) = row
+
+    mood_types = dict(db.session.execute(
+        select(DailyMoodTypeCount.mood_type, func.sum(DailyMoodTypeCount.count))
+        .where(
+            DailyMoodTypeCount.user_id == user_id,
+            DailyMoodTypeCount.day >= start_day,
+            DailyMoodTypeCount.day <= end_day,
+        )
+        .group_by(DailyMoodTypeCount.mood_type)
+    ).all())
+
+    return {
+        'mood_count': mood_count,
+        'mood_average': round(mood_sum / mood_count, 1) if mood_count else None,
+        'mood_min': mood_min,
+        'mood_max': mood_max,
+        'mood_types': mood_types,
+        'emotion_count': emotion_count,
+        'intensity_average': round(intensity_sum / emotion_count, 1) if emotion_count else None,
+        'intensity_min': intensity_min,
+        'intensity_max': intensity_max,
+        'habits_tracked': habits_tracked,
+        'habits_completed': habits_completed,
+    }
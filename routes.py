@@ -1,17 +1,40 @@
-from flask import render_template, request, redirect, url_for, session, flash, jsonify
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context, make_response
 from app import app, db
 from models import User, AssessmentResult, GroupChat, ChatMessage, MoodEntry, HabitEntry, EmotionEntry, Poem, Announcement
 from assessment import ASSESSMENT_QUESTIONS, calculate_color_identity, get_color_identity_info, get_group_chat_assignment, get_mental_health_insights
+from chat import CHAT_PAGE_SIZE, CHAT_MAX_PAGE_SIZE, fetch_messages, newest_message_id, serialize_message, format_sse
+from broker import chat_broker, RESYNC
+from rollups import summarize
+from cache import snapshot_row, get_dashboard_snapshot, store_dashboard_snapshot, invalidate_dashboard, cached_page
+from auth import current_user, login_required
+from groups import assign_group_chat
+from tracking import save_mood, save_emotion, save_habit, save_message
+from writebehind import submit_write
+from passwords import PasswordHashingBusy, login_slot, needs_rehash
+from ratelimit import rate_limited
+from trends import UNITS as TREND_UNITS, trends
+from export import EXPORT_FORMATS
+from search import SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE, search_available, search_poems, search_chat
+import queue
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import partial
 import logging
 
 @app.route('/')
+@cached_page
 def index():
     """Landing page with platform overview"""
     announcements = Announcement.query.filter_by(is_active=True).order_by(Announcement.created_at.desc()).limit(3).all()
     return render_template('index.html', announcements=announcements)
 
+def hashing_busy(template, **context):
+    """Ask the client to retry when the password hashing pool is saturated"""
+    flash('Too many sign-in attempts right now. Please wait a moment and try again.', 'error')
+    response = make_response(render_template(template, **context), 429)
+    response.headers['Retry-After'] = '1'
+    return response
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     """Anonymous user registration"""
@@ -34,7 +57,12 @@ def register():
         user = User()
         user.nickname = nickname
         user.email = email if email else None
-        user.set_password(password)
+        
+        try:
+            with login_slot(request.remote_addr, nickname):
+                user.set_password(password)
+        except PasswordHashingBusy:
+            return hashing_busy('register.html')
         
         try:
             db.session.add(user)
@@ -63,7 +91,20 @@ def login():
         
         user = User.query.filter_by(nickname=nickname).first()
         
-        if user and user.check_password(password):
+        try:
+            with login_slot(request.remote_addr, nickname):
+                valid = user is not None and user.check_password(password)
+                if valid and needs_rehash(user.password_hash):
+                    try:
+                        user.set_password(password)
+                        db.session.commit()
+                    except PasswordHashingBusy:
+                        # The password checked out; upgrade the hash on a later login
+                        pass
+        except PasswordHashingBusy:
+            return hashing_busy('register.html', login_mode=True)
+        
+        if valid:
             session['user_id'] = user.id
             session['user_nickname'] = user.nickname
             
@@ -83,15 +124,10 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/assessment', methods=['GET', 'POST'])
+@login_required
 def assessment():
     """Mental health assessment"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user:
-        session.clear()
-        return redirect(url_for('register'))
+    user = current_user()
     
     if request.method == 'POST':
         # Process assessment responses
@@ -119,21 +155,12 @@ def assessment():
             user.color_identity = color_identity
             user.assessment_completed = True
             
-            # Assign to group chat
-            group_name = get_group_chat_assignment(color_identity)
-            group_chat = GroupChat.query.filter_by(name=group_name).first()
-            
-            if not group_chat:
-                # Create group chat if it doesn't exist
-                group_chat = GroupChat()
-                group_chat.name = group_name
-                group_chat.color_identity = color_identity
-                group_chat.description = f"Support group for {get_color_identity_info(color_identity)['name']} individuals"
-                db.session.add(group_chat)
-            
-            user.group_chat_id = group_chat.id
-            
             try:
+                # Assign to the least-loaded group chat for this color
+                assign_group_chat(user, color_identity)
+                # A retake changes the identity and group the dashboard shows
+                invalidate_dashboard(user)
+                
                 db.session.add(assessment_result)
                 db.session.commit()
                 
@@ -150,18 +177,16 @@ def assessment():
     return render_template('assessment.html', questions=ASSESSMENT_QUESTIONS)
 
 @app.route('/assessment_results')
+@login_required
 def assessment_results():
     """Show detailed assessment results"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user or not user.assessment_completed:
+    user = current_user()
+    if not user.assessment_completed:
         return redirect(url_for('assessment'))
     
     color_info = get_color_identity_info(user.color_identity)
     mental_health_insights = get_mental_health_insights(user.color_identity)
-    group_name = get_group_chat_assignment(user.color_identity)
+    group_name = user.group_chat.name if user.group_chat else get_group_chat_assignment(user.color_identity)
     
     return render_template('assessment_results.html', 
                          user=user,
@@ -170,21 +195,35 @@ def assessment_results():
                          group_name=group_name)
 
 @app.route('/dashboard')
+@login_required
 def dashboard():
     """Personal user dashboard"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user:
-        session.clear()
-        return redirect(url_for('register'))
-    
+    user = current_user()
     if not user.assessment_completed:
         return redirect(url_for('assessment'))
     
-    # Get recent data for dashboard
     today = datetime.now().date()
+    
+    # Serve from the per-user snapshot unless the user wrote something since
+    snapshot = get_dashboard_snapshot(user, today)
+    context = snapshot['context'] if snapshot else build_dashboard_context(user, today)
+    
+    # Pages carrying one-off flash messages are rendered fresh and never cached whole
+    if session.get('_flashes'):
+        if snapshot is None:
+            store_dashboard_snapshot(user, today, context)
+        return render_template('dashboard.html', **context)
+    
+    if snapshot is None or snapshot['html'] is None:
+        snapshot = store_dashboard_snapshot(user, today, context, render_template('dashboard.html', **context))
+    
+    response = make_response(snapshot['html'])
+    response.set_etag(snapshot['etag'])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def build_dashboard_context(user, today):
+    """Query everything the dashboard shows, as plain values safe to cache"""
     week_ago = today - timedelta(days=7)
     
     recent_moods = MoodEntry.query.filter(
@@ -204,39 +243,32 @@ def dashboard():
     
     recent_poems = Poem.query.filter_by(user_id=user.id).order_by(Poem.updated_at.desc()).limit(3).all()
     
-    color_info = get_color_identity_info(user.color_identity)
-    
-    return render_template('dashboard.html', 
-                         user=user, 
-                         color_info=color_info,
-                         recent_moods=recent_moods,
-                         recent_habits=recent_habits,
-                         recent_emotions=recent_emotions,
-                         recent_poems=recent_poems)
+    # Week totals come from the daily rollups, independent of history length
+    weekly_summary = summarize(user.id, week_ago)
+    
+    return {
+        'user': snapshot_row(user),
+        'color_info': get_color_identity_info(user.color_identity),
+        'recent_moods': [snapshot_row(mood) for mood in recent_moods],
+        'recent_habits': [snapshot_row(habit) for habit in recent_habits],
+        'recent_emotions': [snapshot_row(emotion) for emotion in recent_emotions],
+        'recent_poems': [snapshot_row(poem) for poem in recent_poems],
+        'weekly_summary': weekly_summary,
+    }
 
 @app.route('/track_mood', methods=['POST'])
+@login_required
+@rate_limited('dashboard')
 def track_mood():
     """Track user mood"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user:
-        return redirect(url_for('register'))
+    user = current_user()
     
     mood_level = int(request.form.get('mood_level', 5))
     mood_type = request.form.get('mood_type', 'neutral')
     notes = request.form.get('notes', '')
     
-    mood_entry = MoodEntry()
-    mood_entry.user_id = user.id
-    mood_entry.mood_level = mood_level
-    mood_entry.mood_type = mood_type
-    mood_entry.notes = notes
-    
     try:
-        db.session.add(mood_entry)
-        db.session.commit()
+        submit_write(partial(save_mood, user.id, mood_level, mood_type, notes, datetime.utcnow()))
         flash('Mood tracked successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -246,37 +278,18 @@ def track_mood():
     return redirect(url_for('dashboard'))
 
 @app.route('/track_habit', methods=['POST'])
+@login_required
+@rate_limited('dashboard')
 def track_habit():
     """Track user habit"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user:
-        return redirect(url_for('register'))
+    user = current_user()
     
     habit_name = request.form.get('habit_name', '')
     completed = request.form.get('completed') == 'on'
-    
-    # Check if habit already exists today
-    today = datetime.now().date()
-    existing_habit = HabitEntry.query.filter(
-        HabitEntry.user_id == user.id,
-        HabitEntry.habit_name == habit_name,
-        db.func.date(HabitEntry.created_at) == today
-    ).first()
-    
-    if existing_habit:
-        existing_habit.completed = completed
-    else:
-        habit_entry = HabitEntry()
-        habit_entry.user_id = user.id
-        habit_entry.habit_name = habit_name
-        habit_entry.completed = completed
-        db.session.add(habit_entry)
+    timezone_name = request.form.get('timezone', '')[:64] or None
     
     try:
-        db.session.commit()
+        submit_write(partial(save_habit, user.id, habit_name, completed, datetime.utcnow(), timezone_name))
         flash('Habit tracked successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -286,28 +299,18 @@ def track_habit():
     return redirect(url_for('dashboard'))
 
 @app.route('/track_emotion', methods=['POST'])
+@login_required
+@rate_limited('dashboard')
 def track_emotion():
     """Track user emotion"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user:
-        return redirect(url_for('register'))
+    user = current_user()
     
     emotion_name = request.form.get('emotion_name', '')
     intensity = int(request.form.get('intensity', 5))
     trigger = request.form.get('trigger', '')
     
-    emotion_entry = EmotionEntry()
-    emotion_entry.user_id = user.id
-    emotion_entry.emotion_name = emotion_name
-    emotion_entry.intensity = intensity
-    emotion_entry.trigger = trigger
-    
     try:
-        db.session.add(emotion_entry)
-        db.session.commit()
+        submit_write(partial(save_emotion, user.id, emotion_name, intensity, trigger, datetime.utcnow()))
         flash('Emotion tracked successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -317,14 +320,10 @@ def track_emotion():
     return redirect(url_for('dashboard'))
 
 @app.route('/write_poem', methods=['GET', 'POST'])
+@login_required
 def write_poem():
     """Write or edit poem"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user:
-        return redirect(url_for('register'))
+    user = current_user()
     
     if request.method == 'POST':
         title = request.form.get('title', '')
@@ -349,6 +348,8 @@ def write_poem():
             poem.is_private = is_private
             db.session.add(poem)
         
+        invalidate_dashboard(user)
+        
         try:
             db.session.commit()
             flash('Poem saved successfully!', 'success')
@@ -367,13 +368,11 @@ def write_poem():
     return render_template('write_poem.html', poem=poem, user=user)
 
 @app.route('/chat')
+@login_required
 def chat():
     """Community chat page"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user or not user.assessment_completed:
+    user = current_user()
+    if not user.assessment_completed:
         return redirect(url_for('assessment'))
     
     group_chat = user.group_chat
@@ -381,22 +380,209 @@ def chat():
         flash('You are not assigned to a community group yet.', 'error')
         return redirect(url_for('dashboard'))
     
-    # Get recent messages
-    messages = ChatMessage.query.filter_by(group_chat_id=group_chat.id).order_by(ChatMessage.created_at.asc()).limit(50).all()
+    # Get the most recent page of messages; older ones are loaded by cursor
+    messages, has_older = fetch_messages(group_chat.id)
     
     return render_template('chat.html', 
                          user=user, 
                          group_chat=group_chat, 
-                         messages=messages)
+                         messages=messages,
+                         has_older=has_older)
+
+@app.route('/chat/<int:group_id>/messages')
+@login_required(api=True)
+def chat_messages(group_id):
+    """Incremental chat messages as JSON, paginated by message id cursor"""
+    user = current_user()
+    if user.group_chat_id != group_id:
+        return jsonify({'error': 'Not a member of this group'}), 403
+    
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    if after_id is not None and before_id is not None:
+        return jsonify({'error': 'Use either after_id or before_id, not both'}), 400
+    
+    limit = request.args.get('limit', CHAT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, CHAT_MAX_PAGE_SIZE))
+    
+    messages, has_more = fetch_messages(group_id, after_id=after_id, before_id=before_id, limit=limit)
+    
+    return jsonify({
+        'messages': [serialize_message(message) for message in messages],
+        'has_more': has_more,
+    })
+
+def run_search(search, owner_id):
+    """Run one page of a search from the q, limit and cursor query parameters"""
+    if not search_available(db.session.connection()):
+        return jsonify({'error': 'Search is not available on this database'}), 501
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    limit = request.args.get('limit', SEARCH_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    
+    try:
+        results, next_cursor = search(owner_id, query, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    response = jsonify({'results': results, 'next_cursor': next_cursor})
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/search/poems')
+@login_required(api=True)
+def search_poems_api():
+    """Full-text search over the user's own poems, best matches first"""
+    return run_search(search_poems, current_user().id)
+
+@app.route('/chat/<int:group_id>/search')
+@login_required(api=True)
+def search_chat_api(group_id):
+    """Full-text search over a group's chat history, archive included"""
+    user = current_user()
+    if user.group_chat_id != group_id:
+        return jsonify({'error': 'Not a member of this group'}), 403
+    return run_search(search_chat, group_id)
+
+@app.route('/api/trends')
+@login_required(api=True)
+def api_trends():
+    """Mood and emotion history bucketed by day, week or month"""
+    user = current_user()
+    
+    unit = request.args.get('unit', 'week')
+    if unit not in TREND_UNITS:
+        return jsonify({'error': f"unit must be one of {', '.join(TREND_UNITS)}"}), 400
+    
+    try:
+        start_day = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end_day = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+    if start_day and end_day and start_day > end_day:
+        return jsonify({'error': 'start must not be after end'}), 400
+    
+    response = jsonify(trends(user.id, unit, start_day, end_day))
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/export')
+@login_required
+def export_data():
+    """Download all of the user's data as NDJSON or a zip of CSVs, streamed"""
+    user = current_user()
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        flash('Unknown export format.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    generate, mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"serenity-export-{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+    response = Response(stream_with_context(generate(user.id)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/chat/<int:group_id>/stream')
+@login_required(api=True)
+def chat_stream(group_id):
+    """Server-Sent Events stream of new messages in a group chat"""
+    user = current_user()
+    if user.group_chat_id != group_id:
+        return jsonify({'error': 'Not a member of this group'}), 403
+    
+    # A stream holds its thread until the tab closes. Single-threaded servers
+    # cannot spare one, and a worker keeps threads back for other requests;
+    # refused clients poll the messages API instead.
+    if (not request.environ.get('wsgi.multithread')
+            or chat_broker.subscriber_count() >= app.config['CHAT_STREAM_MAX_PER_WORKER']):
+        response = jsonify({'error': 'Streaming unavailable, poll the messages API'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(app.config['CHAT_STREAM_HEARTBEAT'])
+        return response
+    
+    # Browsers send Last-Event-ID on reconnect; the first connection passes
+    # the newest message already rendered on the page instead
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_event_id', type=int)
+    
+    heartbeat = app.config['CHAT_STREAM_HEARTBEAT']
+    subscription = chat_broker.subscribe(group_id, maxsize=app.config['CHAT_STREAM_QUEUE_SIZE'])
+    db.session.close()
+    
+    def backfill(after_id):
+        """Replay messages committed after the cursor, one keyset page at a time"""
+        while True:
+            messages, has_more = fetch_messages(group_id, after_id=after_id, limit=CHAT_MAX_PAGE_SIZE)
+            payloads = [serialize_message(message) for message in messages]
+            db.session.close()
+            for payload in payloads:
+                after_id = payload['id']
+                yield payload
+            if not has_more:
+                return
+    
+    def latest():
+        """The newest page, for a client that never said which messages it has"""
+        messages, _ = fetch_messages(group_id)
+        payloads = [serialize_message(message) for message in messages]
+        db.session.close()
+        return payloads
+    
+    def events():
+        nonlocal last_id
+        try:
+            yield "retry: 3000\n\n"
+            if last_id is not None:
+                for payload in backfill(last_id):
+                    last_id = payload['id']
+                    yield format_sse(payload)
+            
+            while True:
+                try:
+                    item = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    # This worker's messages arrive on the queue (or as RESYNC
+                    # after an overflow); only other workers' can be missing,
+                    # so page through the database only when one is newer
+                    item = None
+                    if last_id is not None:
+                        newest = newest_message_id(group_id)
+                        db.session.close()
+                        if newest is not None and newest > last_id:
+                            item = RESYNC
+                    yield ": keep-alive\n\n"
+                
+                if item is RESYNC:
+                    for payload in (backfill(last_id) if last_id is not None else latest()):
+                        last_id = payload['id']
+                        yield format_sse(payload)
+                elif item is not None and (last_id is None or item['id'] > last_id):
+                    last_id = item['id']
+                    yield format_sse(item)
+        finally:
+            chat_broker.unsubscribe(subscription)
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/send_message', methods=['POST'])
+@login_required
+@rate_limited('chat')
 def send_message():
     """Send chat message"""
-    if 'user_id' not in session:
-        return redirect(url_for('register'))
-    
-    user = User.query.get(session['user_id'])
-    if not user or not user.group_chat:
+    user = current_user()
+    if not user.group_chat:
         return redirect(url_for('chat'))
     
     content = request.form.get('content', '').strip()
@@ -404,14 +590,8 @@ def send_message():
         flash('Please enter a message.', 'error')
         return redirect(url_for('chat'))
     
-    message = ChatMessage()
-    message.user_id = user.id
-    message.group_chat_id = user.group_chat.id
-    message.content = content
-    
     try:
-        db.session.add(message)
-        db.session.commit()
+        submit_write(partial(save_message, user.id, user.group_chat_id, content, datetime.utcnow()))
     except Exception as e:
         db.session.rollback()
         logging.error(f"Message send error: {e}")
@@ -422,35 +602,39 @@ def send_message():
 @app.route('/toggle_dark_mode', methods=['POST'])
 def toggle_dark_mode():
     """Toggle dark mode"""
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user:
-            user.dark_mode = not user.dark_mode
-            session['dark_mode'] = user.dark_mode
-            try:
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                logging.error(f"Dark mode toggle error: {e}")
+    user = current_user()
+    if user:
+        user.dark_mode = not user.dark_mode
+        session['dark_mode'] = user.dark_mode
+        invalidate_dashboard(user)
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Dark mode toggle error: {e}")
     
     return redirect(request.referrer or url_for('dashboard'))
 
 @app.route('/about')
+@cached_page
 def about():
     """About page"""
     return render_template('about.html')
 
 @app.route('/features')
+@cached_page
 def features():
     """Features page"""
     return render_template('features.html')
 
 @app.route('/support')
+@cached_page
 def support():
     """Support page"""
     return render_template('support.html')
 
 @app.route('/privacy')
+@cached_page
 def privacy():
     """Privacy policy page"""
     return render_template('privacy.html')
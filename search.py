@@ -0,0 +1,218 @@
+import re
+from contextlib import contextmanager
+from datetime import datetime
+from markupsafe import escape
+from sqlalchemy import select, text
+from app import db
+from models import ChatArchiveBlock, User
+from archive import unpack_block
+
+# Full-text search over poems and chat (SQLite FTS5).
+#
+# poem_fts is an external-content index over poem: it stores only the index
+# and reads title/content back from poem by rowid. chat_message_fts keeps
+# its own copy of the text, because archive_chat() removes messages from
+# chat_message and archived chat must stay searchable. Triggers keep both
+# indexes in step with every insert, update and delete; the chat delete
+# trigger leaves the entry alone when the message is being moved into an
+# archive block.
+#
+# The owner (poem.user_id, chat group) is an indexed column, so a search
+# intersects the owner's posting list with the terms' instead of ranking
+# every match in the database and filtering afterwards. Results are ordered
+# by BM25 and paginated by a (score, id) cursor; scores shift slightly as
+# the index changes, so a page boundary may move between requests.
+
+# Results per page by default, and the upper bound for ?limit=
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Longer queries are cut to this many terms
+SEARCH_MAX_TERMS = 8
+
+# Column weights for bm25(): title matches count ten times a content match,
+# owner columns not at all
+POEM_WEIGHTS = '10.0, 1.0, 0.0'
+CHAT_WEIGHTS = '1.0, 0.0'
+
+# Stand-ins for the highlight markers, swapped for <mark> after escaping
+MARK_OPEN, MARK_CLOSE = '\x02', '\x03'
+
+INDEX_TABLES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS poem_fts USING fts5("
+    "title, content, user_id, content='poem', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_fts USING fts5("
+    "content, group_chat_id, user_id UNINDEXED, created_at UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+]
+
+SYNC_TRIGGERS = {
+    'poem_fts_insert': """
+        CREATE TRIGGER IF NOT EXISTS poem_fts_insert AFTER INSERT ON poem BEGIN
+            INSERT INTO poem_fts (rowid, title, content, user_id) VALUES (new.id, new.title, new.content, new.user_id);
+        END""",
+    'poem_fts_delete': """
+        CREATE TRIGGER IF NOT EXISTS poem_fts_delete AFTER DELETE ON poem BEGIN
+            INSERT INTO poem_fts (poem_fts, rowid, title, content, user_id)
+            VALUES ('delete', old.id, old.title, old.content, old.user_id);
+        END""",
+    'poem_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS poem_fts_update AFTER UPDATE OF title, content, user_id ON poem BEGIN
+            INSERT INTO poem_fts (poem_fts, rowid, title, content, user_id)
+            VALUES ('delete', old.id, old.title, old.content, old.user_id);
+            INSERT INTO poem_fts (rowid, title, content, user_id) VALUES (new.id, new.title, new.content, new.user_id);
+        END""",
+    'chat_message_fts_insert': """
+        CREATE TRIGGER IF NOT EXISTS chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+            INSERT INTO chat_message_fts (rowid, content, group_chat_id, user_id, created_at)
+            VALUES (new.id, new.content, new.group_chat_id, new.user_id, new.created_at);
+        END""",
+    'chat_message_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS chat_message_fts_update AFTER UPDATE OF content, group_chat_id ON chat_message BEGIN
+            UPDATE chat_message_fts SET content = new.content, group_chat_id = new.group_chat_id WHERE rowid = old.id;
+        END""",
+    'chat_message_fts_delete': """
+        CREATE TRIGGER IF NOT EXISTS chat_message_fts_delete AFTER DELETE ON chat_message
+        WHEN NOT EXISTS (
+            SELECT 1 FROM chat_archive_block
+            WHERE group_chat_id = old.group_chat_id AND last_message_id >= old.id AND first_message_id <= old.id
+        ) BEGIN
+            DELETE FROM chat_message_fts WHERE rowid = old.id;
+        END""",
+}
+
+INDEXES = ('poems', 'chat')
+
+def search_available(connection):
+    return connection.dialect.name == 'sqlite'
+
+def install_search(connection):
+    """Create the FTS5 indexes and the triggers that keep them in sync"""
+    for statement in INDEX_TABLES:
+        connection.execute(text(statement))
+    for statement in SYNC_TRIGGERS.values():
+        connection.execute(text(statement))
+
+def reindex(connection, indexes=INDEXES, blocks_per_batch=20):
+    """Rebuild indexes from scratch; returns {index: entries indexed}"""
+    counts = {}
+    if 'poems' in indexes:
+        connection.execute(text("INSERT INTO poem_fts (poem_fts) VALUES ('rebuild')"))
+        connection.execute(text("INSERT INTO poem_fts (poem_fts) VALUES ('optimize')"))
+        counts['poems'] = connection.execute(text("SELECT COUNT(*) FROM poem")).scalar()
+    if 'chat' in indexes:
+        connection.execute(text("DELETE FROM chat_message_fts"))
+        connection.execute(text(
+            "INSERT INTO chat_message_fts (rowid, content, group_chat_id, user_id, created_at) "
+            "SELECT id, content, group_chat_id, user_id, created_at FROM chat_message"
+        ))
+        counts['chat'] = connection.execute(text("SELECT COUNT(*) FROM chat_message")).scalar()
+
+        # Archived messages, a batch of blocks at a time in id order
+        insert = text("INSERT INTO chat_message_fts (rowid, content, group_chat_id, user_id, created_at) "
+                      "VALUES (:id, :content, :group_chat_id, :user_id, :created_at)")
+        last_block_id = 0
+        while True:
+            blocks = connection.execute(
+                select(ChatArchiveBlock.id, ChatArchiveBlock.payload)
+                .where(ChatArchiveBlock.id > last_block_id).order_by(ChatArchiveBlock.id).limit(blocks_per_batch)
+            ).all()
+            if not blocks:
+                break
+            rows = [
+                {**message, 'created_at': message['created_at'].replace('T', ' ') if message['created_at'] else None}
+                for _, payload in blocks for message in unpack_block(payload)
+            ]
+            connection.execute(insert, rows)
+            counts['chat'] += len(rows)
+            last_block_id = blocks[-1][0]
+        connection.execute(text("INSERT INTO chat_message_fts (chat_message_fts) VALUES ('optimize')"))
+    return counts
+
+@contextmanager
+def bulk_indexing(connection):
+    """Suspend the sync triggers for a bulk load, then rebuild the indexes once at the end"""
+    for name in SYNC_TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    yield
+    reindex(connection)
+    install_search(connection)
+
+def match_expression(query, owner_column, owner_id, columns):
+    """FTS5 query for every word of `query` within one owner's rows, or None if it has no words.
+
+    User input is reduced to quoted terms, so FTS5 operators in it are
+    searched for as text instead of being interpreted. A trailing * keeps
+    prefix matching.
+    """
+    terms = [f'"{word}"{star}' for word, star in re.findall(r'(\w+)(\*?)', query)][:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return f'{owner_column} : "{int(owner_id)}" AND {{{columns}}} : ({" ".join(terms)})'
+
+def parse_cursor(cursor):
+    """Split a 'score:id' cursor; raises ValueError if it is malformed"""
+    score, _, last_id = cursor.rpartition(':')
+    return float(score), int(last_id)
+
+def _iso(value):
+    return datetime.fromisoformat(value).isoformat() if value else None
+
+def _marked(fragment):
+    if fragment is None:
+        return None
+    return str(escape(fragment)).replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+
+def _page(table, weights, columns, match, limit, cursor):
+    """Rows of `columns` for one page of matches, ranked best first, plus the next cursor"""
+    score = f'bm25({table}, {weights})'
+    where = f'{table} MATCH :match'
+    params = {'match': match, 'limit': limit + 1, 'open': MARK_OPEN, 'close': MARK_CLOSE}
+    if cursor is not None:
+        params['score'], params['last_id'] = parse_cursor(cursor)
+        where += f' AND ({score} > :score OR ({score} = :score AND {table}.rowid > :last_id))'
+    rows = db.session.execute(text(
+        f'SELECT {table}.rowid, {score} AS score, {columns} FROM {table} WHERE {where} '
+        f'ORDER BY score, {table}.rowid LIMIT :limit'
+    ), params).all()
+    next_cursor = f'{rows[limit - 1].score!r}:{rows[limit - 1].rowid}' if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def search_poems(user_id, query, limit=SEARCH_PAGE_SIZE, cursor=None):
+    """One page of the user's own poems matching `query`; returns (results, next_cursor)"""
+    match = match_expression(query, 'user_id', user_id, 'title content')
+    if match is None:
+        return [], None
+    rows, next_cursor = _page(
+        'poem_fts', POEM_WEIGHTS,
+        "highlight(poem_fts, 0, :open, :close) AS title, "
+        "snippet(poem_fts, 1, :open, :close, '…', 24) AS snippet, "
+        "(SELECT updated_at FROM poem WHERE poem.id = poem_fts.rowid) AS updated_at",
+        match, limit, cursor,
+    )
+    return [
+        {'id': row.rowid, 'title': _marked(row.title), 'snippet': _marked(row.snippet), 'updated_at': _iso(row.updated_at)}
+        for row in rows
+    ], next_cursor
+
+def search_chat(group_chat_id, query, limit=SEARCH_PAGE_SIZE, cursor=None):
+    """One page of a group's messages, hot or archived, matching `query`; returns (results, next_cursor)"""
+    match = match_expression(query, 'group_chat_id', group_chat_id, 'content')
+    if match is None:
+        return [], None
+    rows, next_cursor = _page(
+        'chat_message_fts', CHAT_WEIGHTS,
+        "snippet(chat_message_fts, 0, :open, :close, '…', 24) AS snippet, user_id, created_at",
+        match, limit, cursor,
+    )
+    user_ids = {row.user_id for row in rows}
+    nicknames = dict(db.session.execute(select(User.id, User.nickname).where(User.id.in_(user_ids))).all()) if user_ids else {}
+    return [
+        {
+            'id': row.rowid,
+            'user_id': row.user_id,
+            'author': nicknames.get(row.user_id, 'Former member'),
+            'snippet': _marked(row.snippet),
+            'created_at': _iso(row.created_at),
+        }
+        for row in rows
+    ], next_cursor
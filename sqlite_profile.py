@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+import time
+from sqlalchemy import event, text
+
+# Opt-in SQLite production profile (SQLITE_PROFILE=production).
+#
+# Every new connection switches the database to WAL, so readers no longer
+# block the writer or each other, and waits up to SQLITE_BUSY_TIMEOUT for
+# the write lock instead of failing with "database is locked". Commits use
+# synchronous=NORMAL: in WAL mode that is still crash-safe for the database
+# file, but the last transactions before a power loss may be rolled back.
+#
+# SQLite allows one writer at a time, so the pool stays small and skips the
+# pre-ping and recycle meant for network databases. A background thread runs
+# a passive WAL checkpoint every SQLITE_CHECKPOINT_INTERVAL seconds so the
+# WAL file cannot keep growing behind long-lived readers such as chat streams.
+
+def is_sqlite(uri):
+    return uri.startswith("sqlite")
+
+def sqlite_engine_options(config):
+    """Engine options for the production profile"""
+    return {
+        "pool_size": config["SQLITE_POOL_SIZE"],
+        "max_overflow": config["SQLITE_POOL_OVERFLOW"],
+        "pool_timeout": config["SQLITE_BUSY_TIMEOUT"] / 1000,
+        "pool_pre_ping": False,
+        "pool_recycle": -1,
+    }
+
+def connection_pragmas(config):
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA journal_size_limit={int(config['SQLITE_JOURNAL_SIZE_LIMIT'])}",
+    ]
+
+def install_pragmas(engine, config):
+    pragmas = connection_pragmas(config)
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+def checkpoint(engine, mode="PASSIVE"):
+    """Run a WAL checkpoint; returns (busy, wal pages, pages checkpointed)"""
+    with engine.connect() as connection:
+        return tuple(connection.execute(text(f"PRAGMA wal_checkpoint({mode})")).one())
+
+class WalCheckpointer:
+    def __init__(self, engine, interval):
+        self.engine = engine
+        self.interval = interval
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        # Started lazily, and again after a fork: threads do not survive fork()
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='wal-checkpoint', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                busy, wal_pages, checkpointed = checkpoint(self.engine)
+                if busy or checkpointed < wal_pages:
+                    logging.info(f"WAL checkpoint incomplete: {checkpointed}/{wal_pages} pages")
+            except Exception as e:
+                logging.warning(f"WAL checkpoint failed: {e}")
+
+def init_sqlite_profile(app, db):
+    """Install the pragmas and checkpointer on the app's engine"""
+    with app.app_context():
+        engine = db.engine
+    install_pragmas(engine, app.config)
+
+    if app.config["SQLITE_CHECKPOINT_INTERVAL"] > 0:
+        checkpointer = WalCheckpointer(engine, app.config["SQLITE_CHECKPOINT_INTERVAL"])
+        app.before_request(checkpointer.ensure_started)
@@ -0,0 +1,95 @@
+from datetime import datetime
+from sqlalchemy import func, update
+from app import db
+from models import User, MoodEntry, HabitEntry, EmotionEntry, ChatMessage
+from rollups import dialect_insert, record_mood, record_emotion, record_habit
+from habits import is_valid_zone, local_day, next_streak, previous_streak, restreak_following
+from cache import invalidate_dashboard
+from groups import record_group_activity
+from broker import chat_broker
+from chat import serialize_message
+
+# Write jobs for the high-frequency tracking and chat endpoints.
+#
+# Each job performs one already-validated write in the current session,
+# including its rollup, counter and cache side effects, and leaves the
+# commit to its caller (see writebehind.submit_write). A job may return a
+# callable to run once its transaction has committed.
+
+def save_mood(user_id, mood_level, mood_type, notes, created_at=None):
+    mood_entry = MoodEntry()
+    mood_entry.user_id = user_id
+    mood_entry.mood_level = mood_level
+    mood_entry.mood_type = mood_type
+    mood_entry.notes = notes
+    mood_entry.created_at = created_at or datetime.utcnow()
+
+    db.session.add(mood_entry)
+    record_mood(user_id, mood_entry.created_at.date(), mood_level, mood_type)
+    invalidate_dashboard(db.session.get(User, user_id))
+
+def save_emotion(user_id, emotion_name, intensity, trigger, created_at=None):
+    emotion_entry = EmotionEntry()
+    emotion_entry.user_id = user_id
+    emotion_entry.emotion_name = emotion_name
+    emotion_entry.intensity = intensity
+    emotion_entry.trigger = trigger
+    emotion_entry.created_at = created_at or datetime.utcnow()
+
+    db.session.add(emotion_entry)
+    record_emotion(user_id, emotion_entry.created_at.date(), intensity, emotion_name)
+    invalidate_dashboard(db.session.get(User, user_id))
+
+def save_habit(user_id, habit_name, completed, created_at=None, timezone_name=None):
+    created_at = created_at or datetime.utcnow()
+    user = db.session.get(User, user_id)
+    if timezone_name and timezone_name != user.timezone and is_valid_zone(timezone_name):
+        user.timezone = timezone_name
+    day = local_day(created_at, user.timezone)
+
+    streak = next_streak(previous_streak(db.session, user_id, habit_name, day), completed)
+
+    # One row per habit per day even when submissions race. The rollup delta
+    # comes from what each statement actually changed, never from an earlier
+    # read: a new row was inserted, or an existing row's completion flipped.
+    inserted = db.session.execute(
+        dialect_insert(HabitEntry, db.engine.dialect.name)
+        .values(user_id=user_id, habit_name=habit_name, completed=completed, streak_count=streak, day=day, created_at=created_at)
+        .on_conflict_do_nothing(index_elements=['user_id', 'habit_name', 'day'])
+        .returning(HabitEntry.id)
+    ).first()
+    if inserted:
+        record_habit(user_id, created_at.date(), 1, int(completed))
+        restreak_following(db.session, user_id, habit_name, day, streak)
+    else:
+        table = HabitEntry.__table__
+        flipped = db.session.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.habit_name == habit_name, table.c.day == day,
+                   func.coalesce(table.c.completed, False) != completed)
+            .values(completed=completed, streak_count=streak)
+            .returning(table.c.created_at)
+        ).first()
+        if flipped is not None:
+            record_habit(user_id, flipped.created_at.date(), 0, 1 if completed else -1)
+            restreak_following(db.session, user_id, habit_name, day, streak)
+
+    invalidate_dashboard(user)
+
+def save_message(user_id, group_chat_id, content, created_at=None):
+    message = ChatMessage()
+    message.user_id = user_id
+    message.group_chat_id = group_chat_id
+    message.content = content
+    message.created_at = created_at or datetime.utcnow()
+
+    db.session.add(message)
+    record_group_activity(group_chat_id)
+
+    # Serialize before commit expires the message, so publishing costs no queries
+    db.session.flush()
+    payload = serialize_message(message, author=db.session.get(User, user_id).nickname)
+
+    def publish():
+        chat_broker.publish(group_chat_id, payload)
+    return publish
@@ -0,0 +1,140 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import Date, cast, func, select
+from app import app, db
+from models import DailyRollup, DailyMoodTypeCount, DailyEmotionNameCount
+
+# Bucketed mood and emotion history for charts.
+#
+# Buckets are aggregated in SQL from the daily rollups (see rollups.py), so a
+# request reads at most one row per tracked day whatever the number of raw
+# entries. A response never holds more than TRENDS_MAX_BUCKETS buckets: a
+# range too long for the requested unit is served at the next coarser unit,
+# and a range too long even in months is cut to its most recent part.
+
+UNITS = ('day', 'week', 'month')
+
+def bucket_start(day, unit):
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    if unit == 'month':
+        return day.replace(day=1)
+    return day
+
+def bucket_count(start_day, end_day, unit):
+    if unit == 'day':
+        return (end_day - start_day).days + 1
+    if unit == 'week':
+        return (bucket_start(end_day, 'week') - bucket_start(start_day, 'week')).days // 7 + 1
+    return (end_day.year - start_day.year) * 12 + end_day.month - start_day.month + 1
+
+def months_before(day, months):
+    month = day.year * 12 + day.month - 1 - months
+    return date(month // 12, month % 12 + 1, 1)
+
+def default_start(end_day, unit, buckets):
+    """First day of a range holding `buckets` buckets of `unit` up to end_day, or date.min"""
+    try:
+        if unit == 'day':
+            return end_day - timedelta(days=buckets - 1)
+        if unit == 'week':
+            return bucket_start(end_day, 'week') - timedelta(weeks=buckets - 1)
+        return months_before(end_day, buckets - 1)
+    except (OverflowError, ValueError):
+        # The range would begin before year 1
+        return date.min
+
+def fit_range(start_day, end_day, unit, max_buckets):
+    """Coarsen the unit, then trim the start, until the range fits in max_buckets"""
+    for candidate in UNITS[UNITS.index(unit):]:
+        if bucket_count(start_day, end_day, candidate) <= max_buckets:
+            return start_day, candidate
+    return default_start(end_day, 'month', max_buckets), 'month'
+
+def _bucket(column, unit):
+    """SQL expression for the first day of the bucket holding `column`, as ISO text or a date"""
+    if db.engine.dialect.name == 'postgresql':
+        return cast(func.date_trunc(unit, column), Date)
+    if unit == 'week':
+        return func.date(column, 'weekday 0', '-6 days')
+    if unit == 'month':
+        return func.strftime('%Y-%m-01', column)
+    return func.date(column)
+
+def _top_by_bucket(model, name_column, user_id, start_day, end_day, unit):
+    """Most frequent name per bucket (ties go to the alphabetically first), in one query"""
+    bucket = _bucket(model.day, unit).label('bucket')
+    totals = (
+        select(bucket, name_column.label('name'), func.sum(model.count).label('total'))
+        .where(model.user_id == user_id, model.day >= start_day, model.day <= end_day)
+        .group_by(bucket, name_column)
+        .subquery()
+    )
+    ranked = select(
+        totals.c.bucket,
+        totals.c.name,
+        func.row_number().over(partition_by=totals.c.bucket, order_by=(totals.c.total.desc(), totals.c.name)).label('rank'),
+    ).subquery()
+    return dict(db.session.execute(select(ranked.c.bucket, ranked.c.name).where(ranked.c.rank == 1)).all())
+
+def _iso(value):
+    return value if isinstance(value, str) else value.isoformat()
+
+def _mean(total, count):
+    return round(total / count, 2) if count else None
+
+def trends(user_id, unit='week', start_day=None, end_day=None):
+    """A user's mood and emotion history as parallel per-bucket arrays.
+
+    Only buckets with mood or emotion entries are listed. Returns a dict
+    with the unit and range actually used, a 'buckets' array of bucket
+    start dates, and 'mood'/'emotion' arrays of count, mean, min, max and
+    top type/name per bucket.
+    """
+    max_buckets = app.config['TRENDS_MAX_BUCKETS']
+    end_day = end_day or datetime.utcnow().date()
+    start_day = start_day or default_start(end_day, unit, max_buckets)
+    start_day, unit = fit_range(start_day, end_day, unit, max_buckets)
+
+    bucket = _bucket(DailyRollup.day, unit).label('bucket')
+    rows = db.session.execute(
+        select(
+            bucket,
+            func.sum(DailyRollup.mood_count),
+            func.sum(DailyRollup.mood_sum),
+            func.min(DailyRollup.mood_min),
+            func.max(DailyRollup.mood_max),
+            func.sum(DailyRollup.emotion_count),
+            func.sum(DailyRollup.intensity_sum),
+            func.min(DailyRollup.intensity_min),
+            func.max(DailyRollup.intensity_max),
+        )
+        .where(
+            DailyRollup.user_id == user_id,
+            DailyRollup.day >= start_day,
+            DailyRollup.day <= end_day,
+            (DailyRollup.mood_count > 0) | (DailyRollup.emotion_count > 0),
+        )
+        .group_by(bucket)
+        .order_by(bucket)
+    ).all()
+
+    top_moods = _top_by_bucket(DailyMoodTypeCount, DailyMoodTypeCount.mood_type, user_id, start_day, end_day, unit)
+    top_emotions = _top_by_bucket(DailyEmotionNameCount, DailyEmotionNameCount.emotion_name, user_id, start_day, end_day, unit)
+
+    result = {
+        'unit': unit,
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'buckets': [],
+        'mood': {'count': [], 'mean': [], 'min': [], 'max': [], 'top': []},
+        'emotion': {'count': [], 'mean': [], 'min': [], 'max': [], 'top': []},
+    }
+    for key, mood_count, mood_sum, mood_min, mood_max, emotion_count, intensity_sum, intensity_min, intensity_max in rows:
+        result['buckets'].append(_iso(key))
+        for series, values in (
+            (result['mood'], (mood_count, _mean(mood_sum, mood_count), mood_min, mood_max, top_moods.get(key))),
+            (result['emotion'], (emotion_count, _mean(intensity_sum, emotion_count), intensity_min, intensity_max, top_emotions.get(key))),
+        ):
+            for name, value in zip(('count', 'mean', 'min', 'max', 'top'), values):
+                series[name].append(value)
+    return result
@@ -0,0 +1,162 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app import app, db
+
+# Write-behind group commit for the tracking and chat endpoints.
+#
+# WRITE_BEHIND selects the durability/latency trade-off:
+# - "off"   (default) every request runs its write and commits it itself
+# - "group" requests hand their write to a background writer and wait until
+#           the batch holding it has committed: same durability as "off",
+#           but concurrent requests share one transaction and one fsync
+# - "async" requests return as soon as the write is queued; anything still
+#           queued is lost if the process dies without draining
+#
+# The writer commits a batch once WRITE_BEHIND_BATCH_SIZE jobs are waiting or
+# WRITE_BEHIND_FLUSH_INTERVAL seconds after the first one arrived. If a batch
+# fails it is replayed one job per transaction so only the bad write is lost.
+
+_STOP = object()
+
+class WriteBehindQueue:
+    def __init__(self, maxsize, batch_size, flush_interval):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, job, timeout=None):
+        """Queue a job; returns a Future resolved once its batch commits"""
+        self._ensure_started()
+        future = Future()
+        self.queue.put((job, future), timeout=timeout)
+        return future
+
+    def drain(self, timeout=None):
+        """Flush everything queued so far and stop the writer"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            self.queue.put((_STOP, None))
+        thread.join(timeout)
+
+    def _ensure_started(self):
+        # Started lazily, and again after a fork: threads do not survive fork()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            job, future = self.queue.get()
+            if job is _STOP:
+                break
+            batch = [(job, future)]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    job, future = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stopping = True
+                    break
+                batch.append((job, future))
+            self._write(batch)
+
+        # Drain whatever arrived after the stop marker
+        remaining = []
+        while True:
+            try:
+                job, future = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not _STOP:
+                remaining.append((job, future))
+        if remaining:
+            self._write(remaining)
+
+    def _write(self, batch):
+        with app.app_context():
+            try:
+                callbacks = [job() for job, future in batch]
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.warning(f"Write-behind batch of {len(batch)} failed, retrying one by one: {e}")
+                for job, future in batch:
+                    self._write_one(job, future)
+                return
+            self.batches += 1
+            self.written += len(batch)
+            for (job, future), callback in zip(batch, callbacks):
+                self._finish(future, callback)
+
+    def _write_one(self, job, future):
+        try:
+            callback = job()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.failed += 1
+            logging.error(f"Write-behind job failed: {e}")
+            future.set_exception(e)
+            return
+        self.written += 1
+        self._finish(future, callback)
+
+    def _finish(self, future, callback):
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Write-behind post-commit callback failed: {e}")
+        future.set_result(None)
+
+write_behind = WriteBehindQueue(
+    maxsize=app.config["WRITE_BEHIND_QUEUE_SIZE"],
+    batch_size=app.config["WRITE_BEHIND_BATCH_SIZE"],
+    flush_interval=app.config["WRITE_BEHIND_FLUSH_INTERVAL"],
+)
+atexit.register(write_behind.drain, 30)
+
+def submit_write(job):
+    """Run a tracking/chat write job according to WRITE_BEHIND.
+
+    Raises if the write fails in "off" and "group" modes. In "async" mode a
+    full queue applies backpressure by writing inline instead.
+    """
+    mode = app.config["WRITE_BEHIND"]
+
+    if mode in ("group", "async"):
+        # The request's own session must not hold a write lock the writer needs
+        db.session.commit()
+        try:
+            future = write_behind.submit(job, timeout=0 if mode == "async" else None)
+        except queue.Full:
+            pass
+        else:
+            if mode == "group":
+                future.result()
+            return
+
+    callback = job()
+    db.session.commit()
+    if callback is not None:
+        callback()